@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+import threading
+import time
+import uuid
+import numpy as np
+from app.database.vectorstore import get_collection_version
+from app.utils.metrics import record_cache_lookup
+
+class SemanticCache:
+    """In-process cache of answers keyed by the meaning of the question.
+
+    A lookup embeds the incoming query and returns a stored answer when a
+    previously answered query is at least `similarity_threshold` cosine-similar.
+    Entries expire after `ttl_seconds`, the least recently used entry is evicted
+    once `max_entries` is reached, and the whole cache is dropped when the
+    vector collection changes (see `mark_collection_changed`). A `max_entries`
+    of 0 disables caching.
+    """
+
+    def __init__(self, embedding_function, similarity_threshold: float = 0.95,
+                 max_entries: int = 1000, ttl_seconds: int = 3600):
+        self.embedding_function = embedding_function
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max(max_entries, 0)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        # Row i of the first len(_entries) rows holds the vector of entry _row_keys[i];
+        # allocated on the first put, once the embedding size is known
+        self._matrix: Optional[np.ndarray] = None
+        self._created_at = np.zeros(self.max_entries)
+        self._row_keys: List[str] = []
+        self._lock = threading.Lock()
+        self._collection_version = get_collection_version()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize a query so trivially different spellings share an entry."""
+        return " ".join(query.lower().split())
+
+    async def embed(self, query: str) -> Optional[np.ndarray]:
+        """Embed a query as a unit-length float32 vector, or None on failure."""
+        try:
+            vector = await self.embedding_function.aembed_query(self.normalize(query))
+        except Exception as e:
+            print(f"Semantic cache embedding failed, bypassing cache: {e}")
+            return None
+
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def get(self, vector: np.ndarray, threshold: Optional[float] = None) -> Optional[str]:
+        """Return the cached answer closest to `vector` if it is similar enough.
+
+        `threshold` overrides `similarity_threshold`, e.g. to accept a looser
+        match when a fresh answer cannot be produced in time.
+        """
+        threshold = self.similarity_threshold if threshold is None else threshold
+        with self._lock:
+            self._drop_stale()
+            if not self._entries:
+                self.misses += 1
+                record_cache_lookup("semantic", False)
+                return None
+
+            similarities = self._matrix[:len(self._row_keys)] @ vector
+            best = int(np.argmax(similarities))
+
+            if similarities[best] < threshold:
+                self.misses += 1
+                record_cache_lookup("semantic", False)
+                return None
+
+            key = self._row_keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            record_cache_lookup("semantic", True)
+            return self._entries[key]["answer"]
+
+    def put(self, query: str, vector: np.ndarray, answer: str):
+        """Store an answer for a query, evicting the least recently used entry."""
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._drop_stale()
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            key = str(uuid.uuid4())
+            row = len(self._row_keys)
+            self._matrix[row] = vector
+            self._created_at[row] = time.monotonic()
+            self._row_keys.append(key)
+            self._entries[key] = {
+                "query": self.normalize(query),
+                "answer": answer,
+                "row": row,
+            }
+
+    async def get_or_compute(self, query: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """Return a cached answer for `query` or compute and cache a fresh one."""
+        vector = await self.embed(query)
+        if vector is not None:
+            answer = self.get(vector)
+            if answer is not None:
+                return answer
+
+        answer = await compute()
+        if vector is not None and answer:
+            self.put(query, vector, answer)
+        return answer
+
+    def invalidate(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size of the cache."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _drop_stale(self):
+        """Remove expired entries and clear everything if the collection changed."""
+        version = get_collection_version()
+        if version != self._collection_version:
+            self._clear()
+            self._collection_version = version
+            self.invalidations += 1
+            return
+
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Rows are not ordered by creation time; go from the last row down so
+        # the swaps in `_remove` only move rows that were already checked
+        expired = np.flatnonzero(self._created_at[:len(self._row_keys)] < cutoff)
+        for row in expired[::-1]:
+            self._remove(self._row_keys[row])
+
+    def _remove(self, key: str):
+        """Delete an entry, moving the last row into its slot to keep the matrix dense."""
+        row = self._entries.pop(key)["row"]
+        last = len(self._row_keys) - 1
+        if row != last:
+            moved = self._row_keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._created_at[row] = self._created_at[last]
+            self._row_keys[row] = moved
+            self._entries[moved]["row"] = row
+        self._row_keys.pop()
+
+    def _clear(self):
+        self._entries.clear()
+        self._row_keys.clear()
@@ -15,12 +15,141 @@ class Config:
     DB_PASS = os.getenv("DB_PASS", "")
     DB_HOST = os.getenv("DB_HOST", "")
     DB_PORT = os.getenv("DB_PORT", "")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "5"))
+    DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+    PGVECTOR_SCHEMA = os.getenv("PGVECTOR_SCHEMA", "public")
+
+    # Approximate nearest neighbour index on the embedding table
+    VECTOR_DIMENSIONS = int(os.getenv("VECTOR_DIMENSIONS", "768"))
+    VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")  # hnsw, ivfflat or none
+    VECTOR_INDEX_MAINTENANCE_WORK_MEM = os.getenv("VECTOR_INDEX_MAINTENANCE_WORK_MEM", "256MB")
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+    IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "100"))
+    IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+    # Ingestion is incremental (see ingestion_manifest); the ANN index is rebuilt after a
+    # full refresh or when more than this fraction of the chunks was added or deleted
+    INGESTION_REBUILD_INDEX_FRACTION = float(os.getenv("INGESTION_REBUILD_INDEX_FRACTION", "0.2"))
+
+    # Hybrid full-text + vector retrieval fused with reciprocal rank fusion
+    HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per search before fusion
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+    FULL_TEXT_SEARCH_CONFIG = os.getenv("FULL_TEXT_SEARCH_CONFIG", "english")
+
+    # Retrieval backend: "pgvector" queries the database, "local" searches an
+    # in-process memory-mapped replica of the collection
+    RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pgvector")
+    LOCAL_VECTOR_INDEX_DIR = os.getenv("LOCAL_VECTOR_INDEX_DIR", "/tmp/iskobot-vectors")
+    LOCAL_VECTOR_INDEX_DTYPE = os.getenv("LOCAL_VECTOR_INDEX_DTYPE", "float32")  # float32 or float16
+    LOCAL_VECTOR_INDEX_SYNC_SECONDS = int(os.getenv("LOCAL_VECTOR_INDEX_SYNC_SECONDS", "300"))  # 0 disables
 
     # Supabase
     SUPABASE_URL = os.getenv("SUPABASE_URL", "")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
     SUPABASE_BUCKET_NAME = os.getenv("SUPABASE_BUCKET_NAME", "")
+    SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+    SUPABASE_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    SUPABASE_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY_SECONDS", "30"))
+    SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+    SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+
+    # Verified access token -> user cache
+    AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+    AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
 
     CONQUI_XTTS_ID = os.getenv("CONQUI_XTTS_ID", "")
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
     ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
+
+    # Admission control for Gemini calls (quotas are per project, shared by all workers)
+    ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))  # uvicorn workers sharing the quota
+    GEMINI_LLM_RPM = float(os.getenv("GEMINI_LLM_RPM", "2000"))
+    GEMINI_LLM_MAX_CONCURRENCY = int(os.getenv("GEMINI_LLM_MAX_CONCURRENCY", "32"))
+    GEMINI_EMBEDDING_RPM = float(os.getenv("GEMINI_EMBEDDING_RPM", "1500"))
+    GEMINI_EMBEDDING_MAX_CONCURRENCY = int(os.getenv("GEMINI_EMBEDDING_MAX_CONCURRENCY", "32"))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+
+    # Hedged Gemini requests: a backup call fires once the first is slower than
+    # the HEDGE_PERCENTILE of recent latencies, for at most HEDGE_MAX_RATE of calls
+    HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))
+    HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "50"))
+
+    # Per-request deadlines; retrieval and history loading get a share of the budget
+    QUERY_DEADLINE_SECONDS = float(os.getenv("QUERY_DEADLINE_SECONDS", "20"))
+    CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "25"))
+    RETRIEVAL_DEADLINE_SHARE = float(os.getenv("RETRIEVAL_DEADLINE_SHARE", "0.25"))
+    HISTORY_DEADLINE_SHARE = float(os.getenv("HISTORY_DEADLINE_SHARE", "0.15"))
+    PERSISTENCE_MIN_TIMEOUT_SECONDS = float(os.getenv("PERSISTENCE_MIN_TIMEOUT_SECONDS", "5"))
+    DEGRADED_RETRIEVAL_K = int(os.getenv("DEGRADED_RETRIEVAL_K", "2"))
+    SEMANTIC_CACHE_DEGRADED_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_DEGRADED_THRESHOLD", "0.85"))
+
+    # Chat history: the last HISTORY_WINDOW_SIZE messages of a session go into the prompt.
+    # Each worker caches that window per session, updated write-through as messages are stored
+    # and refetched when the session's message_count shows another worker stored one
+    HISTORY_WINDOW_SIZE = int(os.getenv("HISTORY_WINDOW_SIZE", "10"))
+    HISTORY_CACHE_MAX_SESSIONS = int(os.getenv("HISTORY_CACHE_MAX_SESSIONS", "1000"))
+    HISTORY_CACHE_TTL_SECONDS = float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "900"))
+
+    # Chat memory: "window" puts the history window in the prompt verbatim. "summary" keeps
+    # a rolling summary of older messages on the session, updated in the background after
+    # each answer, and adds the newest SUMMARY_KEEP_MESSAGES or fewer verbatim so the
+    # summary and messages fit HISTORY_TOKEN_BUDGET tokens (estimated per request, counted
+    # exactly by the summarizer)
+    MEMORY_MODE = os.getenv("MEMORY_MODE", "window").lower()
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+    SUMMARY_KEEP_MESSAGES = int(os.getenv("SUMMARY_KEEP_MESSAGES", "4"))
+    SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+    SUMMARY_TIMEOUT_SECONDS = float(os.getenv("SUMMARY_TIMEOUT_SECONDS", "60"))
+    TOKEN_COUNT_TIMEOUT_SECONDS = float(os.getenv("TOKEN_COUNT_TIMEOUT_SECONDS", "1"))
+
+    # Approximate token budget for the knowledge bank section of the prompt. The default fits
+    # the top 5 chunks of up to 1000 characters (~250 tokens each, plus headers) untruncated
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1600"))
+
+    # Request tracing; TRACING_EXPORTER is "none", "console" or "file" (JSON lines at TRACING_FILE)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+    TRACING_FILE = os.getenv("TRACING_FILE", "/tmp/iskobot-traces.jsonl")
+
+    # Startup warmup, run in the background; GET /ready reports when it is done
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "30"))
+    WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "2"))
+    WARMUP_LLM = os.getenv("WARMUP_LLM", "true").lower() == "true"
+
+    # Per-request profiling; off unless an admin token or a sample rate is set
+    PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+    PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/iskobot-profiles")
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+    # Query embedding cache
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+
+    # Semantic answer cache for /query
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+    SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+    # How often workers check the ingestion manifest for changes made by other
+    # processes, which drop the answer and retrieval caches; 0 disables
+    COLLECTION_VERSION_SYNC_SECONDS = int(os.getenv("COLLECTION_VERSION_SYNC_SECONDS", "15"))
+
+    # Background writer for query_logs
+    QUERY_LOG_BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", "50"))
+    QUERY_LOG_FLUSH_INTERVAL_MS = int(os.getenv("QUERY_LOG_FLUSH_INTERVAL_MS", "1000"))
+    QUERY_LOG_MAX_QUEUE_SIZE = int(os.getenv("QUERY_LOG_MAX_QUEUE_SIZE", "10000"))
+    QUERY_LOG_DROP_POLICY = os.getenv("QUERY_LOG_DROP_POLICY", "drop_newest")
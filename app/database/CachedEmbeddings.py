@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from langchain.embeddings.base import Embeddings
+import threading
+import numpy as np
+from app.utils.metrics import observe_stage, record_cache_lookup
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that memoizes query embeddings in a bounded LRU cache.
+
+    Async cache misses go through `admission` (an `AdmissionController`) and
+    are hedged by `hedger` (a `Hedger`) when given.
+    """
+
+    def __init__(self, base_embeddings, max_entries=4096, admission=None, hedger=None):
+        self.base_embeddings = base_embeddings
+        self.max_entries = max_entries
+        self.admission = admission
+        self.hedger = hedger
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cache_key(text):
+        """Collapse whitespace and case so equivalent questions share an entry."""
+        return " ".join(text.split()).casefold()
+
+    def _get(self, key):
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vector.tolist()
+
+    def _put(self, key, embedding):
+        with self._lock:
+            # float32 halves the footprint of the float64 lists returned by the API
+            self._cache[key] = np.asarray(embedding, dtype=np.float32)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def embed_documents(self, texts):
+        """Embed documents without caching; they are only embedded once at ingestion."""
+        return self.base_embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.base_embeddings.aembed_documents(texts)
+
+    def embed_query(self, text):
+        """Embed a single query, reusing a cached vector when available."""
+        key = self._cache_key(text)
+        embedding = self._get(key)
+        if embedding is None:
+            embedding = self.base_embeddings.embed_query(text)
+            self._put(key, embedding)
+        return embedding
+
+    async def aembed_query(self, text):
+        """Async variant of `embed_query` sharing the same cache."""
+        key = self._cache_key(text)
+        embedding = self._get(key)
+        record_cache_lookup("embedding", embedding is not None)
+        if embedding is None:
+            if self.hedger is not None:
+                embedding = await self.hedger.run(lambda hedge: self._aembed_uncached(text, hedge))
+            else:
+                embedding = await self._aembed_uncached(text)
+            self._put(key, embedding)
+        return embedding
+
+    async def _aembed_uncached(self, text, hedge=False):
+        if self.admission is None:
+            with observe_stage("embedding"):
+                return await self.base_embeddings.aembed_query(text)
+        # A hedge only goes out if it can be admitted immediately
+        async with self.admission.admit(wait=not hedge):
+            with observe_stage("embedding"):
+                return await self.base_embeddings.aembed_query(text)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes": sum(vector.nbytes for vector in self._cache.values()),
+        }
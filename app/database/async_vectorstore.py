@@ -0,0 +1,225 @@
+from typing import Any, Dict, List, Optional
+import asyncio
+import numpy as np
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pgvector.asyncpg import register_vector
+from app.database.vector_index import FULL_TEXT_COLUMN
+from app.utils.metrics import observe_stage
+from app.config import Config
+
+_engine: Optional[AsyncEngine] = None
+
+# Same tables and cosine distance as langchain's PGVector store. The cast to a
+# fixed-size vector matches the expression the ANN index is built on.
+SIMILARITY_SEARCH_QUERY = sqlalchemy.text(f"""
+    SELECT e.uuid, e.document, e.cmetadata,
+           e.embedding::vector({Config.VECTOR_DIMENSIONS}) <=> :embedding AS distance
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+    WHERE c.name = :collection_name
+    ORDER BY distance
+    LIMIT :k
+""").columns(
+    sqlalchemy.column("uuid", sqlalchemy.String),
+    sqlalchemy.column("document", sqlalchemy.String),
+    sqlalchemy.column("cmetadata", JSONB),
+    sqlalchemy.column("distance", sqlalchemy.Float),
+)
+
+# Any query term may match (plainto_tsquery ANDs them), ranked by cover density.
+# Filters and ranks on the stored, GIN-indexed tsvector column from vector_index.py.
+_TSVECTOR = f"e.{FULL_TEXT_COLUMN}"
+FULL_TEXT_SEARCH_QUERY = sqlalchemy.text(f"""
+    WITH q AS (
+        SELECT to_tsquery('{Config.FULL_TEXT_SEARCH_CONFIG}',
+                          replace(plainto_tsquery('{Config.FULL_TEXT_SEARCH_CONFIG}', :query)::text, ' & ', ' | ')) AS query
+    )
+    SELECT e.uuid, e.document, e.cmetadata, ts_rank_cd({_TSVECTOR}, q.query) AS rank
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+    CROSS JOIN q
+    WHERE c.name = :collection_name AND {_TSVECTOR} @@ q.query
+    ORDER BY rank DESC
+    LIMIT :k
+""").columns(
+    sqlalchemy.column("uuid", sqlalchemy.String),
+    sqlalchemy.column("document", sqlalchemy.String),
+    sqlalchemy.column("cmetadata", JSONB),
+    sqlalchemy.column("rank", sqlalchemy.Float),
+)
+
+# Transaction-local so the setting never leaks to other pooled requests
+SET_SEARCH_PARAMETER = sqlalchemy.text("SELECT set_config(:name, :value, true)")
+
+def _register_vector(dbapi_connection, connection_record):
+    """Teach each new asyncpg connection the binary pgvector codec."""
+    dbapi_connection.run_async(
+        lambda connection: register_vector(connection, schema=Config.PGVECTOR_SCHEMA)
+    )
+
+def get_async_engine() -> AsyncEngine:
+    """Return the process-wide asyncpg engine used for retrieval, creating it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            sqlalchemy.engine.URL.create(
+                "postgresql+asyncpg",
+                username=Config.DB_USER,
+                password=Config.DB_PASS,
+                host=Config.DB_HOST,
+                port=int(Config.DB_PORT) if Config.DB_PORT else None,
+                database=Config.DB_NAME,
+                query={"prepared_statement_cache_size": str(Config.DB_STATEMENT_CACHE_SIZE)},
+            ),
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=Config.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=True,
+            connect_args={
+                "server_settings": {"statement_timeout": str(Config.DB_STATEMENT_TIMEOUT_MS)},
+                # Must be 0 behind a transaction-mode pooler (Supabase port 6543)
+                "statement_cache_size": Config.DB_STATEMENT_CACHE_SIZE,
+            },
+        )
+        event.listen(_engine.sync_engine, "connect", _register_vector)
+    return _engine
+
+async def warm_async_engine(connections: int = 1):
+    """Open `connections` pooled connections ahead of the first search."""
+    async def open_connection():
+        async with get_async_engine().connect() as connection:
+            await connection.execute(sqlalchemy.text("SELECT 1"))
+
+    await asyncio.gather(*(open_connection() for _ in range(connections)))
+
+async def dispose_async_engine():
+    """Close every pooled connection. Called when the app shuts down."""
+    global _engine
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+
+async def asimilarity_search_by_vector(embedding: List[float], k: int, collection_name: str,
+                                       ef_search: Optional[int] = None,
+                                       probes: Optional[int] = None) -> List[Document]:
+    """Return the `k` chunks of `collection_name` closest to `embedding` by cosine distance.
+
+    `ef_search` (HNSW) and `probes` (IVFFlat) trade recall for speed for this
+    query only; the one matching the index type in use takes effect.
+    """
+    with observe_stage("vector_search"):
+        return await _asimilarity_search_by_vector(embedding, k, collection_name, ef_search, probes)
+
+async def _asimilarity_search_by_vector(embedding, k, collection_name, ef_search, probes) -> List[Document]:
+    async with get_async_engine().begin() as connection:
+        if ef_search is not None:
+            await connection.execute(SET_SEARCH_PARAMETER, {"name": "hnsw.ef_search", "value": str(ef_search)})
+        if probes is not None:
+            await connection.execute(SET_SEARCH_PARAMETER, {"name": "ivfflat.probes", "value": str(probes)})
+
+        result = await connection.execute(
+            SIMILARITY_SEARCH_QUERY,
+            {
+                "embedding": np.asarray(embedding, dtype=np.float32),
+                "collection_name": collection_name,
+                "k": k,
+            },
+        )
+        rows = result.fetchall()
+
+    return [_to_document(row) for row in rows]
+
+async def afull_text_search(query: str, k: int, collection_name: str) -> List[Document]:
+    """Return up to `k` chunks of `collection_name` matching the terms of `query`, best first."""
+    with observe_stage("full_text_search"):
+        async with get_async_engine().connect() as connection:
+            result = await connection.execute(
+                FULL_TEXT_SEARCH_QUERY,
+                {"query": query, "collection_name": collection_name, "k": k},
+            )
+            rows = result.fetchall()
+
+    return [_to_document(row) for row in rows]
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """Merge ranked lists into the top `k` documents by reciprocal rank fusion.
+
+    Each document scores sum(1 / (rrf_k + rank)) over the lists it appears
+    in, so chunks found by both searches rise to the top.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+def _to_document(row) -> Document:
+    return Document(id=str(row.uuid), page_content=row.document, metadata=row.cmetadata or {})
+
+class AsyncPGVectorRetriever(BaseRetriever):
+    """Retriever that searches the PGVector collection on the pooled asyncpg engine.
+
+    Async callers (`ainvoke`, `astream`, `abatch`) never touch the executor
+    thread pool. Sync callers fall back to the store's own psycopg2 engine.
+    `ef_search` and `probes` can be overridden per request through
+    `configurable_fields`.
+    """
+
+    vectorstore: Any
+    k: int = 5
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.vectorstore.similarity_search(query, k=self.k)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        embedding = await self.vectorstore.embedding_function.aembed_query(query)
+        return await asimilarity_search_by_vector(
+            embedding,
+            self.k,
+            self.vectorstore.collection_name,
+            ef_search=self.ef_search,
+            probes=self.probes,
+        )
+
+class HybridPGVectorRetriever(AsyncPGVectorRetriever):
+    """Retriever that fuses full-text and vector search over the PGVector collection.
+
+    Exact tokens such as course codes, room numbers and acronyms are often
+    missed by embeddings alone. Both searches fetch `candidate_k` chunks
+    concurrently and the lists are merged with reciprocal rank fusion
+    before the top `k` are returned.
+    """
+
+    candidate_k: int = Config.HYBRID_CANDIDATES
+    rrf_k: int = Config.HYBRID_RRF_K
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        async def vector_search():
+            embedding = await self.vectorstore.embedding_function.aembed_query(query)
+            return await asimilarity_search_by_vector(
+                embedding,
+                self.candidate_k,
+                self.vectorstore.collection_name,
+                ef_search=self.ef_search,
+                probes=self.probes,
+            )
+
+        vector_docs, text_docs = await asyncio.gather(
+            vector_search(),
+            afull_text_search(query, self.candidate_k, self.vectorstore.collection_name),
+        )
+        return reciprocal_rank_fusion([vector_docs, text_docs], self.k, self.rrf_k)
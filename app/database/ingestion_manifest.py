@@ -0,0 +1,123 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from psycopg2.extras import Json, execute_values
+from app.database.connector import get_db_connection
+from app.database.vector_index import EMBEDDING_TABLE, ensure_custom_id_index
+
+MANIFEST_TABLE = "ingestion_manifest"
+
+# One row per ingested file or web page. `fingerprint` is a cheap change
+# marker known before downloading (the storage eTag); `content_hash` is the
+# SHA-256 of the downloaded content, NULL while the source is being
+# re-ingested; `chunks` lists {"hash", "id"} for every stored chunk, where
+# `id` is the chunk's custom_id in the embedding table. While the source is
+# being re-ingested, chunks that may or may not be stored have a NULL hash
+MANIFEST_DEFINITION = f"""
+CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+    source text PRIMARY KEY,
+    source_type text NOT NULL,
+    parent text,
+    fingerprint text,
+    content_hash text,
+    chunks jsonb NOT NULL DEFAULT '[]'::jsonb,
+    ingested_at timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+class IngestionManifest:
+    """What the vector collection was built from, so ingestion only redoes what changed.
+
+    Lives in the same database as the embeddings. Every method opens its own
+    short-lived connection, like the vector index helpers.
+    """
+
+    def __init__(self):
+        self.ensure_table()
+
+    def _execute(self, statement: str, params=None, fetch: bool = False):
+        conn = get_db_connection()
+        try:
+            with conn, conn.cursor() as cursor:
+                cursor.execute(statement, params)
+                return cursor.fetchall() if fetch else None
+        finally:
+            conn.close()
+
+    def ensure_table(self):
+        self._execute(MANIFEST_DEFINITION)
+        ensure_custom_id_index()
+
+    def load(self) -> Dict[str, dict]:
+        """All entries, by source."""
+        rows = self._execute(
+            f"SELECT source, source_type, parent, fingerprint, content_hash, chunks FROM {MANIFEST_TABLE}",
+            fetch=True
+        )
+        return {
+            row[0]: {
+                "source": row[0],
+                "source_type": row[1],
+                "parent": row[2],
+                "fingerprint": row[3],
+                "content_hash": row[4],
+                "chunks": row[5],
+            }
+            for row in rows
+        }
+
+    def upsert(self, source: str, source_type: str, parent: Optional[str], fingerprint: Optional[str],
+               content_hash: Optional[str], chunks: List[dict]):
+        self._execute(
+            f"""
+            INSERT INTO {MANIFEST_TABLE} (source, source_type, parent, fingerprint, content_hash, chunks, ingested_at)
+            VALUES (%s, %s, %s, %s, %s, %s, now())
+            ON CONFLICT (source) DO UPDATE SET
+                source_type = EXCLUDED.source_type,
+                parent = EXCLUDED.parent,
+                fingerprint = EXCLUDED.fingerprint,
+                content_hash = EXCLUDED.content_hash,
+                chunks = EXCLUDED.chunks,
+                ingested_at = EXCLUDED.ingested_at
+            """,
+            (source, source_type, parent, fingerprint, content_hash, Json(chunks))
+        )
+
+    def delete(self, sources: Iterable[str]):
+        sources = list(sources)
+        if sources:
+            self._execute(f"DELETE FROM {MANIFEST_TABLE} WHERE source = ANY(%s)", (sources,))
+
+    def clear(self):
+        self._execute(f"TRUNCATE {MANIFEST_TABLE}")
+
+def manifest_version() -> Optional[tuple]:
+    """Changes whenever a source is ingested, updated or removed; None without a manifest.
+
+    Every write sets `ingested_at` and removals lower the row count, so
+    comparing this over time tells other processes the collection changed.
+    """
+    conn = get_db_connection()
+    try:
+        with conn, conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (MANIFEST_TABLE,))
+            if not cursor.fetchone()[0]:
+                return None
+            cursor.execute(f"SELECT max(ingested_at), count(*) FROM {MANIFEST_TABLE}")
+            return cursor.fetchone()
+    finally:
+        conn.close()
+
+def update_chunk_metadata(chunks: List[Tuple[str, dict]]):
+    """Replace the metadata of stored chunks, by custom_id, without re-embedding them."""
+    if not chunks:
+        return
+    conn = get_db_connection()
+    try:
+        with conn, conn.cursor() as cursor:
+            execute_values(
+                cursor,
+                f"UPDATE {EMBEDDING_TABLE} AS e SET cmetadata = v.cmetadata::jsonb "
+                f"FROM (VALUES %s) AS v (custom_id, cmetadata) WHERE e.custom_id = v.custom_id",
+                [(chunk_id, Json(metadata)) for chunk_id, metadata in chunks]
+            )
+    finally:
+        conn.close()
@@ -0,0 +1,256 @@
+from typing import Any, List, Optional
+import asyncio
+import fcntl
+import json
+import os
+import threading
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pgvector.psycopg2 import register_vector
+from app.database.connector import get_db_connection
+from app.utils.metrics import observe_stage
+from app.config import Config
+
+# Rows scored per block when the matrix is stored as float16, so that the
+# dot products run in float32 BLAS without upcasting the whole matrix
+FLOAT16_BLOCK_ROWS = 8192
+
+# Fingerprint of a row's text and metadata, which ingestion may rewrite in
+# place (see update_chunk_metadata) without changing the row's uuid
+_ROW_HASH = "md5(coalesce(e.document, '') || coalesce(e.cmetadata::text, ''))"
+
+COLLECTION_IDS_QUERY = f"""
+    SELECT e.uuid::text, {_ROW_HASH}
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+    WHERE c.name = %s
+"""
+
+ROWS_BY_ID_QUERY = f"""
+    SELECT e.uuid::text, e.embedding::vector({Config.VECTOR_DIMENSIONS}), e.document, e.cmetadata, {_ROW_HASH}
+    FROM langchain_pg_embedding e
+    WHERE e.uuid = ANY(%s::uuid[])
+"""
+
+_index: Optional["LocalVectorIndex"] = None
+
+class LocalVectorIndex:
+    """Read-only replica of a PGVector collection held in a memory-mapped NumPy file.
+
+    Embeddings are stored L2-normalized in `<collection>.<version>.npy` so
+    cosine similarity is a single matrix-vector product. Every uvicorn worker
+    maps the same file, so the operating system keeps one copy in its page
+    cache. Chunk text and metadata live in a JSON sidecar loaded per worker.
+    `manifest.json` names the current version; workers reload when it changes.
+    """
+
+    def __init__(self, directory: str, collection_name: str, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported local index dtype: {dtype}")
+
+        self.directory = directory
+        self.collection_name = collection_name
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._manifest_mtime = None
+        self._vectors: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._rows: List[dict] = []
+        self.version = 0
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, f"{self.collection_name}.manifest.json")
+
+    def _data_paths(self, version: int):
+        prefix = os.path.join(self.directory, f"{self.collection_name}.{version}")
+        return f"{prefix}.npy", f"{prefix}.json"
+
+    def _refresh(self):
+        """Map the latest synced version if another process or thread wrote one."""
+        try:
+            mtime = os.stat(self._manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+
+        with self._lock:
+            if mtime == self._manifest_mtime:
+                return
+            try:
+                with open(self._manifest_path) as f:
+                    version = json.load(f)["version"]
+                vectors_path, rows_path = self._data_paths(version)
+                with open(rows_path) as f:
+                    rows = json.load(f)
+                vectors = np.load(vectors_path, mmap_mode="r")
+            except FileNotFoundError:
+                # A newer sync replaced this version mid-read; retry on the next call
+                return
+            self._vectors = vectors
+            self._rows = rows
+            self._ids = [row["id"] for row in rows]
+            self.version = version
+            self._manifest_mtime = mtime
+
+    def sync(self) -> dict:
+        """Bring the replica in line with the collection, fetching only new and changed rows.
+
+        Safe to call from several workers at once; a file lock serializes the
+        writers and the others pick up the result. Returns what changed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        lock_path = os.path.join(self.directory, f"{self.collection_name}.lock")
+        with open(lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                return self._sync_locked()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync_locked(self) -> dict:
+        conn = get_db_connection()
+        try:
+            register_vector(conn)
+            cursor = conn.cursor()
+            cursor.execute(COLLECTION_IDS_QUERY, (self.collection_name,))
+            current = dict(cursor.fetchall())
+
+            known = {row["id"]: row.get("hash") for row in self._rows}
+            # Rows whose text or metadata changed are replaced like removed and added ones
+            updated_ids = {row_id for row_id, row_hash in known.items()
+                           if row_id in current and current[row_id] != row_hash}
+            added_ids = list((current.keys() - known.keys()) | updated_ids)
+            removed_ids = (known.keys() - current.keys()) | updated_ids
+            if not added_ids and not removed_ids and self._vectors is not None:
+                return {"added": 0, "removed": 0, "updated": 0, "total": len(self._ids)}
+
+            new_vectors, new_rows = [], []
+            if added_ids:
+                cursor.execute(ROWS_BY_ID_QUERY, (added_ids,))
+                for row_id, embedding, document, metadata, row_hash in cursor.fetchall():
+                    new_vectors.append(np.asarray(embedding, dtype=np.float32))
+                    new_rows.append({"id": row_id, "document": document, "metadata": metadata or {},
+                                     "hash": row_hash})
+        finally:
+            conn.close()
+
+        # Keep surviving rows in place and append the new ones
+        keep = [i for i, row_id in enumerate(self._ids) if row_id not in removed_ids]
+        parts = []
+        if self._vectors is not None and keep:
+            parts.append(np.asarray(self._vectors[keep], dtype=np.float32))
+        if new_vectors:
+            added = np.vstack(new_vectors)
+            norms = np.linalg.norm(added, axis=1, keepdims=True)
+            parts.append(added / np.where(norms == 0, 1, norms))
+        vectors = (np.vstack(parts) if parts
+                   else np.empty((0, Config.VECTOR_DIMENSIONS), dtype=np.float32)).astype(self.dtype)
+        rows = [self._rows[i] for i in keep] + new_rows
+
+        self._write(vectors, rows)
+        return {
+            "added": len(new_rows) - len(updated_ids),
+            "removed": len(removed_ids) - len(updated_ids),
+            "updated": len(updated_ids),
+            "total": len(rows),
+        }
+
+    def _write(self, vectors: np.ndarray, rows: List[dict]):
+        old_version = self.version
+        version = old_version + 1
+        vectors_path, rows_path = self._data_paths(version)
+        np.save(vectors_path, vectors)
+        with open(rows_path, "w") as f:
+            json.dump(rows, f)
+
+        # Swap the manifest last so readers never see a half-written version
+        tmp_manifest = f"{self._manifest_path}.tmp"
+        with open(tmp_manifest, "w") as f:
+            json.dump({"version": version, "count": len(rows), "dtype": self.dtype.name}, f)
+        os.replace(tmp_manifest, self._manifest_path)
+        self._refresh()
+
+        # Workers still mapping the old file keep it alive until they reload
+        for path in self._data_paths(old_version):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def search(self, embedding: List[float], k: int) -> List[Document]:
+        """Return the `k` chunks most similar to `embedding` by cosine similarity."""
+        with observe_stage("vector_search"):
+            return self._search(embedding, k)
+
+    def _search(self, embedding: List[float], k: int) -> List[Document]:
+        self._refresh()
+        vectors, rows = self._vectors, self._rows
+        if vectors is None or len(rows) == 0:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        if vectors.dtype == np.float32:
+            scores = vectors @ query
+        else:
+            scores = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), FLOAT16_BLOCK_ROWS):
+                block = vectors[start:start + FLOAT16_BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ query
+
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Document(id=rows[i]["id"], page_content=rows[i]["document"], metadata=rows[i]["metadata"])
+            for i in top
+        ]
+
+    def stats(self) -> dict:
+        self._refresh()
+        return {
+            "version": self.version,
+            "entries": len(self._rows),
+            "dtype": self.dtype.name,
+            "bytes": int(self._vectors.nbytes) if self._vectors is not None else 0,
+        }
+
+def get_local_vector_index(collection_name: str = "langchain") -> LocalVectorIndex:
+    """Return the process-wide local replica, creating it on first use."""
+    global _index
+    if _index is None:
+        _index = LocalVectorIndex(
+            Config.LOCAL_VECTOR_INDEX_DIR,
+            collection_name,
+            dtype=Config.LOCAL_VECTOR_INDEX_DTYPE,
+        )
+    return _index
+
+def sync_local_vector_index() -> Optional[dict]:
+    """Sync the local replica after ingestion when it is the active retrieval backend."""
+    if Config.RETRIEVAL_BACKEND != "local":
+        return None
+    return get_local_vector_index().sync()
+
+class LocalVectorRetriever(BaseRetriever):
+    """Retriever that answers top-k from the in-process `LocalVectorIndex` replica.
+
+    Only the query embedding leaves the process; the search itself is a
+    vectorized dot product over the memory-mapped matrix.
+    """
+
+    vectorstore: Any
+    index: Any
+    k: int = 5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        embedding = self.vectorstore.embedding_function.embed_query(query)
+        return self.index.search(embedding, self.k)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        embedding = await self.vectorstore.embedding_function.aembed_query(query)
+        # The matrix product over the whole replica would otherwise block the event loop
+        return await asyncio.to_thread(self.index.search, embedding, self.k)
@@ -0,0 +1,90 @@
+from typing import AsyncIterator, Optional
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_TIMEOUT
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
+from app.config import Config
+
+_client: Optional[AsyncClient] = None
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """PostgREST client whose HTTP/2 session keeps a tuned pool of keep-alive connections."""
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            proxy=proxy,
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=Config.SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Config.SUPABASE_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+
+class PooledAsyncClient(AsyncClient):
+    """Async Supabase client that routes table and RPC calls through `PooledPostgrestClient`."""
+
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=DEFAULT_POSTGREST_CLIENT_TIMEOUT,
+                               verify=True, proxy=None) -> AsyncPostgrestClient:
+        return PooledPostgrestClient(
+            rest_url,
+            headers=headers,
+            schema=schema,
+            timeout=timeout,
+            verify=verify,
+            proxy=proxy,
+        )
+
+async def init_supabase_client() -> AsyncClient:
+    """Create the application-lifetime async Supabase client. Called from the app lifespan."""
+    global _client
+    if _client is None:
+        _client = await PooledAsyncClient.create(
+            Config.SUPABASE_URL,
+            Config.SUPABASE_KEY,
+            AsyncClientOptions(
+                # The shared client never signs in, so it must not track a user session
+                persist_session=False,
+                auto_refresh_token=False,
+                postgrest_client_timeout=Config.SUPABASE_TIMEOUT_SECONDS,
+                storage_client_timeout=Config.SUPABASE_TIMEOUT_SECONDS,
+            ),
+        )
+    return _client
+
+async def close_supabase_client():
+    """Close the pooled connections of the shared client."""
+    global _client
+    if _client is not None and _client._postgrest is not None:
+        await _client.postgrest.aclose()
+    _client = None
+
+def get_supabase_client() -> AsyncClient:
+    """Dependency to get the shared async Supabase client"""
+    if _client is None:
+        raise RuntimeError("Supabase client is not initialized; it is created in the app lifespan")
+    return _client
+
+async def get_supabase_auth_client() -> AsyncIterator[AsyncClient]:
+    """Dependency to get a per-request async client for sign-in/sign-out flows.
+
+    Signing in stores the user's session on the client and switches its
+    Authorization header to the user's token, so these flows must not run
+    on the shared client.
+    """
+    client = await acreate_client(
+        Config.SUPABASE_URL,
+        Config.SUPABASE_KEY,
+        AsyncClientOptions(persist_session=False, auto_refresh_token=False),
+    )
+    try:
+        yield client
+    finally:
+        if client._postgrest is not None:
+            await client.postgrest.aclose()
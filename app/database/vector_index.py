@@ -0,0 +1,145 @@
+from app.database.connector import get_db_connection
+from app.config import Config
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+INDEX_NAMES = {
+    "hnsw": "ix_langchain_pg_embedding_hnsw",
+    "ivfflat": "ix_langchain_pg_embedding_ivfflat",
+}
+# Stored tsvector of each chunk, so full-text ranking reads it instead of
+# parsing the document again for every matching row
+FULL_TEXT_COLUMN = "document_tsv"
+FULL_TEXT_INDEX_NAME = "ix_langchain_pg_embedding_tsv"
+# Expression index used before the stored column existed
+LEGACY_FULL_TEXT_INDEX_NAME = "ix_langchain_pg_embedding_fts"
+# Incremental ingestion updates and deletes chunks by custom_id
+CUSTOM_ID_INDEX_NAME = "ix_langchain_pg_embedding_custom_id"
+
+def _index_definition(index_type: str, index_name: str) -> str:
+    """Build the CREATE INDEX statement for the configured ANN index type."""
+    # The embedding column has no declared dimension, so the index (and the
+    # queries that use it) go through a cast to a fixed-size vector
+    column = f"(embedding::vector({Config.VECTOR_DIMENSIONS}))"
+    if index_type == "hnsw":
+        options = f"m = {Config.HNSW_M}, ef_construction = {Config.HNSW_EF_CONSTRUCTION}"
+    elif index_type == "ivfflat":
+        options = f"lists = {Config.IVFFLAT_LISTS}"
+    else:
+        raise ValueError(f"Unsupported vector index type: {index_type}")
+
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {EMBEDDING_TABLE} "
+        f"USING {index_type} ({column} vector_cosine_ops) WITH ({options})"
+    )
+
+def _full_text_column_definition() -> str:
+    """Build the ALTER TABLE statement adding the generated tsvector column used by hybrid search."""
+    # Adding a stored column rewrites the table once; later inserts fill it in
+    return (
+        f"ALTER TABLE {EMBEDDING_TABLE} ADD COLUMN IF NOT EXISTS {FULL_TEXT_COLUMN} tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{Config.FULL_TEXT_SEARCH_CONFIG}', coalesce(document, ''))) STORED"
+    )
+
+def _full_text_index_definition() -> str:
+    """Build the CREATE INDEX statement for the GIN index used by hybrid search."""
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {FULL_TEXT_INDEX_NAME} ON {EMBEDDING_TABLE} "
+        f"USING gin ({FULL_TEXT_COLUMN})"
+    )
+
+def _connect():
+    conn = get_db_connection()
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("SET maintenance_work_mem = %s", (Config.VECTOR_INDEX_MAINTENANCE_WORK_MEM,))
+    return conn, cursor
+
+def _drop_invalid_index(cursor, index_name: str):
+    """Drop `index_name` if a failed or interrupted CREATE INDEX CONCURRENTLY left it invalid."""
+    # IF NOT EXISTS would otherwise keep an index the planner never uses
+    cursor.execute(
+        "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+        (index_name,)
+    )
+    row = cursor.fetchone()
+    if row and row[0]:
+        print(f"Dropping invalid index {index_name}")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+def _drop_other_indexes(cursor, index_type: str):
+    for other_type, other_name in INDEX_NAMES.items():
+        if other_type != index_type:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {other_name}")
+
+def _ensure_full_text_index(cursor):
+    # A GIN index stays correct as rows change, so it is only ever created once
+    if Config.HYBRID_SEARCH_ENABLED:
+        cursor.execute(_full_text_column_definition())
+        _drop_invalid_index(cursor, FULL_TEXT_INDEX_NAME)
+        cursor.execute(_full_text_index_definition())
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {LEGACY_FULL_TEXT_INDEX_NAME}")
+
+def ensure_custom_id_index():
+    """Create the index on custom_id if it does not exist yet."""
+    conn, cursor = _connect()
+    try:
+        _drop_invalid_index(cursor, CUSTOM_ID_INDEX_NAME)
+        cursor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {CUSTOM_ID_INDEX_NAME} ON {EMBEDDING_TABLE} (custom_id)"
+        )
+    finally:
+        conn.close()
+
+def ensure_vector_index(index_type: str = None):
+    """Create the ANN (and full-text) index for the configured type if it does not exist yet."""
+    index_type = index_type or Config.VECTOR_INDEX_TYPE
+
+    conn, cursor = _connect()
+    try:
+        _ensure_full_text_index(cursor)
+        if index_type == "none":
+            return
+        _drop_other_indexes(cursor, index_type)
+        _drop_invalid_index(cursor, INDEX_NAMES[index_type])
+        cursor.execute(_index_definition(index_type, INDEX_NAMES[index_type]))
+        print(f"Vector index {INDEX_NAMES[index_type]} is in place")
+    finally:
+        conn.close()
+
+def rebuild_vector_index(index_type: str = None):
+    """Rebuild the ANN index after bulk ingestion without blocking searches.
+
+    A fresh index is built next to the current one and swapped in, which
+    also applies changed build parameters. IVFFlat in particular must be
+    rebuilt after bulk loads because its lists are trained at build time.
+    """
+    index_type = index_type or Config.VECTOR_INDEX_TYPE
+
+    conn, cursor = _connect()
+    try:
+        _ensure_full_text_index(cursor)
+        if index_type == "none":
+            return
+        index_name = INDEX_NAMES[index_type]
+        new_index_name = f"{index_name}_new"
+        _drop_other_indexes(cursor, index_type)
+        # Leftover from an interrupted rebuild
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {new_index_name}")
+        cursor.execute(_index_definition(index_type, new_index_name))
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+        cursor.execute(f"ALTER INDEX {new_index_name} RENAME TO {index_name}")
+        cursor.execute(f"ANALYZE {EMBEDDING_TABLE}")
+        print(f"Rebuilt vector index {index_name}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    # --ensure only creates a missing index; the default rebuilds it
+    if "--ensure" in sys.argv:
+        ensure_vector_index()
+    else:
+        rebuild_vector_index()
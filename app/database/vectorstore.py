@@ -1,9 +1,71 @@
 # from app.database.GeminiEmbeddings import GeminiEmbeddings
 from app.database.RateLimitedEmbeddings import RateLimitedEmbeddings
-from langchain_community.vectorstores.pgvector import PGVector
+from app.database.CachedEmbeddings import CachedEmbeddings
+from langchain_community.vectorstores.pgvector import PGVector, _get_embedding_collection_store
 from app.database.connector import get_db_connection
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from app.utils.admission import embedding_admission
+from app.utils.hedging import embedding_hedger
 from app.config import Config
+import threading
+
+# Bumped whenever an ingestion run rewrites the collection so that anything
+# derived from its contents (e.g. cached answers) can tell it is stale.
+# Runs in other processes (the ingestion job, other workers) are picked up
+# by `sync_collection_version` through the ingestion manifest.
+_collection_version = 0
+_collection_version_lock = threading.Lock()
+_manifest_version = None
+
+def get_collection_version() -> int:
+    """Return the current in-process version of the vector collection."""
+    return _collection_version
+
+def mark_collection_changed() -> int:
+    """Signal that the vector collection was modified by an ingestion run."""
+    global _collection_version
+    with _collection_version_lock:
+        _collection_version += 1
+        return _collection_version
+
+def sync_collection_version() -> int:
+    """Bump the in-process version if the ingestion manifest changed since the last call.
+
+    Makes a database round trip; the server calls it on an interval.
+    """
+    global _manifest_version
+    from app.database.ingestion_manifest import manifest_version
+    version = manifest_version()
+    if _manifest_version is not None and version != _manifest_version:
+        mark_collection_changed()
+    _manifest_version = version
+    return _collection_version
+
+class DeferredPGVector(PGVector):
+    """PGVector that makes no database round trips until `prepare()` is called.
+
+    The stock constructor creates the extension, tables and collection while
+    the app module is imported. The serving path only reads an existing
+    collection, so this is left to the startup warmup instead.
+    """
+
+    def __post_init__(self) -> None:
+        EmbeddingStore, CollectionStore = _get_embedding_collection_store(
+            self._embedding_length, use_jsonb=self.use_jsonb
+        )
+        self.CollectionStore = CollectionStore
+        self.EmbeddingStore = EmbeddingStore
+        self._prepared = False
+
+    def prepare(self) -> None:
+        """Run the setup the constructor skipped. Safe to call more than once."""
+        if self._prepared:
+            return
+        if self.create_extension:
+            self.create_vector_extension()
+        self.create_tables_if_not_exists()
+        self.create_collection()
+        self._prepared = True
 
 def initialize_vectorstore(for_ingestion=False):
     """Initialize the vector store with improved rate limiting for ingestion."""
@@ -19,16 +81,27 @@ def initialize_vectorstore(for_ingestion=False):
             batch_size=5,  # Process 5 documents at a time
             base_delay=2   # Wait 2 seconds between batches
         )
+    else:
+        # Memoize query embeddings for the serving path
+        embedding_function = CachedEmbeddings(
+            base_embeddings=embedding_function,
+            max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES,
+            admission=embedding_admission if Config.ADMISSION_CONTROL_ENABLED else None,
+            hedger=embedding_hedger
+        )
     
-    # Ensure PGVector still gets a valid embedding function
-    return PGVector(
+    # Ensure PGVector still gets a valid embedding function; serving defers
+    # its setup queries to the startup warmup
+    vectorstore_class = PGVector if for_ingestion else DeferredPGVector
+    return vectorstore_class(
         connection_string="postgresql+psycopg2://",
         use_jsonb=True,
         engine_args=dict(
             creator=get_db_connection,
+            pool_pre_ping=True,
         ),
-        embedding_function=embedding_function,
-        pre_delete_collection=for_ingestion
+        # Ingestion updates the collection in place (see IncrementalIngestor)
+        embedding_function=embedding_function
     )
 
 
@@ -8,7 +8,9 @@ def create_chunks(text: str, metadata: dict) -> List[Document]:
         chunk_size=1_000,
         chunk_overlap=100,
         length_function=len,
-        is_separator_regex=False
+        is_separator_regex=False,
+        # Lets the context builder merge adjacent chunks of a source exactly
+        add_start_index=True
     )
 
     return text_splitter.create_documents(
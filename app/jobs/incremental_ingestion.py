@@ -0,0 +1,233 @@
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+import hashlib
+import uuid
+from langchain.docstore.document import Document
+from app.database.ingestion_manifest import IngestionManifest, update_chunk_metadata
+from app.database.vectorstore import mark_collection_changed
+from app.utils.tracing import start_span
+from app.config import Config
+
+def content_hash(content) -> str:
+    """SHA-256 of text or bytes."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+class IncrementalIngestor:
+    """Brings the vector collection in line with the current sources, touching only what changed.
+
+    Each source (file or web page) is compared with the manifest. Unchanged
+    sources are skipped, changed ones are re-chunked and only chunks whose
+    text is new get embedded; chunks whose text survived keep their
+    embedding (with refreshed metadata) and the rest are deleted. Sources
+    that disappeared are removed with `remove_unseen`.
+
+    Without a manifest (the first run, or `full_refresh`) the collection is
+    emptied first, since chunks stored before the manifest existed are not
+    tracked by it.
+    """
+
+    def __init__(self, store, manifest: Optional[IngestionManifest] = None, full_refresh: bool = False,
+                 batch_size: int = 20):
+        self.store = store
+        self.manifest = manifest or IngestionManifest()
+        self.batch_size = batch_size
+        self.entries = self.manifest.load()
+        self.full_refresh = full_refresh or not self.entries
+        if self.full_refresh:
+            print("Full refresh: clearing the collection and the ingestion manifest")
+            self.store.delete_collection()
+            self.store.create_collection()
+            self.manifest.clear()
+            self.entries = {}
+            mark_collection_changed()
+        self.seen: Set[str] = set()
+        self.stats = defaultdict(int)
+
+    @property
+    def changed(self) -> bool:
+        return self.full_refresh or any(
+            self.stats[key] for key in ("chunks_embedded", "chunks_deleted", "sources_removed")
+        )
+
+    def is_unchanged(self, source: str, fingerprint: Optional[str]) -> bool:
+        """Whether `source` can be skipped without fetching it, because its fingerprint is unchanged."""
+        self.seen.add(source)
+        entry = self.entries.get(source)
+        if entry and fingerprint and entry["fingerprint"] == fingerprint and entry["content_hash"]:
+            self.stats["sources_unchanged"] += 1
+            return True
+        return False
+
+    def sync_source(self, source: str, source_type: str, source_hash: str,
+                    make_chunks: Callable[[], List[Document]], parent: Optional[str] = None,
+                    fingerprint: Optional[str] = None):
+        """Store the chunks of a new or changed source; `make_chunks` is only called if it changed."""
+        self.seen.add(source)
+        entry = self.entries.get(source)
+        if entry and entry["content_hash"] == source_hash:
+            # Same content under a new fingerprint (e.g. the same file uploaded again)
+            if entry["fingerprint"] != fingerprint or entry["parent"] != parent:
+                self.manifest.upsert(source, source_type, parent, fingerprint, source_hash, entry["chunks"])
+            self.stats["sources_unchanged"] += 1
+            return
+
+        chunks = make_chunks()
+        previous = entry["chunks"] if entry else []
+        reusable: Dict[str, List[str]] = defaultdict(list)
+        unconfirmed = []
+        for chunk in previous:
+            if chunk["hash"]:
+                reusable[chunk["hash"]].append(chunk["id"])
+            else:
+                # Left by a run that died halfway; it may never have been stored
+                unconfirmed.append(chunk["id"])
+
+        records, kept, new = [], [], []
+        for chunk in chunks:
+            chunk_hash = content_hash(chunk.page_content)
+            if reusable[chunk_hash]:
+                chunk_id = reusable[chunk_hash].pop()
+                kept.append((chunk_id, chunk.metadata))
+            else:
+                chunk_id = str(uuid.uuid4())
+                new.append((chunk_id, chunk))
+            records.append({"hash": chunk_hash, "id": chunk_id})
+        obsolete = [chunk_id for ids in reusable.values() for chunk_id in ids] + unconfirmed
+
+        with start_span("sync_source", {"source": source, "chunks.new": len(new), "chunks.kept": len(kept)}):
+            # Record the new and obsolete chunk ids before storing or deleting them, without
+            # a content hash, so a run that dies halfway redoes this source, deletes them and
+            # embeds the new chunks again rather than reusing ids that may not exist
+            new_ids = {chunk_id for chunk_id, _ in new}
+            pending = (
+                [record for record in records if record["id"] not in new_ids]
+                + [{"hash": None, "id": chunk_id} for chunk_id in sorted(new_ids) + obsolete]
+            )
+            self.manifest.upsert(source, source_type, parent, fingerprint, None, pending)
+            for i in range(0, len(new), self.batch_size):
+                batch = new[i:i + self.batch_size]
+                self.store.add_texts(
+                    texts=[chunk.page_content for _, chunk in batch],
+                    metadatas=[chunk.metadata for _, chunk in batch],
+                    ids=[chunk_id for chunk_id, _ in batch]
+                )
+            update_chunk_metadata(kept)
+            if obsolete:
+                self.store.delete(ids=obsolete)
+            self.manifest.upsert(source, source_type, parent, fingerprint, source_hash, records)
+
+        self.entries[source] = {
+            "source": source, "source_type": source_type, "parent": parent,
+            "fingerprint": fingerprint, "content_hash": source_hash, "chunks": records,
+        }
+        self.stats["sources_updated" if entry else "sources_added"] += 1
+        self.stats["chunks_embedded"] += len(new)
+        self.stats["chunks_reused"] += len(kept)
+        self.stats["chunks_deleted"] += len(obsolete)
+        if new or obsolete:
+            mark_collection_changed()
+
+    def remove_unseen(self, source_type: str, keep_parents: Optional[Set[str]] = None):
+        """Delete the sources of `source_type` this run did not see, and their chunks.
+
+        Sources whose parent is in `keep_parents` are left alone, e.g. the pages
+        of a website that could not be scraped this time.
+        """
+        removed = [
+            entry for source, entry in self.entries.items()
+            if entry["source_type"] == source_type and source not in self.seen
+            and not (keep_parents and entry["parent"] in keep_parents)
+        ]
+        if not removed:
+            return
+        chunk_ids = [chunk["id"] for entry in removed for chunk in entry["chunks"]]
+        with start_span("remove_sources", {"source.type": source_type, "sources": len(removed)}):
+            if chunk_ids:
+                self.store.delete(ids=chunk_ids)
+            self.manifest.delete(entry["source"] for entry in removed)
+        for entry in removed:
+            del self.entries[entry["source"]]
+            print(f"Removed {entry['source']} ({len(entry['chunks'])} chunks)")
+        self.stats["sources_removed"] += len(removed)
+        self.stats["chunks_deleted"] += len(chunk_ids)
+        mark_collection_changed()
+
+    @property
+    def total_chunks(self) -> int:
+        return sum(len(entry["chunks"]) for entry in self.entries.values())
+
+    def should_rebuild_index(self) -> bool:
+        """Rebuild the ANN index after a full refresh or a large change; smaller changes are
+        absorbed by the existing index."""
+        churn = self.stats["chunks_embedded"] + self.stats["chunks_deleted"]
+        return self.full_refresh or churn > Config.INGESTION_REBUILD_INDEX_FRACTION * max(self.total_chunks, 1)
+
+def file_fingerprint(file: dict) -> Optional[str]:
+    """Change marker of a storage object from its listing, so unchanged files are not downloaded."""
+    metadata = file.get("metadata") or {}
+    if metadata.get("eTag"):
+        return metadata["eTag"].strip('"')
+    if file.get("updated_at") and metadata.get("size") is not None:
+        return f"{file['updated_at']}:{metadata['size']}"
+    return None
+
+def sync_files(ingestor: IncrementalIngestor, storage_handler, files: List[dict],
+               on_progress: Callable[[int, int], None] = lambda done, total: None):
+    """Ingest new and changed storage files and remove the chunks of deleted ones."""
+    from app.document_processing.preprocess_documents import preprocess_document, SupabaseBlob
+    from app.document_processing.chunking import create_chunks
+
+    for idx, file in enumerate(files):
+        on_progress(idx, len(files))
+        file_name = file["name"]
+        fingerprint = file_fingerprint(file)
+        if ingestor.is_unchanged(file_name, fingerprint):
+            continue
+        try:
+            with start_span("process_document", {"file.name": file_name}):
+                file_content = storage_handler.bucket.download(file_name)
+
+                def make_chunks():
+                    blob = SupabaseBlob(file_content, file_name)
+                    result = preprocess_document(blob, file_name.split(".")[-1].lower())
+                    return create_chunks(result["text"], result["metadata"])
+
+                ingestor.sync_source(file_name, "file", content_hash(file_content), make_chunks,
+                                     fingerprint=fingerprint)
+            print(f"Synced {file_name}")
+        except Exception as e:
+            print(f"Error processing {file_name}: {str(e)}")
+
+    if files:
+        ingestor.remove_unseen("file")
+    else:
+        # Listing errors also come back empty; never wipe every file because of one
+        print("Warning: No files listed, keeping previously ingested files")
+
+def sync_web_sources(ingestor: IncrementalIngestor, sites: List[str],
+                     on_progress: Callable[[int, int], None] = lambda done, total: None):
+    """Scrape `sites` and ingest new and changed pages; pages and sites that are gone are removed."""
+    from app.document_processing.chunking import create_chunks
+    from app.scraper.process_web_sources import process_web_sources
+
+    failed_sites = set()
+    for idx, site in enumerate(sites):
+        on_progress(idx, len(sites))
+        with start_span("process_web_sources", {"web_sources": 1, "site": site}):
+            try:
+                documents = process_web_sources([site])
+            except Exception as e:
+                print(f"Error scraping {site}: {str(e)}")
+                documents = []
+            if not documents:
+                # Keep the site's pages rather than treat a failed scrape as removal
+                failed_sites.add(site)
+            for doc in documents:
+                ingestor.sync_source(
+                    doc.metadata["source"], "web", content_hash(doc.page_content),
+                    lambda doc=doc: create_chunks(doc.page_content, doc.metadata),
+                    parent=site
+                )
+    ingestor.remove_unseen("web", keep_parents=failed_sites)
@@ -1,14 +1,19 @@
-from app.document_processing.preprocess_documents import preprocess_document, SupabaseBlob
 from app.database.vectorstore import initialize_vectorstore
-from app.scraper.process_web_sources import process_web_sources
+from app.database.vector_index import ensure_vector_index, rebuild_vector_index
+from app.database.local_vector_index import sync_local_vector_index
+from app.jobs.incremental_ingestion import IncrementalIngestor, sync_files, sync_web_sources
 from app.storage.supabase_storage_handler import SupabaseStorageHandler
-from app.document_processing.chunking import create_chunks
-from tqdm import tqdm
+from app.utils.tracing import start_span
 from app.config import Config
 from supabase import create_client, Client
 from datetime import datetime, timezone
+import sys
 
-def run_vectorstore_ingestor():
+def run_vectorstore_ingestor(full_refresh: bool = False):
+    with start_span("ingestion", {"ingestion.full_refresh": full_refresh}):
+        return _run_vectorstore_ingestor(full_refresh)
+
+def _run_vectorstore_ingestor(full_refresh: bool = False):
     # Initialize storage handler
     gcs_handler = SupabaseStorageHandler()
 
@@ -20,30 +25,16 @@ def run_vectorstore_ingestor():
     supported_files = gcs_handler.list_files_by_extension(["pdf", "docx", "pptx"])
     print(f"Number of files found: {len(supported_files)}")
 
-    # Set up PGVector instance
-    store = initialize_vectorstore(for_ingestion=True)
+    # Set up PGVector instance; only new and changed sources are processed
+    ingestor = IncrementalIngestor(initialize_vectorstore(for_ingestion=True), full_refresh=full_refresh)
 
-    # Process files from GCS
-    all_chunks = []
-    for file in tqdm(supported_files, desc="Processing files in storage"):
-        try:
-            file_name = file['name']
-            # print(f"\nProcessing: {file_name}")
-            file_type = file_name.split(".")[-1].lower()
-            # Download file
-            file_content = gcs_handler.bucket.download(file_name)
-            blob = SupabaseBlob(file_content, file_name)
-            result = preprocess_document(blob, file_type)
-            chunks = create_chunks(result["text"], result["metadata"])
-            print(f"Created {len(chunks)} chunks from {file_name}\n")
-            all_chunks.extend(chunks)
-        except Exception as e:
-            print(f"Error processing {file_name}: {str(e)}")
+    # Process files from storage
+    print("\nProcessing files in storage")
+    sync_files(ingestor, gcs_handler, supported_files)
 
     # Process web sources
     try:
         response = supabase.table("rag_websites").select("url").execute()
-        web_sources = [row["url"] for row in response.data]
     except Exception as e:
         raise Exception(f"Ingestion failed: {e}")
     
@@ -58,44 +49,32 @@ def run_vectorstore_ingestor():
                 {"last_scraped": current_time}
             ).eq("url", item["url"]).execute()
 
-    # Process web sources
-    # web_sources = [
-    #     "https://sites.google.com/view/pupous",
-    #     "https://pupsinta.freshservice.com/support/solutions",
-    #     "https://www.pup.edu.ph/"
-    #     # Add more URLs as needed
-    # ]
-    
     print("\nProcessing web sources")
-    web_documents = process_web_sources(web_sources)
-    for doc in web_documents:
-        chunks = create_chunks(doc.page_content, doc.metadata)
-        all_chunks.extend(chunks)
-    print(f"Created {len(chunks)} chunks from web sources")
+    sync_web_sources(ingestor, web_sources)
+
+    stats = {**ingestor.stats, "full_refresh": ingestor.full_refresh, "total_chunks": ingestor.total_chunks}
+    print(f"Ingestion stats: {stats}")
+
+    if ingestor.changed:
+        # Rebuild the ANN index after large changes; the index absorbs small ones
+        try:
+            if ingestor.should_rebuild_index():
+                with start_span("rebuild_vector_index"):
+                    rebuild_vector_index()
+            else:
+                ensure_vector_index()
+        except Exception as e:
+            print(f"Warning: Vector index update failed: {e}")
 
-    stats = {"total_chunks": len(all_chunks), "batches_saved": 0}
-    
-    # Store chunks in the database
-    print("\nStoring chunks to the database")
-    if all_chunks:
         try:
-            batch_size = 20  # Adjust based on your needs
-            for i in range(0, len(all_chunks), batch_size):
-                batch = all_chunks[i:i + batch_size]
-                texts = [chunk.page_content for chunk in batch]
-                metadatas = [chunk.metadata for chunk in batch]
-                ids = store.add_texts(texts=texts, metadatas=metadatas)
-                stats["batches_saved"] += 1
-                print(f"Successfully saved batch {i//batch_size + 1}/{(len(all_chunks) + batch_size - 1)//batch_size}")
-            
-            stats["avg_chunk_size"] = sum(len(c.page_content) for c in all_chunks) // len(all_chunks)
-            print(f"Successfully saved all {len(all_chunks)} chunks to the database")
-            print(f"Average chunk size: {sum(len(c.page_content) for c in all_chunks) / len(all_chunks):.0f} characters")
+            with start_span("sync_local_vector_index"):
+                sync_local_vector_index()
         except Exception as e:
-            print(f"Error saving to database: {str(e)}")
+            print(f"Warning: Local vector index sync failed: {e}")
     else:
-        print("No chunks to save to the database")
+        print("No changes to the knowledge bank")
     return stats
 
 if __name__ == "__main__":
-    run_vectorstore_ingestor()
\ No newline at end of file
+    # --full-refresh re-ingests every source from scratch
+    run_vectorstore_ingestor(full_refresh="--full-refresh" in sys.argv)
@@ -35,7 +35,7 @@ class UserResponse(BaseModel):
     display_name: Optional[str]
     email_confirmed: bool
     created_at: datetime
-    role: str
+    role: Optional[str] = None
 
 class AuthResponse(BaseModel):
     access_token: Optional[str] = None
@@ -64,4 +64,6 @@ class PasswordUpdateRequest(BaseModel):
 class TokenPayload(BaseModel):
     sub: Optional[str] = None
     exp: Optional[int] = None
-    email: Optional[str] = None
\ No newline at end of file
+    email: Optional[str] = None
+    role: Optional[str] = None
+    session_id: Optional[str] = None
\ No newline at end of file
@@ -1,8 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
-from supabase import Client
-from app.config import Config
+from supabase import AsyncClient
 from app.models.auth import (
     SignUpRequest, 
     SignInRequest, 
@@ -11,7 +10,8 @@ from app.models.auth import (
     PasswordResetRequest,
     PasswordUpdateRequest
 )
-from app.utils.auth_utils import verify_jwt_token
+from app.utils.auth_utils import verify_jwt_token, resolve_user, forget_token
+from app.database.supabase_client import get_supabase_client, get_supabase_auth_client
 import logging
 
 # Initialize router
@@ -22,20 +22,15 @@ security = HTTPBearer()
 
 # logger = logging.getLogger(__name__)
 
-def get_supabase_client() -> Client:
-    """Dependency to get Supabase client"""
-    from supabase import create_client
-    return create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
-
 @router.post("/signup", response_model=AuthResponse)
 async def sign_up(
     request: SignUpRequest,
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_auth_client)
 ):
     """Register a new user"""
     try:
         # Sign up user with Supabase Auth
-        response = supabase.auth.sign_up({
+        response = await supabase.auth.sign_up({
             "email": request.email,
             "password": request.password,
             "options": {
@@ -54,14 +49,14 @@ async def sign_up(
         
         # Fetch the user's role from the profiles table
         user_id = response.user.id
-        profile = supabase.table('profiles') \
+        profile = await supabase.table('profiles') \
                          .select('role') \
                          .eq('user_id', user_id) \
                          .execute()
         
         if not profile.data:
             # Attempt to clean up orphaned user if profile creation failed
-            supabase.auth.admin.delete_user(user_id)
+            await supabase.auth.admin.delete_user(user_id)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="User profile could not be created"
@@ -94,11 +89,11 @@ async def sign_up(
 @router.post("/signin", response_model=AuthResponse)
 async def sign_in(
     request: SignInRequest,
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_auth_client)
 ):
     """Sign in an existing user"""
     try:
-        response = supabase.auth.sign_in_with_password({
+        response = await supabase.auth.sign_in_with_password({
             "email": request.email,
             "password": request.password
         })
@@ -110,7 +105,7 @@ async def sign_in(
             )
 
         # NEW: Get role from profiles table
-        profile = supabase.table('profiles') \
+        profile = await supabase.table('profiles') \
                          .select('role') \
                          .eq('user_id', response.user.id) \
                          .execute()
@@ -148,15 +143,16 @@ async def sign_in(
 @router.post("/signout")
 async def sign_out(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_auth_client)
 ):
     """Sign out the current user"""
     try:
         # Set the session token for the request
-        supabase.auth.set_session(credentials.credentials, "")
+        await supabase.auth.set_session(credentials.credentials, "")
         
         # Sign out
-        supabase.auth.sign_out()
+        await supabase.auth.sign_out()
+        forget_token(credentials.credentials)
         
         return {"message": "Successfully signed out"}
         
@@ -170,7 +166,7 @@ async def sign_out(
 @router.post("/refresh")
 async def refresh_token(
     request: dict,
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_auth_client)
 ):
     """Refresh access token using refresh token"""
     try:
@@ -181,7 +177,7 @@ async def refresh_token(
                 detail="Refresh token is required"
             )
         
-        response = supabase.auth.refresh_session(refresh_token)
+        response = await supabase.auth.refresh_session(refresh_token)
         
         if response.session is None:
             raise HTTPException(
@@ -205,42 +201,20 @@ async def refresh_token(
 @router.get("/me", response_model=UserResponse)
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ):
     """Get current user information"""
     try:
-        # Get user from Supabase
-        response = supabase.auth.get_user(credentials.credentials)
+        # Verified locally and served from the user cache when possible
+        user = await resolve_user(credentials.credentials, supabase)
         
-        if response.user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token"
-            )
-
-        # NEW: Get role from profiles table
-        profile = supabase.table('profiles') \
-                         .select('role') \
-                         .eq('user_id', response.user.id) \
-                         .execute()
-        
-        if not profile.data:
+        if user.role is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User profile not found"
             )
 
-        role = profile.data[0]['role']
-
-        return UserResponse(
-            id=response.user.id,
-            email=response.user.email,
-            full_name=response.user.user_metadata.get("full_name"),
-            display_name=response.user.user_metadata.get("display_name"),
-            email_confirmed=response.user.email_confirmed_at is not None,
-            created_at=response.user.created_at,
-            role=role
-        )
+        return user
         
     except Exception as e:
         # logger.error(f"Get user error: {str(e)}")
@@ -252,11 +226,11 @@ async def get_current_user(
 @router.post("/forgot-password")
 async def forgot_password(
     request: PasswordResetRequest,
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ):
     """Send password reset email"""
     try:
-        supabase.auth.reset_password_email(request.email)
+        await supabase.auth.reset_password_email(request.email)
         
         return {"message": "Password reset email sent successfully"}
         
@@ -271,15 +245,15 @@ async def forgot_password(
 async def update_password(
     request: PasswordUpdateRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_auth_client)
 ):
     """Update user password"""
     try:
         # Set the session token
-        supabase.auth.set_session(credentials.credentials, "")
+        await supabase.auth.set_session(credentials.credentials, "")
         
         # Update password
-        response = supabase.auth.update_user({
+        response = await supabase.auth.update_user({
             "password": request.new_password
         })
         
@@ -301,7 +275,7 @@ async def update_password(
 @router.post("/resend-confirmation")
 async def resend_confirmation(
     request: dict,
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ):
     """Resend email confirmation"""
     try:
@@ -312,7 +286,7 @@ async def resend_confirmation(
                 detail="Email is required"
             )
         
-        supabase.auth.resend(type="signup", email=email)
+        await supabase.auth.resend(type="signup", email=email)
         
         return {"message": "Confirmation email sent successfully"}
         
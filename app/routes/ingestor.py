@@ -23,12 +23,10 @@ from fastapi import APIRouter, HTTPException, status, BackgroundTasks
 from sse_starlette.sse import EventSourceResponse
 import asyncio
 from contextlib import asynccontextmanager
-from app.document_processing.preprocess_documents import preprocess_document, SupabaseBlob
 from app.database.vectorstore import initialize_vectorstore
-from app.scraper.process_web_sources import process_web_sources
-from app.storage.supabase_storage_handler import SupabaseStorageHandler
-from app.document_processing.chunking import create_chunks
-from tqdm import tqdm
+from app.database.vector_index import ensure_vector_index, rebuild_vector_index
+from app.database.local_vector_index import sync_local_vector_index
+from app.utils.tracing import current_span, start_span
 from app.config import Config
 from supabase import create_client, Client
 from datetime import datetime, timezone
@@ -50,9 +48,17 @@ ingestion_progress = {
 }
 
 
-def run_ingestion_task():
+def run_ingestion_task(full_refresh: bool = False):
     """Synchronous task runner in a separate thread"""
+    with start_span("ingestion", {"ingestion.full_refresh": full_refresh}):
+        _run_ingestion_task(full_refresh)
+
+def _run_ingestion_task(full_refresh: bool = False):
     global ingestion_progress
+    # Document parsers (fitz, python-pptx, python-docx) and the scraper (bs4)
+    # are only needed here, so they are not imported when the API starts
+    from app.jobs.incremental_ingestion import IncrementalIngestor, sync_files, sync_web_sources
+    from app.storage.supabase_storage_handler import SupabaseStorageHandler
     try:
         # Initialize progress
         ingestion_progress.update({
@@ -71,8 +77,8 @@ def run_ingestion_task():
         gcs_handler = SupabaseStorageHandler()
         supabase = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
         supported_files = gcs_handler.list_files_by_extension(["pdf", "docx", "pptx"])
-        total_files = len(supported_files)
-        all_chunks = []
+        # Only new and changed sources are processed; see IncrementalIngestor
+        ingestor = IncrementalIngestor(initialize_vectorstore(for_ingestion=True), full_refresh=full_refresh)
 
         # ---------- PHASE 2: Process Files ----------
         ingestion_progress.update({
@@ -80,37 +86,19 @@ def run_ingestion_task():
             "percentage": 10
         })
 
-        for idx, file in enumerate(supported_files):
-            # Update progress for each file
-            progress = 10 + int((idx/total_files)*25)
+        def on_file(idx, total_files):
             ingestion_progress.update({
                 "message": f"Processing document {idx+1}/{total_files}",
-                "percentage": progress
+                "percentage": 10 + int((idx/total_files)*50)
             })
 
-            try:
-                file_name = file['name']
-                print(f"\nProcessing: {file_name}")
-                file_content = gcs_handler.bucket.download(file_name)
-                blob = SupabaseBlob(file_content, file_name)
-                result = preprocess_document(blob, file_name.split(".")[-1].lower())
-                chunks = create_chunks(result["text"], result["metadata"])
-                print(f"Created {len(chunks)} chunks from {file_name}\n")
-                all_chunks.extend(chunks)
-            except Exception as e:
-                print(f"Error processing {file_name}: {str(e)}")
+        sync_files(ingestor, gcs_handler, supported_files, on_file)
 
         # ---------- PHASE 3: Web Scraping ----------
         ingestion_progress.update({
             "message": "Scraping websites...",
-            "percentage": 40
+            "percentage": 60
         })
-        #         # web_sources = [
-        #         #     "https://sites.google.com/view/pupous",
-        #         #     "https://pupsinta.freshservice.com/support/solutions",
-        #         #     "https://www.pup.edu.ph/"
-        #         #     # Add more URLs as needed
-        #         # ]
         try:
             response = supabase.table("rag_websites").select("url").execute()
             web_sources = [row["url"] for row in response.data]
@@ -121,47 +109,42 @@ def run_ingestion_task():
                 if "url" in item:
                     supabase.table("rag_websites").update({"last_scraped": current_time}).eq("url", item["url"]).execute()
             
+            def on_site(idx, total_sites):
+                ingestion_progress.update({
+                    "message": f"Scraping website {idx+1}/{total_sites}",
+                    "percentage": 60 + int((idx/total_sites)*35)
+                })
+
             # Process web sources
-            web_documents = process_web_sources(web_sources)
-            for doc in web_documents:
-                chunks = create_chunks(doc.page_content, doc.metadata)
-                all_chunks.extend(chunks)
-                print(f"Created {len(chunks)} chunks from web sources")
+            sync_web_sources(ingestor, web_sources, on_site)
 
         except Exception as e:
             raise Exception(f"Web processing failed: {e}")
+        finally:
+            print(f"Ingestion stats: {dict(ingestor.stats)}")
 
-        # ---------- PHASE 4: Store Chunks ----------
-        ingestion_progress.update({
-            "message": "Storing chunks...",
-            "percentage": 70
-        })
-
-        if all_chunks:
+        if ingestor.changed:
+            # ---------- PHASE 4: Update ANN index ----------
+            ingestion_progress.update({
+                "message": "Updating vector index...",
+                "percentage": 99
+            })
             try:
-                store = initialize_vectorstore(for_ingestion=True)
-                batch_size = 20
-                total_batches = (len(all_chunks) + batch_size - 1) // batch_size
-                
-                for batch_idx in range(total_batches):
-                    # Update batch progress
-                    progress = 70 + int((batch_idx/total_batches)*30)
-                    ingestion_progress.update({
-                        "message": f"Saving batch {batch_idx+1}/{total_batches}",
-                        "percentage": progress
-                    })
-                    
-                    # Process batch
-                    start_idx = batch_idx * batch_size
-                    end_idx = start_idx + batch_size
-                    batch = all_chunks[start_idx:end_idx]
-                    texts = [chunk.page_content for chunk in batch]
-                    metadatas = [chunk.metadata for chunk in batch]
-                    store.add_texts(texts=texts, metadatas=metadatas)
-                    print(f"Successfully saved batch {batch_idx + 1}/{(len(all_chunks) + batch_size - 1)//batch_size}")
+                if ingestor.should_rebuild_index():
+                    with start_span("rebuild_vector_index"):
+                        rebuild_vector_index()
+                else:
+                    ensure_vector_index()
+            except Exception as e:
+                # Searches still work without the index, just slower
+                print(f"Warning: Vector index update failed: {e}")
 
+            # Pull the changed chunks into the in-process replica, if that backend is in use
+            try:
+                with start_span("sync_local_vector_index"):
+                    sync_local_vector_index()
             except Exception as e:
-                raise Exception(f"Chunking failed: {e}")
+                print(f"Warning: Local vector index sync failed: {e}")
 
         # ---------- COMPLETION ----------
         ingestion_progress.update({
@@ -175,10 +158,14 @@ def run_ingestion_task():
             "error": str(e),
             "active": False
         })
+        span = current_span()
+        if span:
+            span.record_exception(e)
         print(f"Ingestion failed: {str(e)}")
 
 @router.post("/ingest")
-async def start_ingestion():
+async def start_ingestion(full_refresh: bool = False):
+    """Start ingestion; only new and changed sources are processed unless `full_refresh` is set"""
     if ingestion_progress["active"]:
         raise HTTPException(status_code=400, detail="Ingestion already in progress")
     
@@ -191,7 +178,7 @@ async def start_ingestion():
     })
 
     # Run in separate thread to avoid blocking
-    thread = threading.Thread(target=run_ingestion_task)
+    thread = threading.Thread(target=run_ingestion_task, args=(full_refresh,))
     thread.start()
     
     return {"message": "Ingestion started"}
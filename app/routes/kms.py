@@ -3,18 +3,16 @@ from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile,
 from fastapi import Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, HttpUrl, validator
-from supabase import Client
+from supabase import AsyncClient
+from app.database.supabase_client import get_supabase_client
 from typing import List, Optional
 from datetime import datetime, timezone
 import uuid
 import logging
-from app.config import Config
 from app.utils.auth_utils import verify_jwt_token, get_current_user
 import mimetypes
 import requests
-from bs4 import BeautifulSoup
 import asyncio
-import aiohttp
 from fastapi import Path
 
 # Initialize router
@@ -68,17 +66,12 @@ ALLOWED_FILE_TYPES = {
 
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
-def get_supabase_client() -> Client:
-    """Dependency to get Supabase client"""
-    from supabase import create_client
-    return create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
-
 # --- File Management Routes ---
 
 @router.post("/files/upload", response_model=List[FileResponse])
 async def upload_files(
     files: List[UploadFile] = File(...),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ):
     """Upload multiple files to Supabase Storage and record metadata in rag_files table."""
     try:
@@ -104,7 +97,7 @@ async def upload_files(
             file_extension = file.filename.split('.')[-1] if '.' in file.filename else ''
             storage_filename = f"{file_id}.{file_extension}" 
             
-            storage_response = supabase.storage.from_("iskobot-documents-2.0-lms-only").upload(
+            storage_response = await supabase.storage.from_("iskobot-documents-2.0-lms-only").upload(
                 storage_filename,
                 file_content,
                 {
@@ -130,10 +123,10 @@ async def upload_files(
             }
 
             
-            db_response = supabase.table("rag_files").insert(file_record).execute()
+            db_response = await supabase.table("rag_files").insert(file_record).execute()
             
             if hasattr(db_response, 'error') and db_response.error:
-                supabase.storage.from_("iskobot-documents-2.0-lms-only").remove([storage_filename])
+                await supabase.storage.from_("iskobot-documents-2.0-lms-only").remove([storage_filename])
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=f"Failed to save file metadata for {file.filename}: {db_response.error.message}"
@@ -162,12 +155,12 @@ async def upload_files(
 
 @router.get("/files", response_model=List[FileResponse])
 async def get_user_files(
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ):
     """Get all files from the rag_files table."""
     
     try:
-        response = supabase.table("rag_files").select("id, name, size, type, uploaded_at, vectorized").execute()
+        response = await supabase.table("rag_files").select("id, name, size, type, uploaded_at, vectorized").execute()
         
         files_data = []
         if response.data: 
@@ -196,12 +189,12 @@ async def get_user_files(
 @router.delete("/files/{file_id}", status_code=204)
 async def delete_file(
     file_id: str = Path(..., description="The ID of the file to delete"),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ):
     """Delete a file from the rag_files table and Supabase storage."""
     try:
         # Step 1: Get the file metadata
-        file_query = supabase.table("rag_files").select("name").eq("id", file_id).single().execute()
+        file_query = await supabase.table("rag_files").select("name").eq("id", file_id).single().execute()
         file_data = file_query.data
 
         if not file_data:
@@ -214,16 +207,16 @@ async def delete_file(
 
         # Step 2: Delete from Supabase Storage
         try:
-            file_query = supabase.table("rag_files").select("storage_name").eq("id", file_id).single().execute()
+            file_query = await supabase.table("rag_files").select("storage_name").eq("id", file_id).single().execute()
             file_data = file_query.data
             storage_name = file_data["storage_name"]
             # Delete directly
-            supabase.storage.from_("iskobot-documents-2.0-lms-only").remove([storage_name])
+            await supabase.storage.from_("iskobot-documents-2.0-lms-only").remove([storage_name])
         except Exception as storage_err:
             logger.warning(f"Storage delete warning for {file_name}: {storage_err}")
 
         # Step 3: Delete metadata from rag_files table
-        db_response = supabase.table("rag_files").delete().eq("id", file_id).execute()
+        db_response = await supabase.table("rag_files").delete().eq("id", file_id).execute()
         if not db_response.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -242,11 +235,11 @@ async def delete_file(
 @router.get("/files/{file_id}/download")
 async def download_file(
     file_id: str = Path(..., description="The ID of the file to download"),
-    supabase: Client = Depends(get_supabase_client),
+    supabase: AsyncClient = Depends(get_supabase_client),
 ):
     try:
         # Retrieve file metadata - make sure to select both storage_name and name
-        file_query = supabase.table("rag_files").select("storage_name, name").eq("id", file_id).single().execute()
+        file_query = await supabase.table("rag_files").select("storage_name, name").eq("id", file_id).single().execute()
         
         if not file_query.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
@@ -258,7 +251,7 @@ async def download_file(
         logger.info(f"Downloading file: {storage_name}, original name: {filename}")
         
         # Download file from storage
-        file_data = supabase.storage.from_("iskobot-documents-2.0-lms-only").download(storage_name)
+        file_data = await supabase.storage.from_("iskobot-documents-2.0-lms-only").download(storage_name)
         
         if not file_data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found in storage")
@@ -285,12 +278,12 @@ async def download_file(
 ## Web Source Management Routes
 @router.get("/websites", response_model=List[WebsiteResponse])
 async def get_all_websites(
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ):
     """Get all web sources from the rag_web_sources table."""
     try:
         # Query the rag_web_sources table for all columns
-        response = supabase.table("rag_websites").select("*").execute()
+        response = await supabase.table("rag_websites").select("*").execute()
         
         websites_data = []
         if response.data:
@@ -326,11 +319,11 @@ async def get_all_websites(
 @router.delete("/websites/{website_id}", status_code=204)
 async def delete_website(
     website_id: str = Path(..., description="The ID of the website to delete"),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ):
     """Delete a website from the rag_websites table."""
     try:
-        response = supabase.table("rag_websites").delete().eq("id", website_id).execute()
+        response = await supabase.table("rag_websites").delete().eq("id", website_id).execute()
 
         # If no records were deleted, raise 404
         if not response.data:
@@ -349,11 +342,11 @@ async def delete_website(
         )
     
 @router.delete("/files/batch", status_code=200)
-async def delete_all_files_with_report(supabase: Client = Depends(get_supabase_client)):
+async def delete_all_files_with_report(supabase: AsyncClient = Depends(get_supabase_client)):
     """Delete all files from storage and database with detailed reporting"""
     try:
         # Get all files
-        files_query = supabase.table("rag_files").select("id, storage_name, name").execute()
+        files_query = await supabase.table("rag_files").select("id, storage_name, name").execute()
         
         if not files_query.data:
             return {
@@ -380,12 +373,12 @@ async def delete_all_files_with_report(supabase: Client = Depends(get_supabase_c
                 # Delete from storage
                 if storage_name:
                     try:
-                        supabase.storage.from_("iskobot-documents-2.0-lms-only").remove([storage_name])
+                        await supabase.storage.from_("iskobot-documents-2.0-lms-only").remove([storage_name])
                     except Exception as storage_err:
                         errors.append(f"Failed to delete {file_name} from storage: {str(storage_err)}")
                 
                 # Delete from database
-                db_response = supabase.table("rag_files").delete().eq("id", file_id).execute()
+                db_response = await supabase.table("rag_files").delete().eq("id", file_id).execute()
                 
                 if db_response.data:
                     successful_deletions += 1
@@ -415,7 +408,7 @@ async def delete_all_files_with_report(supabase: Client = Depends(get_supabase_c
 @router.post("/websites", status_code=201)
 async def add_website(
     website: WebsiteCreate,
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ):
     try:
         now = datetime.utcnow().isoformat()
@@ -431,7 +424,7 @@ async def add_website(
             "error_message": None,
         }
 
-        response = supabase.table("rag_websites").insert(new_website).execute()
+        response = await supabase.table("rag_websites").insert(new_website).execute()
 
         if not response.data:
             raise HTTPException(
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from app.utils.profiling import is_admin_token, profile_store
+
+# Initialize router
+router = APIRouter(prefix="/admin/profiles", tags=["Profiling"])
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Allow only callers presenting PROFILING_ADMIN_TOKEN in X-Admin-Token"""
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+
+@router.get("", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Summaries of the captured request profiles, newest first"""
+    return {"profiles": profile_store.list()}
+
+@router.get("/{profile_id}", dependencies=[Depends(require_admin)], response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """Folded stacks of one profile, for flamegraph.pl, inferno or speedscope"""
+    try:
+        folded = profile_store.read(profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if folded is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return PlainTextResponse(
+        folded,
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'}
+    )
@@ -1,40 +1,134 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from sse_starlette.sse import EventSourceResponse
 from langserve import add_routes
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.runnables import RunnablePassthrough, RunnableParallel
+from langchain_core.runnables import RunnablePassthrough, RunnableParallel, ConfigurableField
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
-from app.database.vectorstore import initialize_vectorstore
+from app.database.vectorstore import initialize_vectorstore, get_collection_version, sync_collection_version
+from app.database.async_vectorstore import AsyncPGVectorRetriever, HybridPGVectorRetriever, dispose_async_engine, warm_async_engine
+from app.database.local_vector_index import LocalVectorRetriever, get_local_vector_index
+from app.cache.semantic_cache import SemanticCache
 from app.models.Query import Query, QueryRequest, QueryResponse
 from app.transcripts_processing.transcriber import transcribe_audio
 from app.utils.retry_with_backoff import retry_with_backoff
+from app.utils.batched_writer import BatchedWriter
+from app.utils.context_builder import ContextBuilder
+from app.utils.single_flight import SingleFlight, SingleFlightRunnable
+from app.utils.admission import AdmittedChatGoogleGenerativeAI, llm_admission, embedding_admission
+from app.utils.hedging import llm_hedger, embedding_hedger
+from app.utils.deadline import DeadlineExceeded, set_deadline, with_retrieval_deadline
+from app.utils.ttl_cache import TTLCache
+from app.utils.warmup import Warmup
+from app.utils.metrics import MetricsMiddleware, llm_metrics_handler, render_metrics
+from app.utils.tracing import TRACE_ID_HEADER, TracingMiddleware, start_span, tracing_handler
+from app.utils.profiling import PROFILE_ID_HEADER, ProfilingMiddleware, profiling_enabled
+from app.database.supabase_client import init_supabase_client, close_supabase_client
 from google.api_core.exceptions import ResourceExhausted
-from supabase import create_client, Client
 import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
 import tempfile
 import requests
 from pydantic import BaseModel
-from gradio_client import Client, handle_file
 from app.config import Config
 from app.routes.auth import router as auth_router
 from app.routes.kms import router as kms_router
 from app.routes.ingestor import router as ingestor_router
-from elevenlabs.client import ElevenLabs
+from app.routes.profiling import router as profiling_router
 from app.sessions import create_sessions_router, create_chat_router
-from supabase import create_client
-
-supabase: Client = create_client(
-    Config.SUPABASE_URL,
-    Config.SUPABASE_KEY
-)
-
-elevenlabs = ElevenLabs(
-    api_key=Config.ELEVENLABS_API_KEY
+from app.sessions.pagination import NEXT_CURSOR_HEADER
+from app.sessions.service import history_cache
+
+_elevenlabs = None
+
+def get_elevenlabs_client():
+    """The ElevenLabs client, created (and the SDK imported) on the first /speech request"""
+    global _elevenlabs
+    if _elevenlabs is None:
+        from elevenlabs.client import ElevenLabs
+        _elevenlabs = ElevenLabs(api_key=Config.ELEVENLABS_API_KEY)
+    return _elevenlabs
+
+query_log_writer = BatchedWriter(
+    "query_logs",
+    batch_size=Config.QUERY_LOG_BATCH_SIZE,
+    flush_interval_ms=Config.QUERY_LOG_FLUSH_INTERVAL_MS,
+    max_queue_size=Config.QUERY_LOG_MAX_QUEUE_SIZE,
+    drop_policy=Config.QUERY_LOG_DROP_POLICY
 )
 
-app = FastAPI()
+async def sync_local_vector_index_periodically():
+    """Pick up collection changes made by other processes (e.g. the ingestion job)."""
+    while True:
+        await asyncio.sleep(Config.LOCAL_VECTOR_INDEX_SYNC_SECONDS)
+        try:
+            await asyncio.to_thread(get_local_vector_index(vectorstore.collection_name).sync)
+        except Exception as e:
+            print(f"Warning: Local vector index sync failed: {e}")
+
+async def sync_collection_version_periodically():
+    """Drop cached retrieval results once the collection changes, in any process."""
+    version = get_collection_version()
+    while True:
+        try:
+            await asyncio.to_thread(sync_collection_version)
+        except Exception as e:
+            print(f"Warning: Collection version sync failed: {e}")
+        # The semantic cache checks the version itself on every lookup
+        if get_collection_version() != version:
+            version = get_collection_version()
+            retrieval_cache.clear()
+        await asyncio.sleep(Config.COLLECTION_VERSION_SYNC_SECONDS)
+
+warmup = Warmup(timeout_seconds=Config.WARMUP_TIMEOUT_SECONDS)
+
+def add_warmup_steps(supabase):
+    """Connections and clients to establish before the first request needs them"""
+    if not Config.WARMUP_ENABLED:
+        return
+    warmup.add("vectorstore", lambda: asyncio.to_thread(vectorstore.prepare))
+    if Config.RETRIEVAL_BACKEND != "local":
+        warmup.add("db_pool", lambda: warm_async_engine(Config.WARMUP_DB_CONNECTIONS))
+    warmup.add("supabase", lambda: supabase.table("sessions").select("id").limit(1).execute())
+    warmup.add("embeddings", lambda: vectorstore.embedding_function.aembed_query("warmup"))
+    if Config.WARMUP_LLM:
+        warmup.add("llm", lambda: llm.ainvoke("ping", generation_config={"max_output_tokens": 1}))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled async Supabase client for the whole worker
+    supabase = await init_supabase_client()
+    query_log_writer.start(supabase)
+
+    # Serve right away; /ready turns 200 once the warmup steps are done
+    add_warmup_steps(supabase)
+    warmup_task = asyncio.create_task(warmup.run())
+
+    version_task = None
+    if Config.COLLECTION_VERSION_SYNC_SECONDS > 0:
+        version_task = asyncio.create_task(sync_collection_version_periodically())
+
+    sync_task = None
+    if Config.RETRIEVAL_BACKEND == "local":
+        stats = await asyncio.to_thread(get_local_vector_index(vectorstore.collection_name).sync)
+        print(f"Local vector index ready: {stats}")
+        if Config.LOCAL_VECTOR_INDEX_SYNC_SECONDS > 0:
+            sync_task = asyncio.create_task(sync_local_vector_index_periodically())
+    yield
+    warmup_task.cancel()
+    if sync_task is not None:
+        sync_task.cancel()
+    if version_task is not None:
+        version_task.cancel()
+    # Flush buffered query logs before the worker exits
+    await query_log_writer.stop()
+    await close_supabase_client()
+    await dispose_async_engine()
+
+app = FastAPI(lifespan=lifespan)
 
 # xtts_client = Client("jimmyvu/Coqui-Xtts-Demo")
 
@@ -50,29 +144,58 @@ app.add_middleware(
     ],
     allow_credentials=True,
     allow_methods=["GET", "POST", "DELETE"],
-    allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+    allow_headers=["Content-Type", "Authorization", "X-Requested-With", "traceparent"],
+    expose_headers=[TRACE_ID_HEADER, PROFILE_ID_HEADER, NEXT_CURSOR_HEADER],
 )
 
+# Per-endpoint request latency; also labels per-stage metrics with the route
+app.add_middleware(MetricsMiddleware)
+# Opt-in per-request profiles; not installed at all unless configured
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+# Traces each request and returns its trace ID in the X-Trace-Id header
+app.add_middleware(TracingMiddleware)
+
 
 # (1) Initialize VectorStore
 vectorstore = initialize_vectorstore()
 
 # (2) Build retriever
-def format_docs(docs):
-    formatted_docs = []
-    for doc in docs:
-        source = doc.metadata.get('source', 'Unknown')
-        content = doc.page_content
-        formatted_docs.append(f"Source: {source}\nContent: {content}")
-    return "\n\n---\n\n".join(formatted_docs)
-
-knowledge_bank_retriever = vectorstore.as_retriever(
-    search_type="similarity",
-    search_kwargs={
-        "k": 5,
-        "score_threshold": 0.5
-    }
-) | format_docs
+# Retrieved chunks are merged per source and capped at the knowledge bank token budget
+context_builder = ContextBuilder(token_budget=Config.CONTEXT_TOKEN_BUDGET)
+
+if Config.RETRIEVAL_BACKEND == "local":
+    # Top-k over an in-process memory-mapped replica; no database round trip
+    local_index = get_local_vector_index(vectorstore.collection_name)
+    retriever = LocalVectorRetriever(vectorstore=vectorstore, index=local_index, k=5)
+    degraded_retriever = LocalVectorRetriever(vectorstore=vectorstore, index=local_index, k=Config.DEGRADED_RETRIEVAL_K)
+else:
+    # Similarity search runs on the pooled asyncpg engine for async callers, fused
+    # with full-text search when hybrid search is enabled
+    # ef_search/probes can be tuned per request via config={"configurable": {...}}
+    search_parameters = dict(
+        ef_search=Config.HNSW_EF_SEARCH if Config.VECTOR_INDEX_TYPE == "hnsw" else None,
+        probes=Config.IVFFLAT_PROBES if Config.VECTOR_INDEX_TYPE == "ivfflat" else None
+    )
+    retriever_class = HybridPGVectorRetriever if Config.HYBRID_SEARCH_ENABLED else AsyncPGVectorRetriever
+    retriever = retriever_class(vectorstore=vectorstore, k=5, **search_parameters).configurable_fields(
+        ef_search=ConfigurableField(id="ef_search", name="HNSW ef_search"),
+        probes=ConfigurableField(id="probes", name="IVFFlat probes")
+    )
+    # Vector-only with fewer results when the full search overruns its deadline share
+    degraded_retriever = AsyncPGVectorRetriever(
+        vectorstore=vectorstore,
+        k=Config.DEGRADED_RETRIEVAL_K,
+        **search_parameters
+    )
+
+retrieval_cache = TTLCache(max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES, ttl_seconds=Config.SEMANTIC_CACHE_TTL_SECONDS)
+knowledge_bank_retriever = with_retrieval_deadline(
+    retriever,
+    degraded_retriever,
+    Config.RETRIEVAL_DEADLINE_SHARE,
+    retrieval_cache
+) | context_builder.build
 
 # (3) Create prompt template
 prompt_template = PromptTemplate.from_template(
@@ -95,14 +218,15 @@ Question: {query}
 Your answer: """
 )
 
-# (4) Initialize LLM
-llm = ChatGoogleGenerativeAI(
+# (4) Initialize LLM; async calls are admitted against the Gemini quota
+llm = AdmittedChatGoogleGenerativeAI(
     model="gemini-2.0-flash",
     temperature=0.2,
     max_output_tokens=500,
     top_k=40,
     top_p=0.95,
-    google_api_key=Config.GEMINI_API_KEY
+    google_api_key=Config.GEMINI_API_KEY,
+    callbacks=[llm_metrics_handler]
 )
 
 # (5) Chain everything together
@@ -114,19 +238,35 @@ chain = (
     | prompt_template
     | llm
     | StrOutputParser()
+).with_config(callbacks=[tracing_handler])
+
+# (6) Semantic answer cache in front of the /query chain
+semantic_cache = SemanticCache(
+    embedding_function=vectorstore.embedding_function,
+    similarity_threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+    max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=Config.SEMANTIC_CACHE_TTL_SECONDS
 )
 
+# (7) Identical questions asked at the same time share one chain execution
+query_flight = SingleFlight()
+chain_flight = SingleFlight()
+
+def coalescing_key(query):
+    return SemanticCache.normalize(query) if isinstance(query, str) else repr(query)
+
 # Include authentication routes
 app.include_router(auth_router)
 app.include_router(kms_router)
 app.include_router(ingestor_router)
+if Config.PROFILING_ADMIN_TOKEN:
+    app.include_router(profiling_router)
 app.include_router(
-    create_sessions_router(supabase, chain, retry_with_backoff)
+    create_sessions_router(chain, retry_with_backoff)
 )
 
 app.include_router(
     create_chat_router(
-        supabase_client=supabase,
         llm=llm,
         knowledge_bank_retriever=knowledge_bank_retriever,
         retry_with_backoff=retry_with_backoff
@@ -142,35 +282,145 @@ async def redirect_root_to_docs():
 
 # TODO: Use different query for public use and with login use
 
+QUOTA_EXCEEDED_MESSAGE = "Online prediction request quota exceeded. Please try again later."
+DEADLINE_EXCEEDED_MESSAGE = "The request took too long to answer. Please try again later."
+
+async def degraded_answer(query: str):
+    """A cached answer to a similar question, accepted at a lower similarity than usual."""
+    if not Config.SEMANTIC_CACHE_ENABLED:
+        return None
+    vector = await semantic_cache.embed(query)
+    if vector is None:
+        return None
+    return semantic_cache.get(vector, threshold=Config.SEMANTIC_CACHE_DEGRADED_THRESHOLD)
+
+def log_query(query: str, response: str):
+    """Queue query and response for a batched insert into Supabase"""
+    log_data = {
+        "query": query,
+        "response": response
+    }
+    if not query_log_writer.submit(log_data):
+        print("Warning: Query log writer dropped a log entry")
+
 # Handle query requests
 @app.post("/query", response_model=QueryRequest)
 async def get_answers_from_query(request: QueryRequest):
+    set_deadline(Config.QUERY_DEADLINE_SECONDS)
+
     async def invoke_chain():
         return await chain.ainvoke(request.query)
 
+    async def answer_query():
+        with start_span("answer_query"):
+            if Config.SEMANTIC_CACHE_ENABLED:
+                return await semantic_cache.get_or_compute(
+                    request.query,
+                    lambda: retry_with_backoff(invoke_chain)
+                )
+            return await retry_with_backoff(invoke_chain)
+
     try:
-        answer = await retry_with_backoff(invoke_chain)
+        with start_span("get_answers_from_query"):
+            answer = await query_flight.do(coalescing_key(request.query), answer_query)
         response = QueryResponse(response=answer)
-        # Log query and response to Supabase
-        log_data = {
-            "query": request.query,
-            "response": response.response
-        }
-        supabase_response = supabase.table("query_logs").insert(log_data).execute()
-
-        if not supabase_response.data:
-            print("Warning: Failed to log query and response to Supabase")
+        log_query(request.query, response.response)
 
         return JSONResponse(content=response.dict())
+    except DeadlineExceeded as e:
+        print(f"Error: {e}")
+        with start_span("degraded_answer"):
+            answer = await degraded_answer(request.query)
+        if answer is not None:
+            return JSONResponse(content=QueryResponse(response=answer).dict())
+        return JSONResponse(
+            content={
+                "error": DEADLINE_EXCEEDED_MESSAGE
+            },
+            status_code=504
+        )
     except ResourceExhausted as e:
         print(f"Error: {e}")
         return JSONResponse(
             content={
-                "error": "Online prediction request quota exceeded. Please try again later."
+                "error": QUOTA_EXCEEDED_MESSAGE
             },
             status_code=429
         )
 
+# Stream query answers token by token as Server-Sent Events
+@app.post("/query/stream")
+async def stream_answers_from_query(request: QueryRequest):
+    async def event_generator():
+        set_deadline(Config.QUERY_DEADLINE_SECONDS)
+        vector = None
+        if Config.SEMANTIC_CACHE_ENABLED:
+            vector = await semantic_cache.embed(request.query)
+            cached_answer = semantic_cache.get(vector) if vector is not None else None
+            if cached_answer is not None:
+                log_query(request.query, cached_answer)
+                yield {"event": "token", "data": json.dumps({"token": cached_answer})}
+                yield {"event": "complete", "data": json.dumps({"response": cached_answer})}
+                return
+
+        tokens = []
+        try:
+            async for token in chain.astream(request.query):
+                tokens.append(token)
+                yield {"event": "token", "data": json.dumps({"token": token})}
+        except ResourceExhausted as e:
+            print(f"Error: {e}")
+            yield {"event": "error", "data": json.dumps({"error": QUOTA_EXCEEDED_MESSAGE})}
+            return
+        except DeadlineExceeded as e:
+            print(f"Error: {e}")
+            yield {"event": "error", "data": json.dumps({"error": DEADLINE_EXCEEDED_MESSAGE})}
+            return
+
+        answer = "".join(tokens)
+        # Cache and log before the last event; a client that disconnects
+        # closes the generator at its next yield
+        if vector is not None and answer:
+            semantic_cache.put(request.query, vector, answer)
+        log_query(request.query, answer)
+        yield {"event": "complete", "data": json.dumps({"response": answer})}
+
+    return EventSourceResponse(event_generator())
+
+# Inspect the semantic answer and query embedding caches
+@app.get("/query/cache")
+async def get_query_cache_stats():
+    return {
+        "answers": semantic_cache.stats(),
+        "embeddings": vectorstore.embedding_function.stats(),
+        "query_logs": query_log_writer.stats(),
+        "context": context_builder.stats(),
+        "history": history_cache.stats(),
+        "admission": {
+            "llm": llm_admission.stats(),
+            "embedding": embedding_admission.stats()
+        },
+        "hedging": {
+            "llm": llm_hedger.stats() if llm_hedger else None,
+            "embedding": embedding_hedger.stats() if embedding_hedger else None
+        },
+        "coalescing": {
+            "query": query_flight.stats(),
+            "chain": chain_flight.stats()
+        }
+    }
+
+# Readiness probe: 503 until the startup warmup has finished
+@app.get("/ready")
+async def get_readiness():
+    return JSONResponse(content=warmup.status(), status_code=200 if warmup.ready else 503)
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 # Transcribe audio input
 @app.post("/transcribe")
 async def transcribe_speech(audio_file: UploadFile = File(...)):
@@ -182,7 +432,7 @@ async def generate_speech(message: Message):
     try:
         print(f"Generating speech for: {message.text}")
 
-        audio = elevenlabs.text_to_speech.convert(
+        audio = get_elevenlabs_client().text_to_speech.convert(
             text=message.text,
             voice_id="zZLmKvCp1i04X8E0FJ8B",
             model_id="eleven_multilingual_v2",
@@ -197,8 +447,8 @@ async def generate_speech(message: Message):
         print("Error in /speech:", e)
         return Response(content=str(e), status_code=500)
 
-# Add routes for the chain
-add_routes(app, chain)
+# Add routes for the chain; concurrent identical invocations are coalesced
+add_routes(app, SingleFlightRunnable(chain, chain_flight, coalescing_key))
 
 # Run the app
 if __name__ == "__main__":
@@ -1,10 +1,17 @@
 from fastapi import Header, HTTPException, Depends
 import uuid
 from typing import Optional
+from app.database.supabase_client import get_supabase_client
+from app.utils.auth_utils import resolve_user
 
 class AuthService:
-    def __init__(self, supabase_client):
-        self.supabase = supabase_client
+    def __init__(self, supabase_client=None):
+        self._supabase = supabase_client
+
+    @property
+    def supabase(self):
+        """The injected client, or the shared async client created in the app lifespan"""
+        return self._supabase or get_supabase_client()
     
     async def get_current_user(self, authorization: Optional[str] = Header(None)) -> uuid.UUID:
         """Extract user ID from JWT token"""
@@ -16,8 +23,8 @@ class AuthService:
         
         token = authorization.split(" ")[1]
         try:
-            # Verify JWT token with Supabase
-            user = self.supabase.auth.get_user(token)
-            return uuid.UUID(user.user.id)
+            # Verified locally and served from the user cache when possible
+            user = await resolve_user(token, self.supabase)
+            return uuid.UUID(user.id)
         except Exception as e:
             raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
@@ -1,21 +1,50 @@
 from fastapi import APIRouter, Depends, HTTPException, Security
+from sse_starlette.sse import EventSourceResponse
+from google.api_core.exceptions import ResourceExhausted
 from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+import asyncio
+import json
 import uuid
 from typing import Optional
 from .models import QueryWithSession, ChatResponse, MessageRole
 from .service import SessionService
 from .auth import AuthService
 from .memory import SessionMemory
+from .summary import SessionSummarizer
+from app.utils.admission import set_request_priority, PRIORITY_AUTHENTICATED_CHAT, PRIORITY_CHAT
+from app.utils.deadline import DeadlineExceeded, set_deadline
+from app.utils.token_counter import TokenCounter
+from app.utils.tracing import start_span, tracing_handler
+from app.config import Config
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-def create_chat_router(supabase_client, llm, knowledge_bank_retriever, retry_with_backoff):
+async def gather_or_cancel(*awaitables):
+    """Like asyncio.gather, but cancels the remaining awaitables when one fails"""
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+def create_chat_router(llm, knowledge_bank_retriever, retry_with_backoff, supabase_client=None):
     """Factory function to create the chat router with context awareness"""
     router = APIRouter(prefix="/chat", tags=["chat"])
     session_service = SessionService(supabase_client)
     auth_service = AuthService(supabase_client)
     security = HTTPBearer(auto_error=False)
+    # Keeps references to message writes that outlive a cancelled request
+    pending_writes = set()
+    # With MEMORY_MODE=summary, older turns reach the prompt as a rolling summary and
+    # the history is fitted to a token budget. Requests estimate tokens from the length;
+    # the background summarizer counts them with Gemini's tokenizer
+    if Config.MEMORY_MODE == "summary":
+        token_counter = TokenCounter(llm.get_num_tokens, timeout_seconds=Config.TOKEN_COUNT_TIMEOUT_SECONDS)
+        summarizer = SessionSummarizer(session_service, llm, token_counter=token_counter)
+    else:
+        summarizer = None
     
     async def get_optional_user(
         credentials: HTTPAuthorizationCredentials = Security(security)
@@ -59,27 +88,170 @@ def create_chat_router(supabase_client, llm, knowledge_bank_retriever, retry_wit
         user_id: Optional[uuid.UUID] = Depends(get_optional_user)
     ):
         """Enhanced chat endpoint supporting both authenticated and anonymous sessions"""
+        set_request_priority(PRIORITY_AUTHENTICATED_CHAT if user_id else PRIORITY_CHAT)
+        set_deadline(Config.CHAT_DEADLINE_SECONDS)
         try:
-            session_id = await validate_or_create_session(request, user_id)
-            await validate_session_access(session_id, user_id)
-
-            # Initialize memory with proper context
-            memory = SessionMemory(session_service, session_id, user_id)
-            await memory.load_history()
+            session_id, memory, knowledge_bank, user_message = await prepare_chat(request, user_id)
 
             # Process message and generate response
-            return await process_chat_interaction(
-                request.query, 
-                session_id, 
-                memory, 
-                user_id
-            )
+            with start_span("process_chat_interaction"):
+                return await process_chat_interaction(
+                    request.query, 
+                    session_id, 
+                    memory, 
+                    knowledge_bank,
+                    user_message
+                )
+
+        except HTTPException as he:
+            raise he
+        except DeadlineExceeded:
+            raise HTTPException(status_code=504, detail="The request took too long to answer. Please try again later.")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
+    @router.post("/stream")
+    async def stream_chat_with_context(
+        request: QueryWithSession,
+        user_id: Optional[uuid.UUID] = Depends(get_optional_user)
+    ):
+        """Streaming variant of the chat endpoint that sends tokens as Server-Sent Events"""
+        set_request_priority(PRIORITY_AUTHENTICATED_CHAT if user_id else PRIORITY_CHAT)
+        set_deadline(Config.CHAT_DEADLINE_SECONDS)
+        try:
+            session_id, memory, knowledge_bank, user_message = await prepare_chat(request, user_id)
         except HTTPException as he:
             raise he
+        except DeadlineExceeded:
+            raise HTTPException(status_code=504, detail="The request took too long to answer. Please try again later.")
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+        async def event_generator():
+            tokens = []
+            assistant_write = None
+            yield {"event": "session", "data": json.dumps({"session_id": str(session_id)})}
+            try:
+                chain_input = build_chain_input(request.query, memory, knowledge_bank)
+                async for token in context_chain.astream(chain_input):
+                    tokens.append(token)
+                    yield {"event": "token", "data": json.dumps({"token": token})}
+
+                answer = "".join(tokens)
+                assistant_write = store_message(
+                    session_id,
+                    MessageRole.ASSISTANT,
+                    answer,
+                    after=user_message
+                )
+                # Shielded, so a client disconnecting here does not cancel the write
+                assistant_message = await asyncio.shield(assistant_write)
+                if summarizer:
+                    summarizer.schedule(session_id)
+                yield {
+                    "event": "complete",
+                    "data": json.dumps({
+                        "response": answer,
+                        "session_id": str(session_id),
+                        "message_id": str(assistant_message.id)
+                    })
+                }
+            except ResourceExhausted as e:
+                print(f"Error: {e}")
+                yield {
+                    "event": "error",
+                    "data": json.dumps({
+                        "error": "Online prediction request quota exceeded. Please try again later."
+                    })
+                }
+            except DeadlineExceeded as e:
+                print(f"Error: {e}")
+                yield {
+                    "event": "error",
+                    "data": json.dumps({
+                        "error": "The request took too long to answer. Please try again later."
+                    })
+                }
+            except HTTPException as he:
+                # Storing the question or the answer failed
+                print(f"Error: {he.detail}")
+                yield {"event": "error", "data": json.dumps({"error": he.detail})}
+            finally:
+                # Persist whatever was generated if the client went away mid-stream
+                if assistant_write is None and tokens:
+                    store_message(session_id, MessageRole.ASSISTANT, "".join(tokens), after=user_message)
+
+        return EventSourceResponse(event_generator())
+
+    async def prepare_chat(request: QueryWithSession, user_id: Optional[uuid.UUID]):
+        """Validate the session, load its history and retrieve knowledge concurrently.
+
+        Returns the session id, its memory, the knowledge bank and the task
+        storing the user's message. That write starts once the session is
+        known to be accessible and its history is loaded (so the history
+        never includes the new question), and overlaps retrieval and
+        generation. History fetched for a session that fails validation is
+        discarded.
+        """
+        session_id = request.session_id
+        session = None
+        memory = SessionMemory(session_service, session_id, user_id) if session_id else None
+
+        async def open_session():
+            nonlocal session_id, session, memory
+            if session_id:
+                with start_span("validate_session_access", {"session.id": str(session_id)}):
+                    session = await validate_session_access(session_id, user_id)
+            else:
+                # A new session has no history to load
+                with start_span("validate_or_create_session"):
+                    session_id = await validate_or_create_session(request, user_id)
+                memory = SessionMemory(session_service, session_id, user_id)
+
+        async def load_history(existing: Optional[SessionMemory]):
+            if existing:
+                with start_span("load_history"):
+                    await existing.load_history()
+
+        async def retrieve_knowledge():
+            with start_span("retrieve_knowledge"):
+                return await retry_with_backoff(
+                    lambda: knowledge_bank_retriever.ainvoke(request.query, config={"callbacks": [tracing_handler]})
+                )
+
+        retrieval = asyncio.ensure_future(retrieve_knowledge())
+        try:
+            await gather_or_cancel(open_session(), load_history(memory))
+            if session:
+                await memory.refresh_if_stale(session.message_count)
+            if summarizer and session:
+                with start_span("apply_summary"):
+                    await memory.apply_summary(session.summary, session.summarized_until)
+        except BaseException:
+            retrieval.cancel()
+            raise
+        user_message = store_message(session_id, MessageRole.USER, request.query)
+        return session_id, memory, await retrieval, user_message
+
+    def store_message(session_id: uuid.UUID, role: MessageRole, content: str, after: Optional[asyncio.Task] = None) -> asyncio.Task:
+        """Store a message in the background, once the `after` write has finished.
+
+        Messages are ordered by creation time, so an answer is only written
+        after its question. The task is referenced until it completes, and
+        callers await it through `asyncio.shield`, so a cancelled request
+        does not cancel the write.
+        """
+        async def store():
+            if after:
+                await asyncio.shield(after)
+            with start_span("add_message", {"message.role": role.value}):
+                return await session_service.add_message(session_id, role, content)
+
+        task = asyncio.create_task(store())
+        pending_writes.add(task)
+        task.add_done_callback(pending_writes.discard)
+        return task
+
     async def validate_or_create_session(request: QueryWithSession, user_id: Optional[uuid.UUID]):
         """Handle session creation/validation logic"""
         if request.session_id:
@@ -90,7 +262,7 @@ def create_chat_router(supabase_client, llm, knowledge_bank_retriever, retry_wit
         return session.id
 
     async def validate_session_access(session_id: uuid.UUID, user_id: Optional[uuid.UUID]):
-        """Verify session ownership or anonymous access"""
+        """Verify session ownership or anonymous access, returning the session"""
         session = await session_service.get_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
@@ -103,20 +275,23 @@ def create_chat_router(supabase_client, llm, knowledge_bank_retriever, retry_wit
         if not user_id and session.user_id:
             raise HTTPException(status_code=403, detail="Invalid session type")
 
-    async def process_chat_interaction(query: str, session_id: uuid.UUID, memory: SessionMemory, user_id: Optional[uuid.UUID]):
-        """Handle message processing and response generation"""
-        # Store user message
-        user_message = await session_service.add_message(session_id, MessageRole.USER, query)
-        
+        return session
+
+    async def process_chat_interaction(query: str, session_id: uuid.UUID, memory: SessionMemory, knowledge_bank: str, user_message: asyncio.Task):
+        """Handle response generation and storage; the user message is already being stored"""
         # Generate context-aware response
-        answer = await generate_ai_response(query, memory)
+        with start_span("generate_ai_response"):
+            answer = await generate_ai_response(query, memory, knowledge_bank)
         
         # Store assistant message
-        assistant_message = await session_service.add_message(
+        assistant_message = await asyncio.shield(store_message(
             session_id, 
             MessageRole.ASSISTANT, 
-            answer
-        )
+            answer,
+            after=user_message
+        ))
+        if summarizer:
+            summarizer.schedule(session_id)
 
         return ChatResponse(
             response=answer,
@@ -124,21 +299,27 @@ def create_chat_router(supabase_client, llm, knowledge_bank_retriever, retry_wit
             message_id=assistant_message.id
         )
 
-    async def generate_ai_response(query: str, memory: SessionMemory):
+    # Retrieval and history are resolved before the chain runs, concurrently
+    context_chain = (
+        context_aware_prompt
+        | llm
+        | StrOutputParser()
+    ).with_config(callbacks=[tracing_handler])
+
+    def build_chain_input(query: str, memory: SessionMemory, knowledge_bank: str):
+        """Prompt variables for the context chain"""
+        return {
+            "knowledge_bank": knowledge_bank,
+            "query": query,
+            "context_section": format_context_section(memory)
+        }
+
+    async def generate_ai_response(query: str, memory: SessionMemory, knowledge_bank: str):
         """Generate context-aware AI response"""
-        context_chain = (
-            RunnableParallel({
-                "knowledge_bank": knowledge_bank_retriever,
-                "query": RunnablePassthrough(),
-                "context_section": lambda x: format_context_section(memory)
-            })
-            | context_aware_prompt
-            | llm
-            | StrOutputParser()
-        )
+        chain_input = build_chain_input(query, memory, knowledge_bank)
 
         async def invoke_chain():
-            return await context_chain.ainvoke(query)
+            return await context_chain.ainvoke(chain_input)
 
         return await retry_with_backoff(invoke_chain)
 
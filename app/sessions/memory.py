@@ -1,44 +1,120 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from langchain.schema import BaseMessage, HumanMessage, AIMessage
 from .service import SessionService
-from .models import MessageRole
+from .models import Message, MessageRole
+from .summary import MAX_MESSAGES_PER_UPDATE
+from app.utils.context_builder import estimate_tokens
+from app.utils.deadline import DeadlineExceeded, run_with_deadline, share
+from app.utils.metrics import observe_stage
+from app.config import Config
 import uuid
 
 class SessionMemory:
     """Custom memory class that integrates with database"""
     
-    def __init__(self, session_service: SessionService, session_id: uuid.UUID, user_id: uuid.UUID, window_size: int = 10):
+    def __init__(self, session_service: SessionService, session_id: uuid.UUID, user_id: uuid.UUID, window_size: int = Config.HISTORY_WINDOW_SIZE,
+                 token_budget: int = Config.HISTORY_TOKEN_BUDGET):
         self.session_service = session_service
         self.session_id = session_id
         self.user_id = user_id
         self.window_size = window_size
+        self.token_budget = token_budget
+        self.summary: Optional[str] = None
+        self.message_count: Optional[int] = None
+        self._history: List[Message] = []
         self._messages: List[BaseMessage] = []
         self._loaded = False
     
-    async def load_history(self):
-        """Load recent messages from database"""
-        if self._loaded:
+    async def load_history(self, refresh: bool = False):
+        """Load recent messages from database; the caller validates session access"""
+        if self._loaded and not refresh:
             return
         
-        messages = await self.session_service.get_session_messages(self.session_id, self.user_id)
-        # Keep only recent messages based on window size
-        recent_messages = messages[-self.window_size:] if len(messages) > self.window_size else messages
+        try:
+            with observe_stage("history_load"):
+                messages, message_count = await run_with_deadline(
+                    self.session_service.get_recent_messages(self.session_id, self.window_size, refresh=refresh),
+                    share(Config.HISTORY_DEADLINE_SHARE)
+                )
+        except DeadlineExceeded:
+            # Answer without conversation context rather than time out the request
+            print(f"Warning: Loading history of session {self.session_id} exceeded its deadline share")
+            messages, message_count = [], None
         
+        self.message_count = message_count
+        self._history = messages
+        self._set_messages(messages)
+        self._loaded = True
+
+    async def refresh_if_stale(self, message_count: int):
+        """Reload the history if it was read at a different message count than the session's.
+
+        A worker's cached window misses messages that another worker stored;
+        the session's `message_count` (kept by a trigger) reveals that.
+        """
+        if self.message_count is not None and self.message_count != message_count:
+            await self.load_history(refresh=True)
+
+    async def apply_summary(self, summary: Optional[str], summarized_until: Optional[datetime]):
+        """Replace the messages covered by the session's rolling summary with it.
+
+        The newest remaining messages are kept while they fit the token
+        budget together with the summary; older ones are dropped. Tokens are
+        estimated from the length, since this runs on every turn (the
+        summarizer keeps the verbatim tail within budget by exact counts).
+        If the summary lags behind the loaded window and the window fits,
+        the unsummarized messages before it are loaded too, at most as many
+        as one summarizer update reads.
+        """
+        budget = self.token_budget - estimate_tokens(summary or "")
+        recent = [msg for msg in self._history if summarized_until is None or msg.created_at > summarized_until]
+        kept = self._fit(recent, budget)
+
+        # A full window that the summary does not reach may have unsummarized
+        # messages before it; they only matter while everything so far fits
+        limit = MAX_MESSAGES_PER_UPDATE + Config.SUMMARY_KEEP_MESSAGES
+        if (self.window_size <= len(self._history) < limit
+                and len(kept) == len(recent) == len(self._history)):
+            try:
+                with observe_stage("history_load"):
+                    recent = await run_with_deadline(
+                        self.session_service.get_messages_after(self.session_id, summarized_until, limit, latest=True),
+                        share(Config.HISTORY_DEADLINE_SHARE)
+                    )
+                kept = self._fit(recent, budget)
+            except DeadlineExceeded:
+                print(f"Warning: Loading unsummarized messages of session {self.session_id} exceeded its deadline share")
+        
+        self.summary = summary
+        self._set_messages(kept)
+
+    @staticmethod
+    def _fit(messages: List[Message], budget: int) -> List[Message]:
+        """The newest `messages`, oldest first, whose estimated tokens fit `budget`"""
+        kept = []
+        for msg in reversed(messages):
+            tokens = estimate_tokens(msg.content)
+            if tokens > budget:
+                break
+            budget -= tokens
+            kept.append(msg)
+        return list(reversed(kept))
+
+    def _set_messages(self, messages: List[Message]):
         self._messages = []
-        for msg in recent_messages:
+        for msg in messages:
             if msg.role == MessageRole.USER:
                 self._messages.append(HumanMessage(content=msg.content))
             else:
                 self._messages.append(AIMessage(content=msg.content))
-        
-        self._loaded = True
     
     def get_context(self) -> str:
         """Get conversation context as string"""
-        if not self._messages:
+        if not self._messages and not self.summary:
             return ""
         
-        context_parts = []
+        context_parts = [f"Summary of earlier messages: {self.summary}"] if self.summary else []
         for msg in self._messages:
             role = "Human" if isinstance(msg, HumanMessage) else "Assistant"
             context_parts.append(f"{role}: {msg.content}")
@@ -47,5 +123,7 @@ class SessionMemory:
     
     def clear(self):
         """Clear memory cache"""
+        self._history = []
         self._messages = []
+        self.summary = None
         self._loaded = False
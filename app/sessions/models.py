@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
 from datetime import datetime
@@ -32,6 +32,9 @@ class Session(BaseModel):
     is_active: bool
     message_count: Optional[int] = 0
     last_message: Optional[str] = None
+    # Rolling summary for MEMORY_MODE=summary; internal, not returned by the API
+    summary: Optional[str] = Field(default=None, exclude=True)
+    summarized_until: Optional[datetime] = Field(default=None, exclude=True)
 
 class QueryWithSession(BaseModel):
     query: str
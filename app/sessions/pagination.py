@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Tuple
+import base64
+import json
+import uuid
+from fastapi import HTTPException
+
+# Response header carrying the cursor of the next page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(timestamp: datetime, row_id: uuid.UUID) -> str:
+    """Opaque cursor pointing just past the row with this sort timestamp and id"""
+    payload = json.dumps([timestamp.isoformat(), str(row_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(payload)
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def before_filter(column: str, cursor: str) -> str:
+    """PostgREST `or` filter for rows after `cursor` in (column desc, id desc) order"""
+    timestamp, row_id = decode_cursor(cursor)
+    value = f'"{timestamp.isoformat()}"'
+    return f"{column}.lt.{value},and({column}.eq.{value},id.lt.{row_id})"
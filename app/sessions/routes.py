@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
 import uuid
 from .models import Session, Message, SessionCreate, QueryWithSession, ChatResponse
 from .service import SessionService
 from .auth import AuthService
 from .memory import SessionMemory
+from .pagination import NEXT_CURSOR_HEADER
 
-def create_sessions_router(supabase_client, chain, retry_with_backoff):
+# Page size of GET /sessions/{id}/messages when a cursor is passed without a limit
+DEFAULT_MESSAGES_PAGE_SIZE = 100
+
+def create_sessions_router(chain, retry_with_backoff, supabase_client=None):
     """Factory function to create the sessions router with dependencies"""
     router = APIRouter(prefix="/sessions", tags=["sessions"])
     
@@ -28,28 +32,49 @@ def create_sessions_router(supabase_client, chain, retry_with_backoff):
 
     @router.get("/", response_model=List[Session])
     async def get_sessions(
+        response: Response,
         user_id: uuid.UUID = Depends(auth_service.get_current_user),
-        limit: int = 50
+        limit: int = Query(50, ge=1, le=100),
+        cursor: Optional[str] = None
     ):
-        """Get user's chat sessions"""
+        """Get user's chat sessions, most recently updated first.
+
+        Pass the X-Next-Cursor response header back as `cursor` for the next page.
+        """
         try:
-            sessions = await session_service.get_user_sessions(user_id, limit)
+            sessions, next_cursor = await session_service.get_user_sessions(user_id, limit, cursor)
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
             return sessions
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
     @router.get("/{session_id}/messages", response_model=List[Message])
     async def get_session_messages(
         session_id: uuid.UUID,
-        user_id: uuid.UUID = Depends(auth_service.get_current_user)
+        response: Response,
+        user_id: uuid.UUID = Depends(auth_service.get_current_user),
+        limit: Optional[int] = Query(None, ge=1, le=500),
+        cursor: Optional[str] = None
     ):
-        """Get messages for a specific session"""
+        """Get the messages of a session, oldest first.
+
+        Without `limit` or `cursor` every message is returned. Otherwise the
+        newest `limit` (default 100) are; pass the X-Next-Cursor response
+        header back as `cursor` for older messages.
+        """
+        if limit is None and cursor:
+            limit = DEFAULT_MESSAGES_PAGE_SIZE
         try:
-            messages = await session_service.get_session_messages(session_id, user_id)
+            messages, next_cursor = await session_service.get_session_messages(session_id, user_id, limit, cursor)
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
             return messages
+        except HTTPException:
+            raise
         except Exception as e:
-            if "not found" in str(e).lower():
-                raise HTTPException(status_code=404, detail="Session not found")
             raise HTTPException(status_code=500, detail=str(e))
 
     @router.put("/{session_id}/title")
@@ -1,12 +1,37 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from datetime import datetime
+import asyncio
 import uuid
 from .models import Session, Message, MessageRole, SessionCreate
-from datetime import datetime
+from .pagination import before_filter, encode_cursor
 from fastapi import HTTPException
+from app.database.supabase_client import get_supabase_client
+from app.utils.deadline import run_with_deadline
+from app.utils.metrics import observe_stage, record_cache_lookup
+from app.utils.ttl_cache import TTLCache
+from app.config import Config
+
+# Columns returned when listing sessions; message_count and last_message are
+# kept up to date by the messages_touch_session trigger (supabase/migrations)
+SESSION_LIST_COLUMNS = "id,user_id,title,created_at,updated_at,is_active,message_count,last_message"
+
+# (message count, most recent messages oldest first) of active sessions, shared
+# by every SessionService in this worker. Messages stored by this worker are
+# appended write-through; the count tells callers that compare it with the
+# session's message_count when another worker stored messages since
+history_cache = TTLCache(
+    max_entries=Config.HISTORY_CACHE_MAX_SESSIONS,
+    ttl_seconds=Config.HISTORY_CACHE_TTL_SECONDS
+)
 
 class SessionService:
-    def __init__(self, supabase_client):
-        self.supabase = supabase_client
+    def __init__(self, supabase_client=None):
+        self._supabase = supabase_client
+
+    @property
+    def supabase(self):
+        """The injected client, or the shared async client created in the app lifespan"""
+        return self._supabase or get_supabase_client()
 
     async def create_session(self, user_id: Optional[uuid.UUID], title: Optional[str] = None) -> Session:
         """Create a new chat session (authenticated or anonymous)"""
@@ -16,11 +41,15 @@ class SessionService:
             "user_id": str(user_id) if user_id else None
         }
         
-        result = self.supabase.table("sessions").insert(session_data).execute()
+        with observe_stage("supabase_write"):
+            result = await self.supabase.table("sessions").insert(session_data).execute()
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to create session")
         
-        return Session(**result.data[0])
+        session = Session(**result.data[0])
+        # A new session's history is known to be empty
+        history_cache.set(session.id, (0, ()))
+        return session
 
     async def get_session(self, session_id: uuid.UUID, user_id: Optional[uuid.UUID] = None) -> Optional[Session]:
         """Get a session with optional user validation"""
@@ -29,68 +58,162 @@ class SessionService:
         if user_id:
             query = query.eq("user_id", str(user_id))
         
-        result = query.execute()
+        result = await query.execute()
         if not result.data:
             return None
         
         return Session(**result.data[0])
 
-    async def get_user_sessions(self, user_id: uuid.UUID, limit: int = 50) -> List[Session]:
-        """Get all sessions for an authenticated user"""
-        result = (
+    async def get_user_sessions(self, user_id: uuid.UUID, limit: int = 50,
+                                cursor: Optional[str] = None) -> Tuple[List[Session], Optional[str]]:
+        """Get a page of an authenticated user's sessions, most recently updated first.
+
+        Returns the sessions and the cursor of the next page (None on the last one).
+        """
+        query = (
             self.supabase.table("sessions")
-            .select("*, messages!inner(*)")
+            .select(SESSION_LIST_COLUMNS)
             .eq("user_id", str(user_id))
             .eq("is_active", True)
-            .order("updated_at", desc=True)
-            .limit(limit)
-            .execute()
         )
+        if cursor:
+            query = query.or_(before_filter("updated_at", cursor))
+        # One extra row tells whether there is a next page
+        result = await query.order("updated_at", desc=True).order("id", desc=True).limit(limit + 1).execute()
         
-        return [self._format_session(session_data) for session_data in result.data]
+        sessions = [Session(**session_data) for session_data in result.data[:limit]]
+        has_more = len(result.data) > limit
+        return sessions, encode_cursor(sessions[-1].updated_at, sessions[-1].id) if has_more else None
+
+    async def get_session_messages(self, session_id: uuid.UUID, user_id: Optional[uuid.UUID] = None,
+                                   limit: Optional[int] = None,
+                                   cursor: Optional[str] = None) -> Tuple[List[Message], Optional[str]]:
+        """Get a page of a session's messages (with optional user validation).
 
-    async def get_session_messages(self, session_id: uuid.UUID, user_id: Optional[uuid.UUID] = None) -> List[Message]:
-        """Get messages for a session (with optional user validation)"""
-        # Verify session access
-        session = await self.get_session(session_id, user_id)
+        Pages go from the newest messages back; each page is oldest first.
+        Without a `limit` the page holds every (remaining) message.
+        Returns the messages and the cursor of the next, older page (None on the last one).
+        """
+        query = self.supabase.table("messages").select("*").eq("session_id", str(session_id))
+        if cursor:
+            query = query.or_(before_filter("created_at", cursor))
+        query = query.order("created_at", desc=True).order("id", desc=True)
+        if limit is not None:
+            # One extra row tells whether there is a next page
+            query = query.limit(limit + 1)
+        # Fetch the messages alongside the access check; they are discarded if it fails
+        session, result = await asyncio.gather(
+            self.get_session(session_id, user_id),
+            query.execute()
+        )
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        result = (
+        messages = [Message(**msg) for msg in reversed(result.data[:limit])]
+        has_more = limit is not None and len(result.data) > limit
+        return messages, encode_cursor(messages[0].created_at, messages[0].id) if has_more else None
+
+    async def get_recent_messages(self, session_id: uuid.UUID, limit: int,
+                                  refresh: bool = False) -> Tuple[List[Message], Optional[int]]:
+        """Get the last `limit` messages of a session, oldest first, without checking access.
+
+        Also returns the session's message count as of the returned messages
+        (None if unknown), to compare with `Session.message_count`. Windows up
+        to HISTORY_WINDOW_SIZE are served from the history cache when the
+        session is in it, unless `refresh` is set; otherwise only the window
+        is fetched.
+        """
+        cacheable = limit <= Config.HISTORY_WINDOW_SIZE
+        if cacheable and not refresh:
+            cached = history_cache.get(session_id)
+            record_cache_lookup("history", cached is not None)
+            if cached is not None:
+                message_count, messages = cached
+                return (list(messages[-limit:]) if limit > 0 else []), message_count
+
+        result = await (
             self.supabase.table("messages")
-            .select("*")
+            .select("*", count="exact")
             .eq("session_id", str(session_id))
-            .order("created_at")
+            .order("created_at", desc=True)
+            .limit(max(limit, Config.HISTORY_WINDOW_SIZE) if cacheable else limit)
             .execute()
         )
+        messages = [Message(**msg) for msg in reversed(result.data)]
+        if cacheable:
+            history_cache.set(session_id, (result.count, tuple(messages)))
+            messages = messages[-limit:] if limit > 0 else []
+        return messages, result.count
+
+    async def get_messages_after(self, session_id: uuid.UUID, after: Optional[datetime],
+                                 limit: Optional[int], latest: bool = False) -> List[Message]:
+        """Get up to `limit` (all if None) messages created after `after` (all if None), oldest first.
+
+        With `latest` these are the newest `limit` such messages instead of the earliest.
+        """
+        query = self.supabase.table("messages").select("*").eq("session_id", str(session_id))
+        if after:
+            query = query.gt("created_at", after.isoformat())
+        query = query.order("created_at", desc=latest)
+        if limit is not None:
+            query = query.limit(limit)
+        result = await query.execute()
+        
+        messages = [Message(**msg) for msg in result.data]
+        return messages[::-1] if latest else messages
+
+    async def update_session_summary(self, session_id: uuid.UUID, summary: str, summarized_until: datetime,
+                                     previous_until: Optional[datetime]) -> bool:
+        """Store a session's rolling summary unless another worker updated it since `previous_until`"""
+        query = (
+            self.supabase.table("sessions")
+            .update({"summary": summary, "summarized_until": summarized_until.isoformat()})
+            .eq("id", str(session_id))
+        )
+        if previous_until:
+            query = query.eq("summarized_until", previous_until.isoformat())
+        else:
+            query = query.is_("summarized_until", "null")
+        result = await query.execute()
         
-        return [Message(**msg) for msg in result.data]
+        return bool(result.data)
 
     async def add_message(self, session_id: uuid.UUID, role: MessageRole, content: str) -> Message:
         """Add a message to a session"""
+        with observe_stage("supabase_write"):
+            return await self._add_message(session_id, role, content)
+
+    async def _add_message(self, session_id: uuid.UUID, role: MessageRole, content: str) -> Message:
         message_data = {
             "session_id": str(session_id),
             "role": role.value,
             "content": content
         }
         
-        result = self.supabase.table("messages").insert(message_data).execute()
+        # Bounded by the request deadline, but never cut shorter than the floor
+        # so an answer that was already generated still gets stored
+        result = await run_with_deadline(
+            self.supabase.table("messages").insert(message_data).execute(),
+            floor=Config.PERSISTENCE_MIN_TIMEOUT_SECONDS
+        )
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to add message")
 
-        # Update session timestamp
-        self.supabase.table("sessions").update({
-            "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", str(session_id)).execute()
-        
-        return Message(**result.data[0])
+        # The session's updated_at is bumped by the messages_touch_session trigger
+        # (supabase/migrations), in the same round trip as the insert
+        message = Message(**result.data[0])
+        cached = history_cache.get(session_id)
+        if cached is not None:
+            message_count, messages = cached
+            history_cache.set(session_id, (message_count + 1, (messages + (message,))[-Config.HISTORY_WINDOW_SIZE:]))
+        return message
 
     async def update_session_title(self, session_id: uuid.UUID, title: str, user_id: Optional[uuid.UUID] = None) -> bool:
         """Update session title (authenticated users only)"""
         if not user_id:
             raise HTTPException(status_code=403, detail="Anonymous sessions cannot be modified")
 
-        result = (
+        result = await (
             self.supabase.table("sessions")
             .update({"title": title})
             .eq("id", str(session_id))
@@ -105,30 +228,14 @@ class SessionService:
         if not user_id:
             raise HTTPException(status_code=403, detail="Anonymous sessions cannot be deleted")
 
-        result = (
+        result = await (
             self.supabase.table("sessions")
             .update({"is_active": False})
             .eq("id", str(session_id))
             .eq("user_id", str(user_id))
             .execute()
         )
+        if result.data:
+            history_cache.pop(session_id)
         
         return bool(result.data)
-
-    def _format_session(self, session_data: dict) -> Session:
-        """Format session data with message counts"""
-        messages = session_data.get("messages", [])
-        return Session(
-            id=session_data["id"],
-            user_id=session_data["user_id"],
-            title=session_data["title"],
-            created_at=session_data["created_at"],
-            updated_at=session_data["updated_at"],
-            is_active=session_data.get("is_active", True),
-            message_count=len(messages),
-            last_message=next(
-                (msg["content"] for msg in reversed(messages) 
-                if msg["role"] == "user"),  # Matches your existing logic
-                None
-            )
-        )
\ No newline at end of file
@@ -0,0 +1,135 @@
+from typing import Dict, List, Optional
+import asyncio
+import contextvars
+import uuid
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from .models import Message, MessageRole
+from .service import SessionService
+from app.utils.admission import set_request_priority, PRIORITY_BACKGROUND
+from app.utils.deadline import set_deadline
+from app.utils.token_counter import TokenCounter
+from app.utils.tracing import start_span
+from app.config import Config
+
+# Most messages folded into the summary in one update; a longer backlog
+# is caught up over the following updates
+MAX_MESSAGES_PER_UPDATE = 40
+
+summary_prompt = PromptTemplate.from_template("""\
+Update the running summary of a conversation between a student and Iskobot, a Computer Engineering assistant.
+Keep the facts, names, numbers, questions and answers that later questions may refer to, and drop pleasantries.
+Write plain prose of at most {max_words} words.
+
+**Current summary:**
+{summary}
+
+**New messages:**
+{messages}
+
+**Updated summary:**""")
+
+class SessionSummarizer:
+    """Folds older messages of a session into the rolling summary on its row.
+
+    After each answer `schedule` starts a background update. Messages newer
+    than `summarized_until`, except the newest `keep_messages`, are
+    summarized together with the current summary by the chat model at
+    background priority. With a `token_counter`, the kept messages are also
+    limited to what fits `token_budget` next to a full-length summary, by
+    exact counts. Updates of one session never run concurrently in a
+    worker, and the conditional write skips the result if another worker
+    got there first.
+    """
+
+    def __init__(self, session_service: SessionService, llm, keep_messages: int = Config.SUMMARY_KEEP_MESSAGES,
+                 max_tokens: int = Config.SUMMARY_MAX_TOKENS, token_counter: Optional[TokenCounter] = None,
+                 token_budget: int = Config.HISTORY_TOKEN_BUDGET):
+        self.session_service = session_service
+        self.keep_messages = keep_messages
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter
+        self.token_budget = token_budget
+        self.chain = summary_prompt | llm.bind(generation_config={"max_output_tokens": max_tokens}) | StrOutputParser()
+        self._tasks: Dict[uuid.UUID, asyncio.Task] = {}
+        self._rerun = set()
+        self.updates = 0
+        self.failures = 0
+
+    def schedule(self, session_id: uuid.UUID):
+        """Update the session's summary in the background (again, if an update is running)"""
+        if session_id in self._tasks:
+            self._rerun.add(session_id)
+            return
+        # A fresh context, so the update is not bound by the request's deadline or priority
+        task = asyncio.create_task(self._run(session_id), context=contextvars.Context())
+        self._tasks[session_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(session_id, None))
+
+    async def _run(self, session_id: uuid.UUID):
+        set_request_priority(PRIORITY_BACKGROUND)
+        while True:
+            self._rerun.discard(session_id)
+            try:
+                set_deadline(Config.SUMMARY_TIMEOUT_SECONDS)
+                with start_span("update_session_summary", {"session.id": str(session_id)}):
+                    await self.update(session_id)
+            except Exception as e:
+                self.failures += 1
+                print(f"Warning: Updating the summary of session {session_id} failed: {e}")
+            if session_id not in self._rerun:
+                return
+
+    async def update(self, session_id: uuid.UUID) -> bool:
+        """Fold the messages that fell out of the verbatim tail into the summary"""
+        session = await self.session_service.get_session(session_id)
+        if not session:
+            return False
+        messages = await self.session_service.get_messages_after(
+            session_id,
+            session.summarized_until,
+            MAX_MESSAGES_PER_UPDATE + self.keep_messages
+        )
+        keep = await self.tail_size(messages)
+        folded = messages[:len(messages) - keep]
+        if not folded:
+            return False
+
+        summary = (await self.chain.ainvoke({
+            "summary": session.summary or "(none yet)",
+            "messages": self.format_messages(folded),
+            "max_words": self.max_tokens * 3 // 4
+        })).strip()
+        updated = await self.session_service.update_session_summary(
+            session_id,
+            summary,
+            folded[-1].created_at,
+            session.summarized_until
+        )
+        self.updates += updated
+        return updated
+
+    async def tail_size(self, messages: List[Message]) -> int:
+        """How many of the newest `messages` stay out of the summary"""
+        tail = messages[-self.keep_messages:] if self.keep_messages else []
+        if not self.token_counter:
+            return len(tail)
+
+        budget = self.token_budget - self.max_tokens
+        keep = 0
+        for tokens in reversed(await self.token_counter.count_many(msg.content for msg in tail)):
+            if tokens > budget:
+                break
+            budget -= tokens
+            keep += 1
+        return keep
+
+    @staticmethod
+    def format_messages(messages: List[Message]) -> str:
+        return "\n".join(
+            f"{'Human' if msg.role == MessageRole.USER else 'Assistant'}: {msg.content}"
+            for msg in messages
+        )
+
+    def stats(self) -> dict:
+        return {"running": len(self._tasks), "updates": self.updates, "failures": self.failures}
@@ -1,4 +1,3 @@
-from groq import Groq
 import tempfile
 import os
 import logging
@@ -8,8 +7,15 @@ from fastapi import HTTPException, UploadFile
 # logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize Groq client
-client = Groq()
+_client = None
+
+def get_groq_client():
+    """The Groq client, created (and the SDK imported) on the first transcription"""
+    global _client
+    if _client is None:
+        from groq import Groq
+        _client = Groq()
+    return _client
 
 async def transcribe_audio(audio_file: UploadFile):
     try:
@@ -38,7 +44,7 @@ async def transcribe_audio(audio_file: UploadFile):
             # Open the temporary file and transcribe
             with open(temp_path, "rb") as file:
                 logger.debug("Sending file to transcription service...")
-                transcription = client.audio.transcriptions.create(
+                transcription = get_groq_client().audio.transcriptions.create(
                     file=(temp_path, file.read()),
                     model="whisper-large-v3-turbo",
                     response_format="verbose_json",
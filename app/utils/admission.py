@@ -0,0 +1,235 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, List, Optional
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from google.api_core.exceptions import ResourceExhausted
+from langchain_google_genai import ChatGoogleGenerativeAI
+from app.utils.hedging import HedgeNotSent, llm_hedger
+from app.utils.deadline import get_deadline, run_with_deadline
+from app.utils.metrics import ADMISSION_REJECTED, RATE_LIMITED
+from app.config import Config
+
+# Lower values are admitted first
+PRIORITY_AUTHENTICATED_CHAT = 0
+PRIORITY_CHAT = 1
+PRIORITY_QUERY = 2
+PRIORITY_BACKGROUND = 3
+
+# Set by endpoints; read by every gated call made while serving the request
+request_priority: ContextVar[int] = ContextVar("request_priority", default=PRIORITY_QUERY)
+
+def set_request_priority(priority: int):
+    """Mark the Gemini calls made by the current request with `priority`."""
+    request_priority.set(priority)
+
+class AdmissionRejected(ResourceExhausted):
+    """Raised without calling Gemini when a request cannot be admitted before its deadline.
+
+    Subclasses `ResourceExhausted` so callers answer it like an upstream 429.
+    """
+
+class NoFreeSlot(AdmissionRejected, HedgeNotSent):
+    """Raised by `acquire(wait=False)` when no slot is free right now, e.g. for a hedge."""
+
+class AdmissionController:
+    """Process-wide gate in front of one Gemini quota (e.g. the chat model or embeddings).
+
+    Calls are admitted by a token bucket refilled at `rate_per_minute` and by
+    a concurrency limit that adapts AIMD-style: it grows by 1/limit after
+    each success, halves when Gemini answers with a 429 and is left alone
+    by other failures. Waiting calls are queued by priority and then
+    arrival order. A call whose deadline would pass before it could be
+    admitted is rejected immediately.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, max_concurrency: int,
+                 min_concurrency: int = 1, queue_timeout_seconds: float = 10):
+        self.name = name
+        self.rate = rate_per_minute / 60
+        self.burst = max(1.0, self.rate * 2)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.queue_timeout = queue_timeout_seconds
+        self.limit = float(max_concurrency)
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_decrease = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _can_admit(self) -> bool:
+        return self._in_flight < max(self.min_concurrency, int(self.limit)) and self._tokens >= 1
+
+    def _take(self):
+        self._tokens -= 1
+        self._in_flight += 1
+        self.admitted += 1
+
+    def _dispatch(self):
+        """Admit queued calls in priority order while capacity allows."""
+        self._timer = None
+        self._refill()
+        while self._waiters and self._can_admit():
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            self._take()
+            waiter.set_result(None)
+
+        # Only the bucket can be refilled by time; released slots dispatch themselves
+        if self._waiters and self._tokens < 1 and self._timer is None:
+            delay = (1 - self._tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _estimated_wait(self, priority: int) -> float:
+        ahead = sum(1 for p, _, waiter in self._waiters if p <= priority and not waiter.done())
+        return max(0.0, ahead + 1 - self._tokens) / self.rate
+
+    async def acquire(self, priority: Optional[int] = None, deadline: Optional[float] = None,
+                      wait: bool = True):
+        """Wait for a slot. `deadline` is a `time.monotonic()` timestamp.
+
+        Defaults to the current request's deadline. With `wait=False` the
+        call is rejected unless a slot is free right now.
+        """
+        priority = request_priority.get() if priority is None else priority
+        deadline = get_deadline() if deadline is None else deadline
+        now = time.monotonic()
+        deadline = min(deadline or math.inf, now + self.queue_timeout)
+
+        self._refill()
+        if not self._waiters and self._can_admit():
+            self._take()
+            return
+        if not wait:
+            self.rejected += 1
+            ADMISSION_REJECTED.labels(source=self.name).inc()
+            raise NoFreeSlot(f"{self.name}: no free slot")
+
+        if self._estimated_wait(priority) > deadline - now:
+            self.rejected += 1
+            ADMISSION_REJECTED.labels(source=self.name).inc()
+            raise AdmissionRejected(f"{self.name}: cannot be admitted before the deadline")
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(waiter, deadline - now)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the wait ended; hand the slot back
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                ADMISSION_REJECTED.labels(source=self.name).inc()
+                raise AdmissionRejected(f"{self.name}: queued past the deadline") from e
+            raise
+
+    def release(self, throttled: bool = False, succeeded: bool = False):
+        """Return a slot and adapt the concurrency limit to the outcome of the call.
+
+        Only a success grows the limit and only a 429 shrinks it; other
+        errors, timeouts and cancellations leave it unchanged.
+        """
+        self._in_flight -= 1
+        if throttled:
+            self.throttled += 1
+            RATE_LIMITED.labels(source=self.name).inc()
+            now = time.monotonic()
+            # One burst of 429s is one congestion signal
+            if now - self._last_decrease > 1:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self._tokens = 0
+                self._last_decrease = now
+        elif succeeded:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, priority: Optional[int] = None, deadline: Optional[float] = None,
+                    wait: bool = True):
+        """Hold a slot for the duration of one Gemini call."""
+        await self.acquire(priority, deadline, wait)
+        throttled = False
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        except ResourceExhausted:
+            throttled = True
+            raise
+        finally:
+            # Cancellations (e.g. the losing side of a hedged request), deadlines
+            # and upstream errors say nothing about spare capacity
+            self.release(throttled, succeeded)
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self._in_flight,
+            "queued": sum(1 for _, _, waiter in self._waiters if not waiter.done()),
+            "tokens": round(self._tokens, 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+        }
+
+# Each uvicorn worker gets an equal share of the project-wide Gemini quota
+llm_admission = AdmissionController(
+    "gemini-llm",
+    rate_per_minute=Config.GEMINI_LLM_RPM / Config.WEB_CONCURRENCY,
+    max_concurrency=Config.GEMINI_LLM_MAX_CONCURRENCY,
+    queue_timeout_seconds=Config.ADMISSION_QUEUE_TIMEOUT_SECONDS
+)
+embedding_admission = AdmissionController(
+    "gemini-embedding",
+    rate_per_minute=Config.GEMINI_EMBEDDING_RPM / Config.WEB_CONCURRENCY,
+    max_concurrency=Config.GEMINI_EMBEDDING_MAX_CONCURRENCY,
+    queue_timeout_seconds=Config.ADMISSION_QUEUE_TIMEOUT_SECONDS
+)
+
+class AdmittedChatGoogleGenerativeAI(ChatGoogleGenerativeAI):
+    """Gemini chat model whose async calls pass through `llm_admission`.
+
+    Covers `ainvoke` and `astream`, so chains, SSE endpoints and langserve
+    routes share the same gate. Non-streaming calls are hedged by
+    `llm_hedger` when hedging is enabled; a hedge is only sent if a slot is
+    free immediately.
+    """
+
+    async def _admitted_generate(self, hedge: bool, *args: Any, **kwargs: Any):
+        generate = super(AdmittedChatGoogleGenerativeAI, self)._agenerate
+        if not Config.ADMISSION_CONTROL_ENABLED:
+            return await run_with_deadline(generate(*args, **kwargs))
+        async with llm_admission.admit(wait=not hedge):
+            return await run_with_deadline(generate(*args, **kwargs))
+
+    async def _agenerate(self, *args: Any, **kwargs: Any):
+        if llm_hedger is not None:
+            return await llm_hedger.run(lambda hedge: self._admitted_generate(hedge, *args, **kwargs))
+        return await self._admitted_generate(False, *args, **kwargs)
+
+    async def _astream(self, *args: Any, **kwargs: Any) -> AsyncIterator:
+        if not Config.ADMISSION_CONTROL_ENABLED:
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+            return
+        async with llm_admission.admit():
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
@@ -1,29 +1,85 @@
 import jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from supabase import Client
+from supabase import AsyncClient
+from app.database.supabase_client import get_supabase_client
 from app.config import Config
 from app.models.auth import TokenPayload, UserResponse
+from app.utils.ttl_cache import TTLCache
+from app.utils.metrics import observe_stage, record_cache_lookup
+from typing import Optional
+import asyncio
+import hashlib
 import logging
+import time
 
 # logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
-def get_supabase_client() -> Client:
-    """Get Supabase client instance"""
-    from supabase import create_client
-    return create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+# Verified users keyed by a hash of their access token
+user_cache = TTLCache(
+    max_entries=Config.AUTH_CACHE_MAX_ENTRIES,
+    ttl_seconds=Config.AUTH_CACHE_TTL_SECONDS
+)
+_jwks_client: Optional[jwt.PyJWKClient] = None
+# Algorithms whose keys come from the project's JWKS endpoint
+JWKS_ALGORITHMS = ("RS256", "ES256")
+
+def _get_verification_key(token: str, algorithm: str):
+    """Return the key that signs `token`, or None if it cannot be verified locally"""
+    global _jwks_client
+    if algorithm == "HS256":
+        return Config.SUPABASE_JWT_SECRET or None
+    if algorithm in JWKS_ALGORITHMS:
+        # Projects using asymmetric signing keys publish them as a JWKS
+        if _jwks_client is None:
+            _jwks_client = jwt.PyJWKClient(
+                f"{Config.SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+                cache_keys=True,
+                lifespan=3600
+            )
+        return _jwks_client.get_signing_key_from_jwt(token).key
+    return None
+
+def can_verify_locally(token: str) -> bool:
+    """Check whether a signing key for `token` is available without calling Supabase"""
+    try:
+        algorithm = jwt.get_unverified_header(token).get("alg")
+    except jwt.InvalidTokenError:
+        # Malformed tokens are rejected by verify_jwt_token
+        return True
+    if algorithm == "HS256":
+        return bool(Config.SUPABASE_JWT_SECRET)
+    if algorithm in JWKS_ALGORITHMS:
+        # RSA and EC keys need PyJWT's cryptography backend
+        return jwt.algorithms.has_crypto
+    return True
+
+def uses_jwks(token: str) -> bool:
+    """Check whether verifying `token` may fetch signing keys over the network"""
+    try:
+        return jwt.get_unverified_header(token).get("alg") in JWKS_ALGORITHMS
+    except jwt.InvalidTokenError:
+        return False
 
 def verify_jwt_token(token: str) -> TokenPayload:
     """
-    Verify and decode JWT token from Supabase
+    Verify the signature, expiry and audience of a Supabase JWT locally
     """
     try:
-        # Decode without verification first to get the payload
-        # Supabase handles the verification on their end
+        algorithm = jwt.get_unverified_header(token).get("alg")
+        key = _get_verification_key(token, algorithm)
+        if key is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token cannot be verified"
+            )
+
         payload = jwt.decode(
-            token, 
-            options={"verify_signature": False, "verify_exp": False}
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=Config.SUPABASE_JWT_AUDIENCE
         )
         
         token_data = TokenPayload(**payload)
@@ -36,6 +92,8 @@ def verify_jwt_token(token: str) -> TokenPayload:
         
         return token_data
         
+    except HTTPException:
+        raise
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -53,34 +111,86 @@ def verify_jwt_token(token: str) -> TokenPayload:
             detail="Could not validate credentials"
         )
 
+def _token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def forget_token(token: str):
+    """Drop a token from the user cache, e.g. after the user signs out"""
+    user_cache.pop(_token_cache_key(token))
+
+async def resolve_user(token: str, supabase: AsyncClient) -> UserResponse:
+    """Resolve an access token to its user, timed as the "auth" stage."""
+    with observe_stage("auth"):
+        return await _resolve_user(token, supabase)
+
+async def _resolve_user(token: str, supabase: AsyncClient) -> UserResponse:
+    """
+    Resolve an access token to its user and profile role.
+
+    Cache hits need no network round trip. On a miss the token is first
+    verified locally, so forged or expired tokens never reach Supabase, and
+    then validated remotely once, which also catches revoked sessions. The
+    result is cached for AUTH_CACHE_TTL_SECONDS, never past the token's expiry.
+    """
+    cache_key = _token_cache_key(token)
+    user = user_cache.get(cache_key)
+    record_cache_lookup("auth", user is not None)
+    if user is not None:
+        return user
+
+    def fetch_profile(user_id: str):
+        return supabase.table('profiles') \
+                       .select('role') \
+                       .eq('user_id', user_id) \
+                       .execute()
+
+    if can_verify_locally(token):
+        # PyJWKClient fetches keys with blocking urllib on a cold cache or an unknown
+        # key id, so that path runs in a thread instead of stalling the event loop
+        if uses_jwks(token):
+            token_data = await asyncio.to_thread(verify_jwt_token, token)
+        else:
+            token_data = verify_jwt_token(token)
+        expires_at = token_data.exp
+        # The verified subject lets the profile lookup run alongside get_user
+        response, profile = await asyncio.gather(
+            supabase.auth.get_user(token),
+            fetch_profile(token_data.sub)
+        )
+    else:
+        expires_at = None
+        response = await supabase.auth.get_user(token)
+        profile = await fetch_profile(response.user.id) if response.user else None
+
+    if response.user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+
+    user = UserResponse(
+        id=response.user.id,
+        email=response.user.email,
+        full_name=response.user.user_metadata.get("full_name"),
+        display_name=response.user.user_metadata.get("display_name"),
+        email_confirmed=response.user.email_confirmed_at is not None,
+        created_at=response.user.created_at,
+        role=profile.data[0]['role'] if profile and profile.data else None
+    )
+
+    ttl = expires_at - time.time() if expires_at else None
+    user_cache.set(cache_key, user, ttl)
+    return user
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: AsyncClient = Depends(get_supabase_client)
 ) -> UserResponse:
     """
     Dependency to get the current authenticated user
     """
     try:
-        # # Verify the token
-        # token_data = verify_jwt_token(credentials.credentials)
-        
-        # Get user from Supabase
-        response = supabase.auth.get_user(credentials.credentials)
-        
-        if response.user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found"
-            )
-        
-        return UserResponse(
-            id=response.user.id,
-            email=response.user.email,
-            full_name=response.user.user_metadata.get("full_name"),
-            display_name=response.user.user_metadata.get("display_name"),
-            email_confirmed=response.user.email_confirmed_at is not None,
-            created_at=response.user.created_at
-        )
+        return await resolve_user(credentials.credentials, supabase)
         
     except HTTPException:
         raise
@@ -117,8 +227,9 @@ def require_auth(
             detail="Authorization header required"
         )
     
-    # # Basic token validation
-    # verify_jwt_token(credentials.credentials)
+    # Basic token validation
+    if can_verify_locally(credentials.credentials):
+        verify_jwt_token(credentials.credentials)
     
     return credentials.credentials
 
@@ -132,29 +243,10 @@ class AuthRequired:
     async def __call__(
         self, 
         credentials: HTTPAuthorizationCredentials = Depends(security),
-        supabase: Client = Depends(get_supabase_client)
+        supabase: AsyncClient = Depends(get_supabase_client)
     ) -> UserResponse:
         try:
-            # # Verify token
-            # verify_jwt_token(credentials.credentials)
-            
-            # Get user
-            response = supabase.auth.get_user(credentials.credentials)
-            
-            if response.user is None:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="User not found"
-                )
-            
-            user = UserResponse(
-                id=response.user.id,
-                email=response.user.email,
-                full_name=response.user.user_metadata.get("full_name"),
-                display_name=response.user.user_metadata.get("display_name"),
-                email_confirmed=response.user.email_confirmed_at is not None,
-                created_at=response.user.created_at
-            )
+            user = await resolve_user(credentials.credentials, supabase)
             
             # Check email verification if required
             if self.require_email_verification and not user.email_confirmed:
@@ -0,0 +1,121 @@
+import asyncio
+from typing import List, Optional
+from app.utils.metrics import observe_stage
+
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+
+# Queued by `stop`; the flush task writes out its batch and exits when it gets it
+_STOP = object()
+
+class BatchedWriter:
+    """Buffers rows on a bounded asyncio queue and bulk-inserts them into a Supabase table.
+
+    Request handlers call `submit`, which never waits on the network. A single
+    background task flushes the buffer as one insert whenever `batch_size` rows
+    are pending or `flush_interval_ms` has passed since the first pending row.
+    When the queue is full, `drop_policy` decides whether the incoming row
+    (`drop_newest`) or the oldest queued row (`drop_oldest`) is discarded.
+    """
+
+    def __init__(self, table: str, batch_size: int = 50,
+                 flush_interval_ms: int = 1000, max_queue_size: int = 10_000,
+                 drop_policy: str = DROP_NEWEST):
+        if drop_policy not in (DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"Unsupported drop policy: {drop_policy}")
+
+        self.supabase = None
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.drop_policy = drop_policy
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[dict] = []
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self, supabase_client):
+        """Start the background flush task on the running event loop."""
+        if self._task is not None:
+            return
+        self.supabase = supabase_client
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write out everything still buffered."""
+        if self._task is None:
+            return
+
+        # Not cancelled, so a flush in progress finishes instead of losing its batch;
+        # `submit` refuses rows from here on, so the stop marker is the last entry
+        task, self._task = self._task, None
+        await self._queue.put(_STOP)
+        await task
+
+    def submit(self, record: dict) -> bool:
+        """Queue a row for insertion. Returns False if the row was dropped."""
+        self.submitted += 1
+        if self._queue is None or self._task is None:
+            # Writer not started (e.g. outside the app lifespan) or stopping; nothing to flush it
+            self.dropped += 1
+            return False
+
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.drop_policy == DROP_NEWEST:
+                return False
+            self._queue.get_nowait()
+            self._queue.put_nowait(record)
+            return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            record = await self._queue.get()
+            deadline = loop.time() + self.flush_interval
+
+            while record is not _STOP:
+                self._batch.append(record)
+                timeout = deadline - loop.time()
+                if len(self._batch) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush()
+            if record is _STOP:
+                return
+
+    async def _flush(self):
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+
+        try:
+            with observe_stage("supabase_write"):
+                response = await self.supabase.table(self.table).insert(batch).execute()
+            if not response.data:
+                raise Exception("No data returned")
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Warning: Failed to write {len(batch)} rows to {self.table}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
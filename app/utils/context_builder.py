@@ -0,0 +1,163 @@
+from typing import List, Optional
+import hashlib
+import math
+from langchain_core.documents import Document
+from app.utils.metrics import observe_stage
+
+# Chunks overlap by ~100 characters (see create_chunks); the splitter may
+# cut the overlap at a separator, so matches are searched within this window
+MAX_OVERLAP_CHARS = 300
+# Shorter shared spans are treated as coincidence rather than overlap
+MIN_OVERLAP_CHARS = 20
+# The splitter strips whitespace at chunk edges, so adjacent chunks without
+# overlap can be a few characters apart
+MAX_GAP_CHARS = 2
+# Remaining budget below which a block is dropped instead of truncated
+MIN_TRUNCATED_TOKENS = 50
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (about four characters per token)."""
+    return math.ceil(len(text) / 4)
+
+def format_docs(docs: List[Document]) -> str:
+    """Concatenate chunks verbatim, one `Source`/`Content` block per chunk."""
+    formatted_docs = []
+    for doc in docs:
+        source = doc.metadata.get('source', 'Unknown')
+        content = doc.page_content
+        formatted_docs.append(f"Source: {source}\nContent: {content}")
+    return "\n\n---\n\n".join(formatted_docs)
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+class _Span:
+    """A run of text from one source, built from one or more merged chunks."""
+
+    def __init__(self, doc: Document):
+        self.text = doc.page_content
+        self.start: Optional[int] = doc.metadata.get("start_index")
+
+    @property
+    def end(self) -> Optional[int]:
+        return self.start + len(self.text) if self.start is not None else None
+
+    def absorb(self, other: "_Span") -> bool:
+        """Merge `other` into this span if they overlap, touch or contain each other."""
+        if other.text in self.text:
+            return True
+        if self.text in other.text:
+            self.text, self.start = other.text, other.start
+            return True
+
+        if self.start is not None and other.start is not None:
+            first, second = (self, other) if self.start <= other.start else (other, self)
+            gap = second.start - first.end
+            if gap > MAX_GAP_CHARS:
+                return False
+            text = first.text + " " * gap + second.text[max(-gap, 0):]
+            self.text, self.start = text, first.start
+            return True
+
+        size = _overlap(self.text, other.text)
+        if size:
+            self.text = self.text + other.text[size:]
+            return True
+        size = _overlap(other.text, self.text)
+        if size:
+            self.text, self.start = other.text + self.text[size:], other.start
+            return True
+        return False
+
+class ContextBuilder:
+    """Assembles retrieved chunks into the knowledge bank section of the prompt.
+
+    Chunks of the same source are grouped under one header, and adjacent or
+    overlapping chunks are merged so the shared text appears once. Exact
+    duplicates are dropped. Sources keep the rank of their best chunk and
+    are added until `token_budget` is reached; the last one may be
+    truncated at a sentence boundary.
+    """
+
+    def __init__(self, token_budget: int = 1600):
+        self.token_budget = token_budget
+        self.requests = 0
+        self.chunks_in = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def _merge(self, docs: List[Document]):
+        """Group chunks by source in rank order and merge the spans of each source."""
+        seen = set()
+        sources = {}
+        for doc in docs:
+            digest = hashlib.sha1(" ".join(doc.page_content.split()).encode()).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+
+            spans = sources.setdefault(doc.metadata.get("source", "Unknown"), [])
+            span = _Span(doc)
+            # Absorbing a chunk can make a span reach the next one, so re-merge until stable
+            while True:
+                for existing in spans:
+                    if existing.absorb(span):
+                        spans.remove(existing)
+                        span = existing
+                        break
+                else:
+                    break
+            spans.append(span)
+
+        for spans in sources.values():
+            spans.sort(key=lambda span: span.start if span.start is not None else math.inf)
+        return sources
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        cut = text[:max_tokens * 4]
+        boundary = max(cut.rfind(". "), cut.rfind("\n"))
+        if boundary > len(cut) // 2:
+            cut = cut[:boundary + 1]
+        return cut.rstrip() + " ..."
+
+    def build(self, docs: List[Document]) -> str:
+        """Return the knowledge bank text for `docs` within the token budget."""
+        with observe_stage("prompt_formatting"):
+            return self._build(docs)
+
+    def _build(self, docs: List[Document]) -> str:
+        blocks = []
+        used = 0
+        for source, spans in self._merge(docs).items():
+            block = f"Source: {source}\nContent: " + "\n...\n".join(span.text for span in spans)
+            tokens = estimate_tokens(block)
+            remaining = self.token_budget - used
+            if tokens > remaining:
+                if remaining >= MIN_TRUNCATED_TOKENS:
+                    blocks.append(self._truncate(block, remaining))
+                break
+            blocks.append(block)
+            used += tokens
+        context = "\n\n---\n\n".join(blocks)
+
+        tokens_in = estimate_tokens(format_docs(docs))
+        tokens_out = estimate_tokens(context)
+        self.requests += 1
+        self.chunks_in += len(docs)
+        self.tokens_in += tokens_in
+        self.tokens_out += tokens_out
+        return context
+
+    def stats(self) -> dict:
+        return {
+            "token_budget": self.token_budget,
+            "requests": self.requests,
+            "chunks": self.chunks_in,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "tokens_saved": self.tokens_in - self.tokens_out,
+        }
@@ -0,0 +1,90 @@
+from contextvars import ContextVar
+from typing import Any, Awaitable, Optional, Tuple
+import asyncio
+import math
+import time
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from app.utils.ttl_cache import TTLCache
+
+# (absolute time.monotonic() deadline, total budget in seconds) of the current request
+_request_deadline: ContextVar[Optional[Tuple[float, float]]] = ContextVar("request_deadline", default=None)
+
+class DeadlineExceeded(TimeoutError):
+    """The current request ran out of its time budget."""
+
+def set_deadline(seconds: float) -> float:
+    """Give the current request `seconds` to finish. Returns the absolute deadline."""
+    deadline = time.monotonic() + seconds
+    _request_deadline.set((deadline, seconds))
+    return deadline
+
+def get_deadline() -> Optional[float]:
+    """The absolute `time.monotonic()` deadline of the current request, if any."""
+    current = _request_deadline.get()
+    return current[0] if current else None
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one."""
+    current = _request_deadline.get()
+    return current[0] - time.monotonic() if current else None
+
+def share(fraction: float) -> Optional[float]:
+    """`fraction` of the current request's total budget, capped at what is left."""
+    current = _request_deadline.get()
+    if current is None:
+        return None
+    return min(current[1] * fraction, current[0] - time.monotonic())
+
+async def run_with_deadline(awaitable: Awaitable, budget: Optional[float] = None, floor: float = 0) -> Any:
+    """Await `awaitable` within the request deadline, further capped by `budget`.
+
+    `floor` guarantees a minimum timeout, for work such as persisting an
+    answer that should not be abandoned just because the deadline is spent.
+    """
+    timeout = remaining()
+    if budget is not None:
+        timeout = min(timeout if timeout is not None else math.inf, budget)
+    if timeout is None:
+        return await awaitable
+    timeout = max(timeout, floor)
+
+    if timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("Request deadline exceeded")
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError as e:
+        raise DeadlineExceeded("Request deadline exceeded") from e
+
+def with_retrieval_deadline(retriever: Runnable, fallback: Runnable, budget_share: float,
+                            cache: TTLCache) -> Runnable:
+    """Bound `retriever` to `budget_share` of the request deadline and degrade when it overruns.
+
+    Successful results are kept in `cache` by normalized query. On overrun
+    the cached results for the same question are used, then `fallback` (a
+    cheaper search, e.g. fewer results) with half the budget. Only if that
+    also overruns does the request fail with `DeadlineExceeded`.
+    """
+    async def retrieve(query: str, config: RunnableConfig):
+        key = " ".join(query.lower().split()) if isinstance(query, str) else repr(query)
+        budget = share(budget_share)
+        try:
+            docs = await run_with_deadline(retriever.ainvoke(query, config), budget)
+            cache.set(key, docs)
+            return docs
+        except DeadlineExceeded:
+            pass
+
+        cached = cache.get(key)
+        if cached is not None:
+            print("Warning: Retrieval over budget, using cached results")
+            return cached
+
+        print("Warning: Retrieval over budget, retrying with reduced k")
+        return await run_with_deadline(
+            fallback.ainvoke(query, config),
+            budget / 2 if budget is not None else None
+        )
+
+    return RunnableLambda(retrieve, name="RetrieverWithDeadline")
@@ -0,0 +1,133 @@
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import time
+import numpy as np
+from app.config import Config
+
+class HedgeNotSent(Exception):
+    """Raised by a hedge call that was turned away before reaching the backend."""
+
+class LatencyHistogram:
+    """Sliding window of the most recent call latencies, in seconds."""
+
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        return float(np.percentile(self._samples, percentile))
+
+    def __len__(self):
+        return len(self._samples)
+
+class Hedger:
+    """Fires a backup request when the first one is slower than usual.
+
+    `run(func)` calls `func(False)`. If it has not finished after the
+    `percentile`-th percentile of recent latencies, `func(True)` is started
+    as a hedge and the first successful result wins; the other call is
+    cancelled. Hedges are only sent once `min_samples` latencies are known
+    and while fewer than `max_hedge_rate` of recent calls were hedged, so
+    quota usage stays bounded.
+    """
+
+    def __init__(self, name: str, percentile: float = 95, max_hedge_rate: float = 0.1,
+                 min_samples: int = 50, min_delay_ms: float = 50, window: int = 1000):
+        self.name = name
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.min_samples = min_samples
+        self.min_delay = min_delay_ms / 1000
+        self.latency = LatencyHistogram(window)
+        self._decisions = deque(maxlen=window)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None if hedging is not warranted yet."""
+        if len(self.latency) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latency.percentile(self.percentile))
+
+    def _may_hedge(self) -> bool:
+        if not self._decisions:
+            return True
+        return sum(self._decisions) / len(self._decisions) < self.max_hedge_rate
+
+    async def run(self, func: Callable[[bool], Awaitable[Any]]) -> Any:
+        """Run `func(hedge)` with hedging. The hedge call should not queue for capacity."""
+        self.calls += 1
+        start = time.monotonic()
+        primary = asyncio.ensure_future(func(False))
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._may_hedge():
+                    return await self._race(primary, func, start)
+
+            self._decisions.append(False)
+            result = await primary
+            self.latency.observe(time.monotonic() - start)
+            return result
+        finally:
+            # e.g. the caller was cancelled while waiting
+            if not primary.done():
+                primary.cancel()
+
+    async def _race(self, primary: asyncio.Future, func, start: float) -> Any:
+        hedge = asyncio.ensure_future(func(True))
+        errors = {}
+        try:
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        self.latency.observe(time.monotonic() - start)
+                        return task.result()
+                    errors[task] = task.exception()
+            # Both failed; the primary's error is the meaningful one
+            raise errors.get(primary) or errors[hedge]
+        finally:
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+            # Hedges turned away (e.g. no free slot) cost no quota and are not counted
+            sent = not isinstance(errors.get(hedge), HedgeNotSent)
+            self._decisions.append(sent)
+            self.hedged += sent
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": self.hedge_wins / self.hedged if self.hedged else 0.0,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1) if self.hedge_delay() is not None else None,
+            "p50_ms": round(self.latency.percentile(50) * 1000, 1) if len(self.latency) else None,
+            "p99_ms": round(self.latency.percentile(99) * 1000, 1) if len(self.latency) else None,
+        }
+
+def _create_hedger(name: str) -> Optional[Hedger]:
+    if not Config.HEDGING_ENABLED:
+        return None
+    return Hedger(
+        name,
+        percentile=Config.HEDGE_PERCENTILE,
+        max_hedge_rate=Config.HEDGE_MAX_RATE,
+        min_samples=Config.HEDGE_MIN_SAMPLES,
+        min_delay_ms=Config.HEDGE_MIN_DELAY_MS
+    )
+
+# None when hedging is disabled
+llm_hedger = _create_hedger("gemini-llm")
+embedding_hedger = _create_hedger("gemini-embedding")
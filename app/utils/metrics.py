@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict
+from uuid import UUID
+import os
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from starlette.routing import Match
+from app.utils.tracing import start_span
+
+# Route template of the request being served (e.g. "/sessions/{session_id}"),
+# so per-stage metrics can be broken down by endpoint
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="background")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_DURATION = Histogram(
+    "iskobot_stage_duration_seconds",
+    "Time spent in one stage of serving a request",
+    ["stage", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DURATION = Histogram(
+    "iskobot_http_request_duration_seconds",
+    "End-to-end HTTP request latency",
+    ["endpoint", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+RETRIES = Counter(
+    "iskobot_retries_total",
+    "Gemini calls retried after a quota error",
+    ["endpoint"],
+)
+RATE_LIMITED = Counter(
+    "iskobot_rate_limited_total",
+    "429 / ResourceExhausted responses from Gemini",
+    ["source"],
+)
+ADMISSION_REJECTED = Counter(
+    "iskobot_admission_rejected_total",
+    "Calls failed fast by the admission controller",
+    ["source"],
+)
+CACHE_LOOKUPS = Counter(
+    "iskobot_cache_lookups_total",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"],
+)
+
+@contextmanager
+def observe_stage(stage: str):
+    """Record the duration of the enclosed block as `stage` of the current endpoint.
+
+    The block is also traced as a span named after the stage.
+    """
+    start = time.perf_counter()
+    try:
+        with start_span(stage):
+            yield
+    finally:
+        STAGE_DURATION.labels(stage=stage, endpoint=current_endpoint.get()).observe(time.perf_counter() - start)
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def render_metrics():
+    """Return the exposition payload and its content type.
+
+    With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR so every
+    worker's samples are aggregated into one scrape.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """ASGI middleware that labels the request with its route and times it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route_template(self, scope) -> str:
+        router = scope.get("app")
+        for route in getattr(router, "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._route_template(scope)
+        token = current_endpoint.set(endpoint)
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_DURATION.labels(
+                endpoint=endpoint,
+                method=scope["method"],
+                status=str(status["code"])
+            ).observe(time.perf_counter() - start)
+            current_endpoint.reset(token)
+
+class LLMMetricsCallbackHandler(BaseCallbackHandler):
+    """Records LLM time-to-first-token and total time for every chat model run.
+
+    Attached to chains through `with_config(callbacks=...)`; it only
+    observes, so chain outputs are unchanged. Time to first token is only
+    known for streamed runs.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, dict] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, **kwargs: Any):
+        self._runs[run_id] = {"start": time.perf_counter(), "first_token": False, "endpoint": current_endpoint.get()}
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, *, run_id: UUID, **kwargs: Any):
+        self._runs[run_id] = {"start": time.perf_counter(), "first_token": False, "endpoint": current_endpoint.get()}
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.get(run_id)
+        if run is not None and not run["first_token"]:
+            run["first_token"] = True
+            STAGE_DURATION.labels(stage="llm_ttft", endpoint=run["endpoint"]).observe(time.perf_counter() - run["start"])
+
+    def _finish(self, run_id: UUID):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            STAGE_DURATION.labels(stage="llm_total", endpoint=run["endpoint"]).observe(time.perf_counter() - run["start"])
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id)
+
+llm_metrics_handler = LLMMetricsCallbackHandler()
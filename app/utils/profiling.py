@@ -0,0 +1,228 @@
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+import asyncio
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from app.utils.tracing import current_trace_id
+from app.config import Config
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_ID_PATTERN = re.compile(r"^[\w.-]+$")
+
+def _thread_cpu_time(thread_id: int) -> Optional[float]:
+    """CPU seconds used so far by `thread_id`, where the platform can tell."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except (AttributeError, OSError):
+        return None
+
+class SamplingProfiler:
+    """Samples the call stack of one thread from a background thread.
+
+    Every `interval` seconds the stack of `thread_id` is recorded, rooted at
+    `label()` (e.g. the asyncio task that was running). Because it samples
+    wall-clock time, blocking calls that stall the event loop show up as
+    clearly as CPU-bound work. The result is in the "folded" format read by
+    flamegraph.pl, inferno and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float, label: Callable[[], str] = lambda: "thread"):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.label = label
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._wall_start = 0.0
+        self._cpu_start: Optional[float] = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds: Optional[float] = None
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack: List[str] = []
+        while frame is not None:
+            stack.append(self._frame_name(frame))
+            frame = frame.f_back
+        stack.append(self.label())
+        self.samples[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._wall_start = time.perf_counter()
+        self._cpu_start = _thread_cpu_time(self.thread_id)
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        cpu_end = _thread_cpu_time(self.thread_id)
+        if self._cpu_start is not None and cpu_end is not None:
+            self.cpu_seconds = cpu_end - self._cpu_start
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+class ProfileStore:
+    """Keeps the most recent `max_files` profiles in `directory`.
+
+    Each profile is a `<id>.folded` stack file plus a `<id>.json` summary.
+    """
+
+    def __init__(self, directory: str, max_files: int = 50):
+        self.directory = directory
+        self.max_files = max_files
+
+    def _path(self, profile_id: str, suffix: str) -> str:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            raise ValueError(f"Invalid profile id: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}{suffix}")
+
+    def save(self, profile_id: str, folded: str, summary: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id, ".folded"), "w") as f:
+            f.write(folded)
+        with open(self._path(profile_id, ".json"), "w") as f:
+            json.dump(summary, f)
+        self._prune()
+
+    def _prune(self):
+        summaries = sorted(
+            (name for name in os.listdir(self.directory) if name.endswith(".json")),
+            reverse=True
+        )
+        for name in summaries[self.max_files:]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(self._path(name[:-len(".json")], suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[dict]:
+        """Summaries of the stored profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return profiles
+
+    def read(self, profile_id: str) -> Optional[str]:
+        try:
+            with open(self._path(profile_id, ".folded")) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+profile_store = ProfileStore(Config.PROFILE_DIR, Config.PROFILE_MAX_FILES)
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(Config.PROFILING_ADMIN_TOKEN) and token is not None and hmac.compare_digest(
+        token.encode(), Config.PROFILING_ADMIN_TOKEN.encode()
+    )
+
+def profiling_enabled() -> bool:
+    return bool(Config.PROFILING_ADMIN_TOKEN) or Config.PROFILING_SAMPLE_RATE > 0
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles single requests on demand.
+
+    A request is profiled when it sends `X-Profile: <PROFILING_ADMIN_TOKEN>`
+    or is picked by `PROFILING_SAMPLE_RATE`. The event loop thread is
+    sampled while the request runs, with each stack rooted at the asyncio
+    task that was executing, so time spent on other requests is visible as
+    such. Only one request is profiled at a time; the profile ID is returned
+    in `X-Profile-Id`. Only installed when profiling is configured, so it
+    costs nothing otherwise.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._active = False
+
+    def _should_profile(self, scope) -> bool:
+        if self._active:
+            return False
+        headers = dict(scope.get("headers") or [])
+        token = headers.get(PROFILE_HEADER.lower().encode("latin-1"))
+        if token is not None and is_admin_token(token.decode("latin-1")):
+            return True
+        return random.random() < Config.PROFILING_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        task_name = task.get_name()
+        task.set_name(f"profiled: {scope['method']} {scope['path']}")
+
+        def label():
+            current = asyncio.current_task(loop)
+            return current.get_name() if current is not None else "event loop (idle or callbacks)"
+
+        started_at = datetime.now(timezone.utc)
+        slug = re.sub(r"[^\w]+", "_", scope["path"]).strip("_")[:40] or "root"
+        profile_id = f"{started_at.strftime('%Y%m%dT%H%M%S%f')}-{scope['method']}-{slug}"
+        status = {"code": 500}
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.lower().encode("latin-1"), profile_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        profiler = SamplingProfiler(threading.get_ident(), Config.PROFILING_INTERVAL_MS / 1000, label)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            task.set_name(task_name)
+            self._active = False
+            summary = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status["code"],
+                "trace_id": current_trace_id(),
+                "started_at": started_at.isoformat(),
+                "wall_ms": round(profiler.wall_seconds * 1000, 1),
+                "cpu_ms": round(profiler.cpu_seconds * 1000, 1) if profiler.cpu_seconds is not None else None,
+                "samples": sum(profiler.samples.values()),
+                "interval_ms": Config.PROFILING_INTERVAL_MS,
+            }
+            try:
+                await asyncio.to_thread(profile_store.save, profile_id, profiler.folded(), summary)
+            except Exception as e:
+                print(f"Warning: Failed to store profile {profile_id}: {e}")
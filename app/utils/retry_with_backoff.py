@@ -1,15 +1,32 @@
 import asyncio
+import random
 from google.api_core.exceptions import ResourceExhausted
+from app.utils.admission import AdmissionRejected
+from app.utils.deadline import remaining
+from app.utils.metrics import RATE_LIMITED, RETRIES, current_endpoint
 
 async def retry_with_backoff(func, retries=5, backoff_in_seconds=1):
-    """Retries a coroutine with exponential backoff."""
+    """Retries a coroutine with exponential backoff.
+
+    Waits use full jitter so requests throttled together do not retry in
+    lockstep. Admission rejections are not retried, and neither is anything
+    whose wait would outlast the request deadline.
+    """
     for attempt in range(retries):
         try:
             return await func()
+        except AdmissionRejected:
+            raise
         except ResourceExhausted as e:
+            RATE_LIMITED.labels(source="retry").inc()
+            wait_time = random.uniform(0, backoff_in_seconds * (2 ** attempt))  # Exponential backoff
+            time_left = remaining()
+            if time_left is not None and wait_time >= time_left:
+                print("Quota exceeded and no time left before the deadline.")
+                raise e
             if attempt < retries - 1:
-                wait_time = backoff_in_seconds * (2 ** attempt)  # Exponential backoff
-                print(f"Quota exceeded. Retrying in {wait_time} seconds...")
+                print(f"Quota exceeded. Retrying in {wait_time:.2f} seconds...")
+                RETRIES.labels(endpoint=current_endpoint.get()).inc()
                 await asyncio.sleep(wait_time)
             else:
                 print("Max retries reached.")
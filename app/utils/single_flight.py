@@ -0,0 +1,81 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterator, Optional
+from langchain_core.runnables import Runnable, RunnableConfig
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it is in flight await the same task and receive its result or
+    exception. The task is shielded, so a caller that disconnects does not
+    cancel the work for the others. Nothing is cached once it completes.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        total = self.executions + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / total if total else 0.0,
+        }
+
+class SingleFlightRunnable(Runnable):
+    """Wraps a runnable so concurrent `ainvoke` calls with the same input share one run.
+
+    The key is `key_func(input)` plus any configurable overrides, since those
+    change the result. Streaming and sync calls pass straight through.
+    """
+
+    def __init__(self, bound: Runnable, flight: SingleFlight, key_func: Callable[[Any], Hashable]):
+        self.bound = bound
+        self.flight = flight
+        self.key_func = key_func
+
+    @property
+    def InputType(self):
+        return self.bound.InputType
+
+    @property
+    def OutputType(self):
+        return self.bound.OutputType
+
+    def get_input_schema(self, config: Optional[RunnableConfig] = None):
+        return self.bound.get_input_schema(config)
+
+    def get_output_schema(self, config: Optional[RunnableConfig] = None):
+        return self.bound.get_output_schema(config)
+
+    @property
+    def config_specs(self):
+        return self.bound.config_specs
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.bound.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        configurable = (config or {}).get("configurable") or {}
+        key = (self.key_func(input), tuple(sorted((k, repr(v)) for k, v in configurable.items())))
+        return await self.flight.do(key, lambda: self.bound.ainvoke(input, config, **kwargs))
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        return self.bound.stream(input, config, **kwargs)
+
+    def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        return self.bound.astream(input, config, **kwargs)
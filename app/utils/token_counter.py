@@ -0,0 +1,50 @@
+from typing import Callable, Iterable, List
+import asyncio
+import hashlib
+from app.utils.context_builder import estimate_tokens
+from app.utils.metrics import record_cache_lookup
+from app.utils.ttl_cache import TTLCache
+
+class TokenCounter:
+    """Counts tokens with the model's own tokenizer, remembering counts by text.
+
+    `count_function` is a blocking tokenizer call (for Gemini, the
+    countTokens API behind `llm.get_num_tokens`), so it runs in a thread and
+    is bounded by `timeout_seconds`. When it fails or times out the
+    character estimate is returned instead, and not cached.
+    """
+
+    def __init__(self, count_function: Callable[[str], int], max_entries: int = 10000,
+                 ttl_seconds: float = 3600, timeout_seconds: float = 1.0):
+        self.count_function = count_function
+        self.timeout = timeout_seconds
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.estimated = 0
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    async def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = self._key(text)
+        tokens = self._cache.get(key)
+        record_cache_lookup("token_count", tokens is not None)
+        if tokens is not None:
+            return tokens
+
+        try:
+            tokens = await asyncio.wait_for(asyncio.to_thread(self.count_function, text), self.timeout)
+        except Exception as e:
+            self.estimated += 1
+            print(f"Warning: Token count unavailable, estimating instead: {e!r}")
+            return estimate_tokens(text)
+        self._cache.set(key, tokens)
+        return tokens
+
+    async def count_many(self, texts: Iterable[str]) -> List[int]:
+        return list(await asyncio.gather(*(self.count(text) for text in texts)))
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "estimated": self.estimated}
@@ -0,0 +1,241 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from uuid import UUID
+import json
+import os
+import threading
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from app.config import Config
+
+TRACE_ID_HEADER = "X-Trace-Id"
+
+class Span:
+    """One timed operation of a trace, modelled on OpenTelemetry spans."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "OK"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException):
+        self.status = "ERROR"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            exporter.export(self)
+
+    def to_dict(self) -> dict:
+        """OTLP/JSON-like field names, so the output can be loaded by trace viewers."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns else None,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.error},
+        }
+
+class SpanExporter:
+    """Discards spans. Subclasses write them somewhere."""
+
+    def export(self, span: Span):
+        pass
+
+class ConsoleSpanExporter(SpanExporter):
+    def export(self, span: Span):
+        print(json.dumps(span.to_dict(), default=str))
+
+class JsonFileSpanExporter(SpanExporter):
+    """Appends one JSON object per finished span to `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Ingestion runs in its own thread
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+def _create_exporter() -> SpanExporter:
+    if Config.TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    if Config.TRACING_EXPORTER == "file":
+        return JsonFileSpanExporter(Config.TRACING_FILE)
+    return SpanExporter()
+
+exporter = _create_exporter()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+def _new_span(name: str, attributes: Optional[Dict[str, Any]] = None,
+              parent: Optional[Span] = None, trace_id: Optional[str] = None,
+              parent_id: Optional[str] = None) -> Span:
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+    return Span(name, trace_id or os.urandom(16).hex(), parent_id, attributes)
+
+@contextmanager
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None,
+               trace_id: Optional[str] = None, parent_id: Optional[str] = None):
+    """Trace the enclosed block as a child of the current span, or as a new trace.
+
+    `trace_id`/`parent_id` continue a trace started elsewhere (e.g. from a
+    `traceparent` header). Yields None when tracing is disabled.
+    """
+    if not Config.TRACING_ENABLED:
+        yield None
+        return
+
+    parent = _current_span.get() if trace_id is None else None
+    span = _new_span(name, attributes, parent, trace_id, parent_id)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_id) from a W3C `traceparent` header, or (None, None)."""
+    parts = (header or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    return parts[1], parts[2]
+
+class TracingMiddleware:
+    """ASGI middleware that traces each HTTP request and returns its trace ID.
+
+    The trace ID is sent in the `X-Trace-Id` response header; an incoming
+    W3C `traceparent` header continues the caller's trace.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not Config.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id, parent_id = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+
+        with start_span(f"{scope['method']} {scope['path']}", attributes, trace_id, parent_id) as span:
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (TRACE_ID_HEADER.lower().encode("latin-1"), span.trace_id.encode("latin-1"))
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns langchain runs (chains, retrievers, chat models) into spans.
+
+    Runs nest under their parent run, and top-level runs under the span
+    that is current when they start. While a run is active it is also the
+    current span, so stages traced inside it (embedding, vector search)
+    are attached to it.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, tuple] = {}
+
+    def _start(self, name: str, run_id: UUID, parent_run_id: Optional[UUID], attributes: dict):
+        if not Config.TRACING_ENABLED:
+            return
+        previous = _current_span.get()
+        parent = self._runs[parent_run_id][0] if parent_run_id in self._runs else previous
+        span = _new_span(name, attributes, parent)
+        self._runs[run_id] = (span, previous)
+        _current_span.set(span)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        span, previous = run
+        if error is not None:
+            span.record_exception(error)
+        if _current_span.get() is span:
+            _current_span.set(previous)
+        span.end()
+
+    @staticmethod
+    def _name(serialized: Optional[Dict[str, Any]], kwargs: dict, default: str) -> str:
+        if kwargs.get("name"):
+            return kwargs["name"]
+        if serialized:
+            return serialized.get("name") or (serialized.get("id") or [default])[-1]
+        return default
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        self._start(self._name(serialized, kwargs, "chain"), run_id, parent_run_id, {"langchain.run_type": "chain"})
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        self._start(self._name(serialized, kwargs, "retriever"), run_id, parent_run_id, {"langchain.run_type": "retriever"})
+
+    def on_retriever_end(self, documents, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.get(run_id)
+        if run is not None:
+            run[0].set_attribute("retriever.documents", len(documents))
+        self._end(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        self._start(self._name(serialized, kwargs, "chat_model"), run_id, parent_run_id, {"langchain.run_type": "llm"})
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        self._start(self._name(serialized, kwargs, "llm"), run_id, parent_run_id, {"langchain.run_type": "llm"})
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
+
+tracing_handler = TracingCallbackHandler()
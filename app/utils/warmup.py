@@ -0,0 +1,57 @@
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import time
+
+class Warmup:
+    """Runs startup warmup steps concurrently and records how each one went.
+
+    Steps are best-effort: a failed or slow step is reported but does not
+    stop the app from serving, since everything a step warms is also
+    created on first use.
+    """
+
+    def __init__(self, timeout_seconds: float = 30):
+        self.timeout = timeout_seconds
+        self._steps: Dict[str, Callable[[], Awaitable]] = {}
+        self.results: Dict[str, dict] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def add(self, name: str, step: Callable[[], Awaitable]):
+        self._steps[name] = step
+        self.results[name] = {"status": "pending"}
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable]):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(step(), self.timeout)
+            status, error = "ok", None
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"Not finished after {self.timeout}s"
+        except Exception as e:
+            status, error = "error", str(e)
+        self.results[name] = {
+            "status": status,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        if error:
+            self.results[name]["error"] = error
+            print(f"Warning: Warmup step {name} failed: {error}")
+
+    async def run(self):
+        self.started_at = time.perf_counter()
+        await asyncio.gather(*(self._run_step(name, step) for name, step in self._steps.items()))
+        self.finished_at = time.perf_counter()
+        print(f"Warmup finished in {self.finished_at - self.started_at:.2f}s: {self.results}")
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    def status(self) -> dict:
+        end = self.finished_at or time.perf_counter()
+        return {
+            "ready": self.ready,
+            "elapsed_ms": round((end - self.started_at) * 1000, 1) if self.started_at else None,
+            "steps": self.results,
+        }
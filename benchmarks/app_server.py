@@ -0,0 +1,86 @@
+"""Serves app.server:app with the fake Gemini models and an event-loop lag probe.
+
+Expects SUPABASE_URL to point at benchmarks.supabase_stub and DB_* at a
+local Postgres with pgvector. Normally started by benchmarks.run.
+
+    python -m benchmarks.app_server --port 8765 --seed-docs 500
+"""
+from collections import deque
+from contextlib import asynccontextmanager
+import argparse
+import asyncio
+import time
+import numpy as np
+from benchmarks.fakes import fake_documents, install_fakes
+
+install_fakes()
+
+from app.server import app, vectorstore  # noqa: E402  (must import after the fakes are installed)
+from app.database.vector_index import rebuild_vector_index  # noqa: E402
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that sleeps `interval` seconds."""
+
+    def __init__(self, interval: float = 0.01, window: int = 100_000):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def snapshot(self, reset: bool = False) -> dict:
+        samples = np.array(self.samples) * 1000 if self.samples else np.zeros(1)
+        stats = {
+            "samples": len(self.samples),
+            "p50_ms": round(float(np.percentile(samples, 50)), 3),
+            "p99_ms": round(float(np.percentile(samples, 99)), 3),
+            "max_ms": round(float(samples.max()), 3),
+        }
+        if reset:
+            self.samples.clear()
+        return stats
+
+lag_monitor = LoopLagMonitor()
+app_lifespan = app.router.lifespan_context
+
+@asynccontextmanager
+async def lifespan_with_lag_monitor(app):
+    task = asyncio.create_task(lag_monitor.run())
+    async with app_lifespan(app) as state:
+        yield state
+    task.cancel()
+
+app.router.lifespan_context = lifespan_with_lag_monitor
+
+@app.get("/__bench/loop-lag", include_in_schema=False)
+async def get_loop_lag(reset: bool = False):
+    return lag_monitor.snapshot(reset)
+
+def seed_collection(count: int, batch_size: int = 200):
+    """Replace the vector collection with `count` synthetic chunks and rebuild its indexes."""
+    start = time.perf_counter()
+    vectorstore.delete_collection()
+    vectorstore.create_collection()
+    documents = fake_documents(count)
+    for i in range(0, count, batch_size):
+        batch = documents[i:i + batch_size]
+        vectorstore.add_texts(batch, metadatas=[{"source": f"bench-{i + j}.pdf"} for j in range(len(batch))])
+    rebuild_vector_index()
+    print(f"Seeded {count} chunks in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed-docs", type=int, default=500, help="synthetic chunks to load; 0 keeps the collection")
+    args = parser.parse_args()
+
+    if args.seed_docs > 0:
+        seed_collection(args.seed_docs)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,133 @@
+"""Deterministic stand-ins for Gemini, installed into the langchain classes the app uses.
+
+Patching the provider classes (rather than swapping the app's objects)
+keeps everything the app wraps around them in the measured path:
+admission control, hedging, embedding cache, callbacks and retries.
+"""
+from typing import Any, List
+import asyncio
+import hashlib
+import os
+import re
+import time
+import numpy as np
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+
+EMBEDDING_DIMENSIONS = 768
+
+class FakeSettings:
+    """Latency profile of the fake models, read from the environment."""
+
+    def __init__(self):
+        self.llm_ttft = float(os.getenv("BENCH_LLM_TTFT_MS", "300")) / 1000
+        self.llm_tokens = int(os.getenv("BENCH_LLM_TOKENS", "60"))
+        self.llm_token_interval = float(os.getenv("BENCH_LLM_TOKEN_INTERVAL_MS", "10")) / 1000
+        self.embedding_latency = float(os.getenv("BENCH_EMBEDDING_LATENCY_MS", "40")) / 1000
+
+    @property
+    def llm_total(self) -> float:
+        return self.llm_ttft + max(0, self.llm_tokens - 1) * self.llm_token_interval
+
+settings = FakeSettings()
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "little")
+
+def fake_embedding(text: str) -> List[float]:
+    """Bag-of-words hashing embedding: texts sharing words point the same way."""
+    vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()) or [""]:
+        vector += np.random.default_rng(_seed(word)).standard_normal(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+def fake_answer_tokens(messages) -> List[str]:
+    prompt = "".join(str(getattr(m, "content", m)) for m in messages)
+    seed = _seed(prompt)
+    return [f"token{(seed + i) % 997} " for i in range(settings.llm_tokens)]
+
+async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+    await asyncio.sleep(settings.llm_total)
+    content = "".join(fake_answer_tokens(messages))
+    return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+    time.sleep(settings.llm_total)
+    content = "".join(fake_answer_tokens(messages))
+    return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+    await asyncio.sleep(settings.llm_ttft)
+    for i, token in enumerate(fake_answer_tokens(messages)):
+        if i:
+            await asyncio.sleep(settings.llm_token_interval)
+        chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+        if run_manager:
+            await run_manager.on_llm_new_token(token, chunk=chunk)
+        yield chunk
+
+def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+    time.sleep(settings.llm_ttft)
+    for i, token in enumerate(fake_answer_tokens(messages)):
+        if i:
+            time.sleep(settings.llm_token_interval)
+        chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+        if run_manager:
+            run_manager.on_llm_new_token(token, chunk=chunk)
+        yield chunk
+
+def get_num_tokens(self, text: str) -> int:
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+def embed_query(self, text: str, *args: Any, **kwargs: Any) -> List[float]:
+    time.sleep(settings.embedding_latency)
+    return fake_embedding(text)
+
+async def aembed_query(self, text: str) -> List[float]:
+    await asyncio.sleep(settings.embedding_latency)
+    return fake_embedding(text)
+
+def embed_documents(self, texts: List[str], *args: Any, **kwargs: Any) -> List[List[float]]:
+    return [fake_embedding(text) for text in texts]
+
+async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+    await asyncio.sleep(settings.embedding_latency)
+    return [fake_embedding(text) for text in texts]
+
+def install_fakes():
+    """Route every Gemini chat and embedding call in this process to the fakes."""
+    ChatGoogleGenerativeAI._agenerate = _agenerate
+    ChatGoogleGenerativeAI._generate = _generate
+    ChatGoogleGenerativeAI._astream = _astream
+    ChatGoogleGenerativeAI._stream = _stream
+    ChatGoogleGenerativeAI.get_num_tokens = get_num_tokens
+    GoogleGenerativeAIEmbeddings.embed_query = embed_query
+    GoogleGenerativeAIEmbeddings.aembed_query = aembed_query
+    GoogleGenerativeAIEmbeddings.embed_documents = embed_documents
+    GoogleGenerativeAIEmbeddings.aembed_documents = aembed_documents
+
+# Words the synthetic corpus and the benchmark questions are drawn from, so
+# retrieval (vector and full-text) finds real matches
+VOCABULARY = (
+    "enrollment scholarship tuition registrar library thesis grading uniform schedule admission "
+    "transfer clearance curriculum dean faculty semester laboratory internship graduation campus "
+    "requirements deadline portal form subject units probation honors dormitory clinic guidance "
+    "organization election orientation exam retake policy fee refund payment id card parking"
+).split()
+
+def fake_documents(count: int, words_per_document: int = 120) -> List[str]:
+    """`count` deterministic pseudo-handbook chunks."""
+    documents = []
+    for i in range(count):
+        rng = np.random.default_rng(i)
+        topic = VOCABULARY[i % len(VOCABULARY)]
+        words = rng.choice(VOCABULARY, size=words_per_document)
+        documents.append(f"{topic.title()} policy section {i}: " + " ".join(words) + ".")
+    return documents
+
+def fake_question(index: int, words: int = 6) -> str:
+    """A deterministic question; different indexes give different questions."""
+    rng = np.random.default_rng(1_000_003 + index)
+    return f"What is the {' '.join(rng.choice(VOCABULARY, size=words))} rule number {index}?"
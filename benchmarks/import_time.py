@@ -0,0 +1,94 @@
+"""Import-time report for app.server, to track cold-start regressions.
+
+Runs `python -X importtime -c "import app.server"` in a fresh interpreter
+and reports the total, the exclusive import time per top-level package
+and the slowest individual modules as JSON.
+
+    python -m benchmarks.import_time --output import-time.json
+    python -m benchmarks.import_time --baseline import-time.json --fail-threshold 0.2
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import List, Tuple
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+def measure(module: str) -> Tuple[List[Tuple[str, int, int]], float]:
+    """(module, self_us, cumulative_us) for every import, and the wall time of the run."""
+    env = dict(os.environ)
+    for key in ("GEMINI_API_KEY", "GROQ_API_KEY", "ELEVENLABS_API_KEY"):
+        env.setdefault(key, "import-time")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|", 2)
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries, wall
+
+def report(module: str, top: int) -> dict:
+    entries, wall = measure(module)
+    by_package = defaultdict(int)
+    for name, self_us, _ in entries:
+        by_package[name.split(".")[0]] += self_us
+    total_us = next((cumulative for name, _, cumulative in entries if name == module), sum(by_package.values()))
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "process_wall_ms": round(wall * 1000, 1),
+        "modules_imported": len(entries),
+        "packages_ms": {
+            package: round(us / 1000, 1)
+            for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]
+        },
+        "slowest_modules_ms": {
+            name: round(self_us / 1000, 1)
+            for name, self_us, _ in sorted(entries, key=lambda entry: -entry[1])[:top]
+        },
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app.server")
+    parser.add_argument("--top", type=int, default=25, help="packages and modules to list")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--fail-threshold", type=float,
+                        help="exit with status 1 if total_ms grew by more than this fraction")
+    args = parser.parse_args(argv)
+
+    result = report(args.module, args.top)
+    result["meta"] = {"timestamp": datetime.now(timezone.utc).isoformat(), "python": sys.version.split()[0]}
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            previous = json.load(f)
+        change = (result["total_ms"] - previous["total_ms"]) / previous["total_ms"] if previous["total_ms"] else 0.0
+        result["baseline_delta"] = {"total_ms": round(change, 4)}
+        print(f"{args.module}: {result['total_ms']} ms ({change:+.1%} vs baseline)", file=sys.stderr)
+        if args.fail_threshold is not None and change > args.fail_threshold:
+            status = 1
+
+    payload = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
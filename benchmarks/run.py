@@ -0,0 +1,316 @@
+"""Offline load test for app.server:app.
+
+Starts the in-memory Supabase stand-in and the app (with fake Gemini
+models) as subprocesses, drives /query, /chat/, /sessions/ and langserve
+/batch at a fixed concurrency, and writes latency percentiles, throughput
+and event-loop lag per scenario as JSON.
+
+    python -m benchmarks.run --requests 200 --concurrency 16 --output results.json
+    python -m benchmarks.run --baseline results.json --fail-threshold 0.2
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+import httpx
+import jwt
+import numpy as np
+from benchmarks.fakes import fake_question
+
+SCENARIOS = ("query", "chat", "sessions", "batch")
+JWT_SECRET = "bench-jwt-secret"
+
+def mint_token(subject: str, role: str = "authenticated", ttl_seconds: int = 6 * 3600) -> str:
+    claims = {
+        "sub": subject,
+        "role": role,
+        "aud": "authenticated",
+        "email": f"{subject}@bench.local",
+        "exp": int(time.time()) + ttl_seconds,
+    }
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+def user_tokens(count: int) -> List[str]:
+    return [mint_token(str(uuid.uuid5(uuid.NAMESPACE_URL, f"bench-user-{i}"))) for i in range(count)]
+
+def server_environment(args) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "SUPABASE_URL": f"http://127.0.0.1:{args.stub_port}",
+        # supabase-py only accepts JWT-shaped keys
+        "SUPABASE_KEY": jwt.encode({"role": "anon", "iss": "bench"}, JWT_SECRET, algorithm="HS256"),
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "BENCH_LLM_TTFT_MS": str(args.llm_ttft_ms),
+        "BENCH_LLM_TOKENS": str(args.llm_tokens),
+        "BENCH_LLM_TOKEN_INTERVAL_MS": str(args.llm_token_interval_ms),
+        "BENCH_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+    })
+    for key in ("GEMINI_API_KEY", "GROQ_API_KEY", "ELEVENLABS_API_KEY"):
+        env.setdefault(key, "bench")
+    # Measure the app, not the Gemini quota; export lower values to include admission control
+    env.setdefault("GEMINI_LLM_RPM", "1000000")
+    env.setdefault("GEMINI_EMBEDDING_RPM", "1000000")
+    env.setdefault("TRACING_EXPORTER", "none")
+    return env
+
+async def wait_until_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode} before becoming ready")
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+    raise TimeoutError(f"{url} was not ready after {timeout}s")
+
+def summarize(latencies: List[float], statuses: Counter, elapsed: float) -> dict:
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    completed = sum(statuses.values())
+    errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+    return {
+        "requests": completed,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(float(ms.mean()), 2),
+            "p50": round(float(np.percentile(ms, 50)), 2),
+            "p95": round(float(np.percentile(ms, 95)), 2),
+            "p99": round(float(np.percentile(ms, 99)), 2),
+            "max": round(float(ms.max()), 2),
+        },
+    }
+
+RequestFunc = Callable[[httpx.AsyncClient, int, int, dict], Awaitable[int]]
+
+class Benchmark:
+    def __init__(self, args, base_url: str):
+        self.args = args
+        self.base_url = base_url
+        self.tokens = user_tokens(args.users)
+        self._questions = itertools.count()
+
+    def _auth(self, worker: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[worker % len(self.tokens)]}"}
+
+    def _question(self) -> str:
+        return fake_question(next(self._questions))
+
+    async def query(self, client: httpx.AsyncClient, worker: int, index: int, state: dict) -> int:
+        response = await client.post("/query", json={"query": self._question()})
+        return response.status_code
+
+    async def chat(self, client: httpx.AsyncClient, worker: int, index: int, state: dict) -> int:
+        # Each worker holds a conversation for --chat-turns turns, then starts a new one
+        if state.get("turns", 0) >= self.args.chat_turns:
+            state.clear()
+        response = await client.post(
+            "/chat/",
+            json={"query": self._question(), "session_id": state.get("session_id")},
+            headers=self._auth(worker)
+        )
+        if response.status_code == 200:
+            state["session_id"] = response.json()["session_id"]
+            state["turns"] = state.get("turns", 0) + 1
+        return response.status_code
+
+    async def sessions(self, client: httpx.AsyncClient, worker: int, index: int, state: dict) -> int:
+        response = await client.get("/sessions/", headers=self._auth(worker))
+        return response.status_code
+
+    async def batch(self, client: httpx.AsyncClient, worker: int, index: int, state: dict) -> int:
+        inputs = [self._question() for _ in range(self.args.batch_size)]
+        response = await client.post("/batch", json={"inputs": inputs, "config": {}, "kwargs": {}})
+        return response.status_code
+
+    async def prepare_sessions(self, client: httpx.AsyncClient):
+        """Give every benchmark user a few conversations to list."""
+        for worker in range(len(self.tokens)):
+            state: dict = {}
+            for index in range(self.args.chat_turns):
+                await self.chat(client, worker, index, state)
+
+    async def _run(self, client: httpx.AsyncClient, func: RequestFunc, requests: int):
+        counter = itertools.count()
+        latencies: List[float] = []
+        statuses: Counter = Counter()
+
+        async def worker(worker_id: int):
+            state: dict = {}
+            while (index := next(counter)) < requests:
+                start = time.perf_counter()
+                try:
+                    status = await func(client, worker_id, index, state)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(self.args.concurrency)))
+        return latencies, statuses, time.perf_counter() - start
+
+    async def scenario(self, client: httpx.AsyncClient, name: str) -> dict:
+        func: RequestFunc = getattr(self, name)
+        if name == "sessions":
+            await self.prepare_sessions(client)
+        if self.args.warmup:
+            await self._run(client, func, self.args.warmup)
+
+        await client.get("/__bench/loop-lag", params={"reset": True})
+        latencies, statuses, elapsed = await self._run(client, func, self.args.requests)
+        result = summarize(latencies, statuses, elapsed)
+        result["loop_lag_ms"] = (await client.get("/__bench/loop-lag", params={"reset": True})).json()
+        if name == "batch":
+            result["batch_size"] = self.args.batch_size
+        return result
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(max_connections=self.args.concurrency * 2, max_keepalive_connections=self.args.concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.args.timeout, limits=limits) as client:
+            results = {}
+            for name in self.args.scenarios:
+                print(f"Running {name}: {self.args.requests} requests at concurrency {self.args.concurrency}", file=sys.stderr)
+                results[name] = await self.scenario(client, name)
+            server_stats = (await client.get("/query/cache")).json()
+        return {"scenarios": results, "server_stats": server_stats}
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict) -> dict:
+    """Relative change per scenario against a previous run (positive = slower / less throughput)."""
+    deltas = {}
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+
+        def change(new, old):
+            return round((new - old) / old, 4) if old else None
+
+        deltas[name] = {
+            **{p: change(current["latency_ms"][p], previous["latency_ms"][p]) for p in ("p50", "p95", "p99")},
+            "throughput_rps": change(previous["throughput_rps"], current["throughput_rps"]),
+        }
+    return deltas
+
+def print_summary(report: dict):
+    print(f"{'scenario':<10} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7} {'lag p99':>8}", file=sys.stderr)
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:<10} {result['throughput_rps']:>8} {latency['p50']:>9} {latency['p95']:>9} "
+            f"{latency['p99']:>9} {result['errors']:>7} {result['loop_lag_ms']['p99_ms']:>8}",
+            file=sys.stderr
+        )
+    for name, delta in report.get("baseline_delta", {}).items():
+        print(f"{name:<10} vs baseline: " + ", ".join(f"{k} {v:+.1%}" for k, v in delta.items() if v is not None), file=sys.stderr)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda s: [name for name in s.split(",") if name],
+                        help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=4, help="inputs per /batch request")
+    parser.add_argument("--users", type=int, default=8, help="distinct authenticated users")
+    parser.add_argument("--chat-turns", type=int, default=5, help="turns per conversation before starting a new session")
+    parser.add_argument("--seed-docs", type=int, default=500, help="synthetic chunks loaded into pgvector; 0 keeps the collection")
+    parser.add_argument("--llm-ttft-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--llm-token-interval-ms", type=float, default=10)
+    parser.add_argument("--embedding-latency-ms", type=float, default=40)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stub-port", type=int, default=54321)
+    parser.add_argument("--timeout", type=float, default=60, help="per-request client timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--fail-threshold", type=float,
+                        help="exit with status 1 if any p95 or throughput regresses by more than this fraction")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    env = server_environment(args)
+    processes = []
+    try:
+        stub = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.supabase_stub", "--port", str(args.stub_port)], env=env
+        )
+        processes.append(stub)
+        await wait_until_ready(f"http://127.0.0.1:{args.stub_port}/__stub/tables", stub, args.startup_timeout)
+
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.app_server", "--port", str(args.port), "--seed-docs", str(args.seed_docs)],
+            env=env
+        )
+        processes.append(server)
+        base_url = f"http://127.0.0.1:{args.port}"
+        await wait_until_ready(f"{base_url}/__bench/loop-lag", server, args.startup_timeout)
+
+        report = await Benchmark(args, base_url).run()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    report["meta"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["baseline_delta"] = compare(report, json.load(f))
+        if args.fail_threshold is not None:
+            regressions = [
+                name for name, delta in report["baseline_delta"].items()
+                if any((delta[k] or 0) > args.fail_threshold for k in ("p95", "throughput_rps"))
+            ]
+            if regressions:
+                print(f"Regressed beyond {args.fail_threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+                status = 1
+
+    print_summary(report)
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
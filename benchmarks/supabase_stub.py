@@ -0,0 +1,282 @@
+"""In-memory stand-in for the Supabase REST (PostgREST) and Auth (GoTrue) APIs.
+
+Implements the subset the app uses: select with column lists and embedded
+one-to-many resources (`messages!inner(*)`), eq/neq/gt/gte/lt/lte/is/in
+filters combined with or/and, order, limit/offset, exact counts, insert (with the repo's
+row triggers), update, delete, `Prefer: return=representation` and
+single-object responses. Auth answers
+`GET /auth/v1/user` from the (unverified) claims of the bearer token.
+
+    python -m benchmarks.supabase_stub --port 54321
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import re
+import uuid
+import jwt
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+# Columns filled in on insert when the client does not send them
+TABLE_DEFAULTS: Dict[str, Dict[str, Callable[[], Any]]] = {
+    "sessions": {"title": lambda: None, "user_id": lambda: None, "is_active": lambda: True,
+                 "summary": lambda: None, "summarized_until": lambda: None,
+                 "message_count": lambda: 0, "last_message": lambda: None},
+    "messages": {"metadata": dict},
+}
+# Tables whose rows get an updated_at column
+TIMESTAMPED_TABLES = {"sessions"}
+# Stored procedures, by name: handler(tables, params) -> JSON result
+RPC_HANDLERS: Dict[str, Callable[[Dict[str, List[dict]], dict], Any]] = {}
+
+def _touch_session(tables: Dict[str, List[dict]], message: dict):
+    for session in tables["sessions"]:
+        if session["id"] == message.get("session_id"):
+            session["updated_at"] = message["created_at"]
+            session["message_count"] = session.get("message_count", 0) + 1
+            if message.get("role") == "user":
+                session["last_message"] = message.get("content")
+
+# Row triggers run after each insert, by table: trigger(tables, row)
+# (mirrors the triggers in supabase/migrations)
+AFTER_INSERT_TRIGGERS: Dict[str, List[Callable[[Dict[str, List[dict]], dict], None]]] = {
+    "messages": [_touch_session],
+}
+
+OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+}
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _as_text(value: Any) -> Optional[str]:
+    """Compare stored values the way PostgREST sees them in a query string."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    if current:
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+def parse_select(select: str) -> Tuple[List[str], List[Tuple[str, bool, str]]]:
+    """Columns and embedded resources (table, inner, nested select) of a select parameter."""
+    columns, embeds = [], []
+    for part in _split_top_level(select or "*"):
+        match = re.match(r"^(\w+)(!inner)?\((.*)\)$", part)
+        if match:
+            embeds.append((match.group(1), bool(match.group(2)), match.group(3)))
+        else:
+            columns.append(part)
+    return columns, embeds
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    operator, _, operand = expression.partition(".")
+    value = _as_text(row.get(column))
+    if isinstance(row.get(column), bool):
+        # Postgres booleans accept any case (supabase-py sends Python's "True")
+        operand = operand.lower()
+    if operator == "is":
+        return value is None if operand == "null" else value == operand
+    if operator == "in":
+        return value in [item.strip('"') for item in operand.strip("()").split(",")]
+    if operator in OPERATORS:
+        if value is None and operator in ("eq", "neq"):
+            return operator == "neq"
+        return OPERATORS[operator](value, operand)
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+def _matches_logical(row: dict, operator: str, expression: str) -> bool:
+    """Evaluate an `or=(...)`/`and=(...)` filter, which may nest and quote values."""
+    results = []
+    for condition in _split_top_level(expression.strip()[1:-1]):
+        nested = re.match(r"^(and|or)(\(.*\))$", condition)
+        if nested:
+            results.append(_matches_logical(row, nested.group(1), nested.group(2)))
+            continue
+        column, _, rest = condition.partition(".")
+        operator_name, _, operand = rest.partition(".")
+        operand = operand.strip('"')
+        results.append(_matches(row, column, f"{operator_name}.{operand}"))
+    return all(results) if operator == "and" else any(results)
+
+def _matches_filter(row: dict, column: str, expression: str) -> bool:
+    if column in ("or", "and"):
+        return _matches_logical(row, column, expression)
+    return _matches(row, column, expression)
+
+class InMemoryPostgrest:
+    def __init__(self):
+        self.tables: Dict[str, List[dict]] = defaultdict(list)
+
+    def _filtered(self, table: str, filters: List[Tuple[str, str]]) -> List[dict]:
+        return [row for row in self.tables[table] if all(_matches_filter(row, c, e) for c, e in filters)]
+
+    def _foreign_key(self, parent: str) -> str:
+        return f"{parent[:-1] if parent.endswith('s') else parent}_id"
+
+    def _project(self, table: str, row: dict, select: str) -> Optional[dict]:
+        columns, embeds = parse_select(select)
+        result = dict(row) if "*" in columns else {c: row.get(c) for c in columns}
+        for child, inner, child_select in embeds:
+            key = self._foreign_key(table)
+            children = [
+                self._project(child, child_row, child_select)
+                for child_row in self.tables[child] if child_row.get(key) == row.get("id")
+            ]
+            if inner and not children:
+                return None
+            result[child] = children
+        return result
+
+    def select(self, table: str, params: List[Tuple[str, str]]) -> List[dict]:
+        query = dict(params)
+        filters = [(k, v) for k, v in params if k not in RESERVED_PARAMS]
+        rows = self._filtered(table, filters)
+        for order in reversed((query.get("order") or "").split(",")):
+            if not order:
+                continue
+            column, *modifiers = order.split(".")
+            rows = sorted(
+                rows,
+                key=lambda r: (r.get(column) is None, _as_text(r.get(column)) or ""),
+                reverse="desc" in modifiers
+            )
+        projected = [p for p in (self._project(table, row, query.get("select", "*")) for row in rows) if p is not None]
+        offset = int(query.get("offset", 0))
+        limit = int(query["limit"]) if "limit" in query else None
+        return projected[offset:offset + limit if limit is not None else None]
+
+    def count(self, table: str, params: List[Tuple[str, str]]) -> int:
+        return len(self._filtered(table, [(k, v) for k, v in params if k not in RESERVED_PARAMS]))
+
+    def insert(self, table: str, body: Any) -> List[dict]:
+        inserted = []
+        for values in body if isinstance(body, list) else [body]:
+            row = {"id": str(uuid.uuid4()), "created_at": _now()}
+            if table in TIMESTAMPED_TABLES:
+                row["updated_at"] = row["created_at"]
+            for column, default in TABLE_DEFAULTS.get(table, {}).items():
+                row[column] = default()
+            row.update(values)
+            self.tables[table].append(row)
+            for trigger in AFTER_INSERT_TRIGGERS.get(table, []):
+                trigger(self.tables, row)
+            inserted.append(row)
+        return inserted
+
+    def update(self, table: str, params: List[Tuple[str, str]], body: dict) -> List[dict]:
+        rows = self._filtered(table, [(k, v) for k, v in params if k not in RESERVED_PARAMS])
+        for row in rows:
+            row.update(body)
+        return rows
+
+    def delete(self, table: str, params: List[Tuple[str, str]]) -> List[dict]:
+        rows = self._filtered(table, [(k, v) for k, v in params if k not in RESERVED_PARAMS])
+        ids = {id(row) for row in rows}
+        self.tables[table] = [row for row in self.tables[table] if id(row) not in ids]
+        return rows
+
+def create_app(store: Optional[InMemoryPostgrest] = None) -> FastAPI:
+    store = store or InMemoryPostgrest()
+    app = FastAPI()
+    app.state.store = store
+
+    def respond(request: Request, rows: List[dict], status_code: int = 200, total: Optional[int] = None) -> Response:
+        prefer = request.headers.get("prefer", "")
+        total = len(rows) if total is None else total
+        headers = {"Content-Range": f"0-{max(len(rows) - 1, 0)}/{total if 'count=' in prefer else '*'}"}
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(rows) != 1:
+                return JSONResponse(
+                    {"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned",
+                     "details": f"The result contains {len(rows)} rows", "hint": None},
+                    status_code=406
+                )
+            return JSONResponse(rows[0], status_code=status_code, headers=headers)
+        if request.method != "GET" and "return=representation" not in prefer:
+            return Response(status_code=204 if status_code == 200 else status_code, headers=headers)
+        return JSONResponse(rows, status_code=status_code, headers=headers)
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str, request: Request):
+        handler = RPC_HANDLERS.get(function)
+        if handler is None:
+            return JSONResponse({"code": "PGRST202", "message": f"Could not find the function {function}"}, status_code=404)
+        return JSONResponse(handler(store.tables, await request.json()))
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        params = list(request.query_params.multi_items())
+        # Counts cover every matching row, not just the requested page
+        return respond(request, store.select(table, params), total=store.count(table, params))
+
+    @app.post("/rest/v1/{table}")
+    async def insert(table: str, request: Request):
+        return respond(request, store.insert(table, await request.json()), status_code=201)
+
+    @app.patch("/rest/v1/{table}")
+    async def update(table: str, request: Request):
+        return respond(request, store.update(table, list(request.query_params.multi_items()), await request.json()))
+
+    @app.delete("/rest/v1/{table}")
+    async def delete(table: str, request: Request):
+        return respond(request, store.delete(table, list(request.query_params.multi_items())))
+
+    @app.get("/auth/v1/user")
+    async def get_user(request: Request):
+        token = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        try:
+            claims = jwt.decode(token, options={"verify_signature": False})
+        except jwt.InvalidTokenError:
+            return JSONResponse({"code": 401, "msg": "invalid JWT"}, status_code=401)
+        if not claims.get("sub"):
+            return JSONResponse({"code": 403, "msg": "token has no user"}, status_code=403)
+        now = _now()
+        return {
+            "id": claims["sub"],
+            "aud": claims.get("aud", "authenticated"),
+            "role": claims.get("role", "authenticated"),
+            "email": claims.get("email", f"{claims['sub']}@bench.local"),
+            "email_confirmed_at": now,
+            "created_at": now,
+            "updated_at": now,
+            "app_metadata": {},
+            "user_metadata": {"full_name": "Benchmark User", "display_name": "bench"},
+        }
+
+    @app.get("/__stub/tables")
+    async def table_sizes():
+        return {name: len(rows) for name, rows in store.tables.items()}
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
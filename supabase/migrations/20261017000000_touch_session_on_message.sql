@@ -0,0 +1,19 @@
+-- Bump the session's updated_at in the same statement that stores a message,
+-- so the API stores a chat message in one round trip instead of an insert
+-- followed by a separate sessions update.
+create or replace function public.touch_session_on_message()
+returns trigger
+language plpgsql
+as $$
+begin
+  update public.sessions
+     set updated_at = now()
+   where id = new.session_id;
+  return new;
+end;
+$$;
+
+drop trigger if exists messages_touch_session on public.messages;
+create trigger messages_touch_session
+after insert on public.messages
+for each row execute function public.touch_session_on_message();
@@ -0,0 +1,5 @@
+-- Rolling summary of a session's older messages, used by MEMORY_MODE=summary.
+-- summarized_until is the created_at of the newest message folded into it.
+alter table public.sessions
+  add column if not exists summary text,
+  add column if not exists summarized_until timestamptz;
@@ -0,0 +1,39 @@
+-- Keep message_count and last_message (the latest user message) on the
+-- session row, so listing sessions does not read their messages.
+alter table public.sessions
+  add column if not exists message_count integer not null default 0,
+  add column if not exists last_message text;
+
+create or replace function public.touch_session_on_message()
+returns trigger
+language plpgsql
+as $$
+begin
+  update public.sessions
+     set updated_at = now(),
+         message_count = message_count + 1,
+         last_message = case when new.role = 'user' then new.content else last_message end
+   where id = new.session_id;
+  return new;
+end;
+$$;
+
+-- Backfill sessions created before the trigger maintained the counters
+update public.sessions s
+   set message_count = counts.message_count,
+       last_message = counts.last_message
+  from (
+    select session_id,
+           count(*) as message_count,
+           (array_agg(content order by created_at desc) filter (where role = 'user'))[1] as last_message
+      from public.messages
+     group by session_id
+  ) counts
+ where counts.session_id = s.id;
+
+-- Keyset pagination for GET /sessions/ and GET /sessions/{id}/messages
+create index if not exists sessions_user_updated_at_idx
+  on public.sessions (user_id, updated_at desc, id desc)
+  where is_active;
+create index if not exists messages_session_created_at_idx
+  on public.messages (session_id, created_at desc, id desc);
@@ -0,0 +1,113 @@
+"""AIMD concurrency and token-bucket admission in front of Gemini.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import time
+import unittest
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
+from app.utils.admission import AdmissionController, AdmissionRejected, NoFreeSlot
+
+class AdmissionControllerTest(unittest.IsolatedAsyncioTestCase):
+    def controller(self, rate_per_minute: float = 6000, max_concurrency: int = 4) -> AdmissionController:
+        return AdmissionController("test", rate_per_minute=rate_per_minute,
+                                   max_concurrency=max_concurrency)
+
+    async def call(self, controller: AdmissionController, error: BaseException = None):
+        async with controller.admit():
+            if error is not None:
+                raise error
+
+    async def test_success_grows_limit_additively(self):
+        controller = self.controller()
+        controller.limit = 2.0
+
+        await self.call(controller)
+
+        self.assertEqual(controller.limit, 2.5)
+        self.assertEqual(controller.stats()["in_flight"], 0)
+
+    async def test_429_halves_limit(self):
+        controller = self.controller()
+
+        with self.assertRaises(ResourceExhausted):
+            await self.call(controller, ResourceExhausted("quota"))
+
+        self.assertEqual(controller.limit, 2.0)
+        self.assertEqual(controller.throttled, 1)
+
+    async def test_other_failures_leave_limit_unchanged(self):
+        controller = self.controller()
+        controller.limit = 2.0
+
+        for error in (DeadlineExceeded("slow"), RuntimeError("connection reset"), asyncio.TimeoutError()):
+            with self.assertRaises(type(error)):
+                await self.call(controller, error)
+
+        self.assertEqual(controller.limit, 2.0)
+        self.assertEqual(controller.throttled, 0)
+        self.assertEqual(controller.stats()["in_flight"], 0)
+
+    async def test_cancellation_leaves_limit_unchanged(self):
+        controller = self.controller()
+        controller.limit = 2.0
+        started = asyncio.Event()
+
+        async def hang():
+            async with controller.admit():
+                started.set()
+                await asyncio.Event().wait()
+
+        task = asyncio.create_task(hang())
+        await started.wait()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertEqual(controller.limit, 2.0)
+        self.assertEqual(controller.stats()["in_flight"], 0)
+
+    async def test_empty_bucket_rejects_without_waiting(self):
+        # 60/min refills one token a second; the burst holds two
+        controller = self.controller(rate_per_minute=60)
+        await controller.acquire(wait=False)
+        await controller.acquire(wait=False)
+
+        with self.assertRaises(NoFreeSlot):
+            await controller.acquire(wait=False)
+        self.assertEqual(controller.rejected, 1)
+
+    async def test_rejects_when_deadline_passes_before_admission(self):
+        # 6/min refills one token every ten seconds
+        controller = self.controller(rate_per_minute=6)
+        await controller.acquire()
+
+        started = time.monotonic()
+        with self.assertRaises(AdmissionRejected):
+            await controller.acquire(deadline=time.monotonic() + 1)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    async def test_waiters_are_admitted_by_priority(self):
+        controller = self.controller(max_concurrency=1)
+        await controller.acquire()
+        admitted = []
+
+        async def wait_for_slot(priority: int):
+            await controller.acquire(priority=priority)
+            admitted.append(priority)
+
+        background = asyncio.create_task(wait_for_slot(3))
+        chat = asyncio.create_task(wait_for_slot(0))
+        await asyncio.sleep(0)
+        self.assertEqual(controller.stats()["queued"], 2)
+
+        controller.release(succeeded=True)
+        await chat
+        self.assertEqual(admitted, [0])
+
+        controller.release(succeeded=True)
+        await background
+        self.assertEqual(admitted, [0, 3])
+
+if __name__ == "__main__":
+    unittest.main()
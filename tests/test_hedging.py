@@ -0,0 +1,110 @@
+"""Hedged Gemini calls: when a backup is sent, how it is counted and what gets cancelled.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import unittest
+from app.utils.hedging import Hedger, HedgeNotSent
+
+class FakeBackend:
+    """Records each call and answers after the delay configured for its side."""
+
+    def __init__(self, primary_delay: float, hedge_delay: float = 0,
+                 primary_error: Exception = None, hedge_error: Exception = None):
+        self.delays = {False: primary_delay, True: hedge_delay}
+        self.errors = {False: primary_error, True: hedge_error}
+        self.calls = []
+        self.cancelled = []
+
+    async def __call__(self, hedge: bool):
+        self.calls.append(hedge)
+        try:
+            await asyncio.sleep(self.delays[hedge])
+        except asyncio.CancelledError:
+            self.cancelled.append(hedge)
+            raise
+        if self.errors[hedge] is not None:
+            raise self.errors[hedge]
+        return "hedge" if hedge else "primary"
+
+class HedgerTest(unittest.IsolatedAsyncioTestCase):
+    def warm_hedger(self, max_hedge_rate: float = 0.5) -> Hedger:
+        # Hedge after 10 ms, the floor, once a single latency is known
+        hedger = Hedger("test", max_hedge_rate=max_hedge_rate, min_samples=1, min_delay_ms=10)
+        hedger.latency.observe(0.001)
+        return hedger
+
+    async def test_no_hedge_until_enough_samples(self):
+        hedger = Hedger("test", min_samples=50)
+        backend = FakeBackend(primary_delay=0.05)
+
+        self.assertEqual(await hedger.run(backend), "primary")
+        self.assertEqual(backend.calls, [False])
+        self.assertEqual(hedger.hedged, 0)
+
+    async def test_slow_primary_loses_to_hedge_and_is_cancelled(self):
+        hedger = self.warm_hedger()
+        backend = FakeBackend(primary_delay=5)
+
+        self.assertEqual(await hedger.run(backend), "hedge")
+        await asyncio.sleep(0)
+        self.assertEqual(backend.calls, [False, True])
+        self.assertEqual(backend.cancelled, [False])
+        self.assertEqual((hedger.hedged, hedger.hedge_wins), (1, 1))
+
+    async def test_hedge_turned_away_is_not_counted(self):
+        hedger = self.warm_hedger()
+        backend = FakeBackend(primary_delay=0.05, hedge_error=HedgeNotSent("no free slot"))
+
+        self.assertEqual(await hedger.run(backend), "primary")
+        self.assertEqual(backend.calls, [False, True])
+        self.assertEqual((hedger.hedged, hedger.hedge_wins), (0, 0))
+        self.assertEqual(list(hedger._decisions), [False])
+
+    async def test_hedge_rate_is_capped(self):
+        hedger = self.warm_hedger(max_hedge_rate=0.1)
+        await hedger.run(FakeBackend(primary_delay=5))
+
+        backend = FakeBackend(primary_delay=0.05)
+        self.assertEqual(await hedger.run(backend), "primary")
+        self.assertEqual(backend.calls, [False])
+        self.assertEqual(hedger.hedged, 1)
+
+    async def test_both_failing_raises_primary_error(self):
+        hedger = self.warm_hedger()
+        backend = FakeBackend(primary_delay=0.05, primary_error=ValueError("primary"),
+                              hedge_error=RuntimeError("hedge"))
+
+        with self.assertRaisesRegex(ValueError, "primary"):
+            await hedger.run(backend)
+        self.assertEqual(hedger.hedge_wins, 0)
+
+    async def test_caller_cancellation_before_hedge_delay_cancels_primary(self):
+        hedger = Hedger("test", min_samples=1, min_delay_ms=1000)
+        hedger.latency.observe(0.001)
+        backend = FakeBackend(primary_delay=5)
+        task = asyncio.create_task(hedger.run(backend))
+        await asyncio.sleep(0.01)
+
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        self.assertEqual(backend.cancelled, [False])
+
+    async def test_caller_cancellation_during_race_cancels_both(self):
+        hedger = self.warm_hedger()
+        backend = FakeBackend(primary_delay=5, hedge_delay=5)
+        task = asyncio.create_task(hedger.run(backend))
+        await asyncio.sleep(0.05)
+        self.assertEqual(backend.calls, [False, True])
+
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        self.assertEqual(sorted(backend.cancelled), [False, True])
+        self.assertEqual(hedger.hedged, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""The per-worker history cache against the in-memory Supabase stub.
+
+    python -m unittest discover tests
+"""
+import unittest
+import httpx
+from postgrest import AsyncPostgrestClient
+from benchmarks.supabase_stub import create_app
+from app.sessions.memory import SessionMemory
+from app.sessions.models import MessageRole
+from app.sessions.service import SessionService, history_cache
+
+class HistoryCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        history_cache.clear()
+        self.client = AsyncPostgrestClient("http://stub/rest/v1")
+        # Serve the stub in-process instead of over the network
+        self.client.session = httpx.AsyncClient(
+            base_url="http://stub/rest/v1",
+            headers=self.client.session.headers,
+            transport=httpx.ASGITransport(app=create_app())
+        )
+        self.service = SessionService(self.client)
+        self.session = await self.service.create_session(None, "Cache test")
+        await self.service.add_message(self.session.id, MessageRole.USER, "What is a flip-flop?")
+        await self.service.add_message(self.session.id, MessageRole.ASSISTANT, "A one-bit memory element.")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        history_cache.clear()
+
+    async def load_memory(self) -> SessionMemory:
+        session = await self.service.get_session(self.session.id)
+        memory = SessionMemory(self.service, self.session.id, None)
+        await memory.load_history()
+        await memory.refresh_if_stale(session.message_count)
+        return memory
+
+    async def test_own_writes_are_served_from_cache(self):
+        misses = history_cache.misses
+        memory = await self.load_memory()
+
+        self.assertEqual(memory.message_count, 2)
+        self.assertIn("A one-bit memory element.", memory.get_context())
+        self.assertEqual(history_cache.misses, misses)
+
+    async def test_write_from_another_worker_invalidates_cached_window(self):
+        # Another worker stores a turn; only its own cache sees the write
+        await self.client.table("messages").insert({
+            "session_id": str(self.session.id),
+            "role": MessageRole.USER.value,
+            "content": "And a latch?"
+        }).execute()
+
+        memory = await self.load_memory()
+
+        self.assertEqual(memory.message_count, 3)
+        self.assertTrue(memory.get_context().endswith("Human: And a latch?"))
+        # The refetched window replaced the stale entry
+        messages, message_count = await self.service.get_recent_messages(self.session.id, 10)
+        self.assertEqual((len(messages), message_count), (3, 3))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Incremental ingestion against an in-memory manifest and vector store.
+
+The manifest lives in Postgres next to the embeddings rather than behind
+the Supabase REST API, so these tests keep both in memory.
+
+    python -m unittest discover tests
+"""
+import unittest
+from unittest import mock
+from langchain.docstore.document import Document
+from app.jobs.incremental_ingestion import IncrementalIngestor, content_hash, sync_files, sync_web_sources
+
+class MemoryManifest:
+    """Same interface as `IngestionManifest`, kept in a dict."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def load(self):
+        return {source: dict(entry) for source, entry in self.entries.items()}
+
+    def upsert(self, source, source_type, parent, fingerprint, content_hash, chunks):
+        self.entries[source] = {
+            "source": source, "source_type": source_type, "parent": parent,
+            "fingerprint": fingerprint, "content_hash": content_hash, "chunks": list(chunks),
+        }
+
+    def delete(self, sources):
+        for source in list(sources):
+            del self.entries[source]
+
+    def clear(self):
+        self.entries = {}
+
+class MemoryStore:
+    """The PGVector calls the ingestor makes, with chunks kept by custom_id."""
+
+    def __init__(self):
+        self.rows = {}
+        self.embedded = 0
+        self.fail_next_add = False
+
+    def delete_collection(self):
+        self.rows = {}
+
+    def create_collection(self):
+        pass
+
+    def add_texts(self, texts, metadatas, ids):
+        if self.fail_next_add:
+            self.fail_next_add = False
+            raise RuntimeError("embedding request failed")
+        self.embedded += len(texts)
+        self.rows.update((chunk_id, text) for chunk_id, text in zip(ids, texts))
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.rows.pop(chunk_id, None)
+
+def split(text: str):
+    """Chunk maker with one chunk per "|"-separated part."""
+    return lambda: [Document(page_content=part, metadata={"part": i}) for i, part in enumerate(text.split("|"))]
+
+class StorageHandler:
+    def __init__(self, files):
+        self.bucket = mock.Mock()
+        self.bucket.download.side_effect = lambda name: files[name]
+
+@mock.patch("app.jobs.incremental_ingestion.update_chunk_metadata")
+class IncrementalIngestionTest(unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryStore()
+        self.manifest = MemoryManifest()
+
+    def ingest(self, sources: dict) -> IncrementalIngestor:
+        """Sync `sources` ({name: (fingerprint, text)}) as files and remove the rest."""
+        ingestor = IncrementalIngestor(self.store, self.manifest)
+        for source, (fingerprint, text) in sources.items():
+            if not ingestor.is_unchanged(source, fingerprint):
+                ingestor.sync_source(source, "file", content_hash(text), split(text), fingerprint=fingerprint)
+        ingestor.remove_unseen("file")
+        return ingestor
+
+    def stored_texts(self):
+        return sorted(self.store.rows.values())
+
+    def assert_manifest_matches_store(self):
+        ids = [chunk["id"] for entry in self.manifest.entries.values() for chunk in entry["chunks"]]
+        self.assertEqual(sorted(ids), sorted(self.store.rows))
+
+    def test_only_changed_chunks_are_embedded(self, update_chunk_metadata):
+        self.ingest({"a.pdf": ("v1", "x|y|z"), "b.pdf": ("v1", "p|q")})
+        embedded = self.store.embedded
+
+        ingestor = self.ingest({"a.pdf": ("v2", "x|y|w|z"), "b.pdf": ("v1", "p|q")})
+
+        self.assertEqual(self.store.embedded - embedded, 1)
+        self.assertEqual(ingestor.stats["sources_unchanged"], 1)
+        self.assertEqual(ingestor.stats["chunks_reused"], 3)
+        self.assertEqual(self.stored_texts(), ["p", "q", "w", "x", "y", "z"])
+        self.assert_manifest_matches_store()
+
+    def test_removed_source_loses_its_chunks(self, update_chunk_metadata):
+        self.ingest({"a.pdf": ("v1", "x|y"), "b.pdf": ("v1", "p|q")})
+
+        ingestor = self.ingest({"a.pdf": ("v1", "x|y")})
+
+        self.assertEqual(ingestor.stats["sources_removed"], 1)
+        self.assertEqual(self.stored_texts(), ["x", "y"])
+        self.assertNotIn("b.pdf", self.manifest.entries)
+
+    def test_interrupted_run_is_redone_without_reusing_unstored_ids(self, update_chunk_metadata):
+        self.ingest({"a.pdf": ("v1", "x|y|z")})
+
+        self.store.fail_next_add = True
+        with self.assertRaises(RuntimeError):
+            self.ingest({"a.pdf": ("v2", "x|y|new|z")})
+        entry = self.manifest.entries["a.pdf"]
+        self.assertIsNone(entry["content_hash"])
+        self.assertIn(None, [chunk["hash"] for chunk in entry["chunks"]])
+
+        ingestor = self.ingest({"a.pdf": ("v2", "x|y|new|z")})
+
+        self.assertEqual(ingestor.stats["chunks_embedded"], 1)
+        self.assertEqual(self.stored_texts(), ["new", "x", "y", "z"])
+        self.assertIsNotNone(self.manifest.entries["a.pdf"]["content_hash"])
+        self.assert_manifest_matches_store()
+
+    def test_empty_listing_keeps_ingested_files(self, update_chunk_metadata):
+        self.ingest({"a.pdf": ("v1", "x|y")})
+
+        sync_files(IncrementalIngestor(self.store, self.manifest), StorageHandler({}), [])
+
+        self.assertIn("a.pdf", self.manifest.entries)
+        self.assertEqual(self.stored_texts(), ["x", "y"])
+
+    def test_unchanged_listing_skips_download(self, update_chunk_metadata):
+        self.ingest({"a.pdf": ("v1", "x|y"), "b.pdf": ("v1", "p|q")})
+        storage = StorageHandler({})
+
+        sync_files(IncrementalIngestor(self.store, self.manifest), storage,
+                   [{"name": "a.pdf", "metadata": {"eTag": '"v1"'}}])
+
+        storage.bucket.download.assert_not_called()
+        self.assertEqual(sorted(self.manifest.entries), ["a.pdf"])
+        self.assertEqual(self.stored_texts(), ["x", "y"])
+
+    def test_failed_scrape_keeps_the_sites_pages(self, update_chunk_metadata):
+        pages = {
+            "https://a.example": [Document(page_content="about a", metadata={"source": "https://a.example/about"})],
+            "https://b.example": [
+                Document(page_content="news b", metadata={"source": "https://b.example/news"}),
+                Document(page_content="events b", metadata={"source": "https://b.example/events"}),
+            ],
+        }
+        with mock.patch("app.scraper.process_web_sources.process_web_sources", lambda sites: pages[sites[0]]):
+            sync_web_sources(IncrementalIngestor(self.store, self.manifest), list(pages))
+
+        # a.example cannot be scraped now, and b.example dropped its events page
+        pages["https://b.example"].pop()
+        def scrape(sites):
+            if sites[0] == "https://a.example":
+                raise ConnectionError("timed out")
+            return pages[sites[0]]
+        with mock.patch("app.scraper.process_web_sources.process_web_sources", scrape):
+            sync_web_sources(IncrementalIngestor(self.store, self.manifest), list(pages))
+
+        self.assertEqual(sorted(self.manifest.entries), ["https://a.example/about", "https://b.example/news"])
+        self.assertEqual(self.stored_texts(), ["about a", "news b"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Chat memory in rolling-summary mode against the in-memory Supabase stub.
+
+    python -m unittest discover tests
+"""
+import unittest
+import httpx
+from postgrest import AsyncPostgrestClient
+from benchmarks.supabase_stub import create_app
+from app.config import Config
+from app.sessions.memory import SessionMemory
+from app.sessions.models import MessageRole
+from app.sessions.service import SessionService, history_cache
+from app.sessions.summary import MAX_MESSAGES_PER_UPDATE
+
+class RollingSummaryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        history_cache.clear()
+        self.client = AsyncPostgrestClient("http://stub/rest/v1")
+        # Serve the stub in-process instead of over the network
+        self.client.session = httpx.AsyncClient(
+            base_url="http://stub/rest/v1",
+            headers=self.client.session.headers,
+            transport=httpx.ASGITransport(app=create_app())
+        )
+        self.service = SessionService(self.client)
+        self.session = await self.service.create_session(None, "Summary test")
+        self.messages = []
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        history_cache.clear()
+
+    async def add_turns(self, count: int):
+        for _ in range(count):
+            number = len(self.messages) + 1
+            role = MessageRole.USER if number % 2 else MessageRole.ASSISTANT
+            self.messages.append(await self.service.add_message(self.session.id, role, f"message {number}"))
+
+    async def memory_with_summary(self, summary, summarized_until, token_budget: int = 1000) -> SessionMemory:
+        memory = SessionMemory(self.service, self.session.id, None, window_size=10, token_budget=token_budget)
+        await memory.load_history()
+        await memory.apply_summary(summary, summarized_until)
+        return memory
+
+    def contents(self, memory: SessionMemory):
+        return [msg.content for msg in memory._messages]
+
+    async def test_summary_inside_window_drops_covered_messages(self):
+        await self.add_turns(14)
+
+        memory = await self.memory_with_summary("They discussed logic gates.", self.messages[9].created_at)
+
+        self.assertEqual(self.contents(memory), [f"message {n}" for n in range(11, 15)])
+        self.assertTrue(memory.get_context().startswith("Summary of earlier messages: They discussed logic gates."))
+
+    async def test_lagging_summary_loads_messages_before_window(self):
+        await self.add_turns(14)
+
+        memory = await self.memory_with_summary("They said hello.", self.messages[1].created_at)
+
+        self.assertEqual(self.contents(memory), [f"message {n}" for n in range(3, 15)])
+
+    async def test_lagging_summary_load_is_bounded(self):
+        limit = MAX_MESSAGES_PER_UPDATE + Config.SUMMARY_KEEP_MESSAGES
+        await self.add_turns(limit + 20)
+
+        # No summary yet, as for sessions created before summaries existed
+        memory = await self.memory_with_summary(None, None)
+
+        self.assertEqual(self.contents(memory), [f"message {n}" for n in range(21, limit + 21)])
+
+    async def test_lagging_summary_load_keeps_what_fits_budget(self):
+        await self.add_turns(14)
+
+        # "message NN" is three estimated tokens
+        memory = await self.memory_with_summary(None, None, token_budget=36)
+
+        self.assertEqual(self.contents(memory), [f"message {n}" for n in range(3, 15)])
+
+if __name__ == "__main__":
+    unittest.main()
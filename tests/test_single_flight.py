@@ -0,0 +1,115 @@
+"""Coalescing of identical in-flight questions into one run.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import unittest
+from langchain_core.runnables import RunnableLambda
+from app.utils.single_flight import SingleFlight, SingleFlightRunnable
+
+class SlowAnswer:
+    """Counts runs and blocks each one until `release` is set."""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.runs = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return f"answer {self.runs}"
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_callers_share_one_run(self):
+        flight = SingleFlight()
+        work = SlowAnswer()
+        callers = [asyncio.create_task(flight.do("q", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.assertEqual(flight.stats()["in_flight"], 1)
+
+        work.release.set()
+
+        self.assertEqual(await asyncio.gather(*callers), ["answer 1"] * 3)
+        self.assertEqual(work.runs, 1)
+        self.assertEqual((flight.executions, flight.coalesced), (1, 2))
+
+    async def test_leader_error_reaches_every_follower(self):
+        flight = SingleFlight()
+        work = SlowAnswer(error=RuntimeError("gemini down"))
+        callers = [asyncio.create_task(flight.do("q", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        work.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+
+        self.assertEqual([str(r) for r in results], ["gemini down"] * 3)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(work.runs, 1)
+        # A failure is not remembered; the next caller runs the work again
+        self.assertEqual(flight.stats()["in_flight"], 0)
+        work.error = None
+        self.assertEqual(await flight.do("q", work), "answer 2")
+
+    async def test_leader_cancellation_does_not_cancel_followers(self):
+        flight = SingleFlight()
+        work = SlowAnswer()
+        leader = asyncio.create_task(flight.do("q", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("q", work))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        work.release.set()
+
+        self.assertEqual(await follower, "answer 1")
+        self.assertEqual(work.runs, 1)
+
+    async def test_results_are_not_cached(self):
+        flight = SingleFlight()
+        work = SlowAnswer()
+        work.release.set()
+
+        self.assertEqual(await flight.do("q", work), "answer 1")
+        self.assertEqual(await flight.do("q", work), "answer 2")
+        self.assertEqual(flight.coalesced, 0)
+
+    async def test_different_keys_run_separately(self):
+        flight = SingleFlight()
+        work = SlowAnswer()
+        callers = [asyncio.create_task(flight.do(key, work)) for key in ("q1", "q2")]
+        await asyncio.sleep(0)
+
+        work.release.set()
+        await asyncio.gather(*callers)
+
+        self.assertEqual(work.runs, 2)
+
+class SingleFlightRunnableTest(unittest.IsolatedAsyncioTestCase):
+    async def test_configurable_overrides_are_part_of_the_key(self):
+        release = asyncio.Event()
+        runs = []
+
+        async def answer(question: str) -> str:
+            runs.append(question)
+            await release.wait()
+            return question.upper()
+
+        runnable = SingleFlightRunnable(RunnableLambda(answer), SingleFlight(), lambda q: q)
+        callers = [
+            asyncio.create_task(runnable.ainvoke("what is ram?")),
+            asyncio.create_task(runnable.ainvoke("what is ram?")),
+            asyncio.create_task(runnable.ainvoke("what is ram?", {"configurable": {"k": 3}})),
+        ]
+        await asyncio.sleep(0.01)
+        release.set()
+
+        self.assertEqual(await asyncio.gather(*callers), ["WHAT IS RAM?"] * 3)
+        self.assertEqual(len(runs), 2)
+
+if __name__ == "__main__":
+    unittest.main()